@@ -1,19 +1,25 @@
 from pandasai import SmartDataframe
-import matplotlib.pyplot as plt
-import streamlit as st
+
+from PageData.DB.database import initialize_database
+from PageData.core.dataset import LazyDataset
+from PageData.core.figures import figure_cache_key, frame_fingerprint
+from PageData.core.schema import database_uri
+from PageData.plotting import show_cached_figure
 
 def process_chat_prompt(prompt: str, df, llm):
     """Processes the user's chat prompt using LLM."""
     response = ""
     try:
         if df is not None and llm is not None:
+            if isinstance(df, LazyDataset):
+                df = df.to_pandas()
             sdf = SmartDataframe(df, config={"llm": llm})
             response = sdf.chat(prompt)
 
             if "plot" in prompt.lower():
-                plt.figure()
-                df.plot()
-                st.pyplot(plt)
+                # The same data gives the same plot, so it is rendered (and downsampled) only once
+                database = database_uri(initialize_database())
+                show_cached_figure(figure_cache_key("df.plot()", database, None, frame_fingerprint(df)), df.plot)
         else:
             response = "Please upload data and configure the LLM."
     except Exception as e:
@@ -3,20 +3,37 @@ import pandas as pd
 import openai
 import pandas_gpt  # Import the library (it monkey-patches pandas)
 
+from PageData.DB.chat_history import load_chat_history, save_turn
+from PageData.DB.database import chat_store_path
+from PageData.core.chat_memory import DEFAULT_WINDOW_TURNS, SUMMARY_SOURCE_TURNS, ChatMemory
+from PageData.core.dataset import LazyDataset
+
 
 def initialize_session_state():
     """Initializes session state variables."""
-    if "chat_history" not in st.session_state:
-        st.session_state["chat_history"] = []
+    if "chat_memory" not in st.session_state:
+        # Continues the conversation of this workspace (the token in the page URL), e.g. after a refresh or a restart
+        history = load_chat_history(chat_store_path(), DEFAULT_WINDOW_TURNS + SUMMARY_SOURCE_TURNS)
+        st.session_state["chat_memory"] = ChatMemory.from_history(history)
 
 
 def display_chat_history():
-    """Displays the chat history."""
-    for role, content in st.session_state["chat_history"]:
+    """Displays the recent turns; older ones are only kept as a summary (and in the chat store)."""
+    memory = st.session_state["chat_memory"]
+    if memory.summary:
+        with st.expander(f"Summary of {memory.summarized_turns} earlier questions"):
+            st.text(memory.summary)
+    for role, content in memory.messages():
         with st.chat_message(role):
             st.markdown(content)
 
 
+def record_turn(user_prompt, answer):
+    """Adds a turn to the chat memory and queues it for the chat store."""
+    st.session_state["chat_memory"].add(user_prompt, answer)
+    save_turn(chat_store_path(), user_prompt, answer)
+
+
 def process_user_input(user_prompt, df):
     """Processes user input using pandas_gpt and updates the chat history."""
     if df is None:
@@ -28,14 +45,16 @@ def process_user_input(user_prompt, df):
         return
 
     try:
-        response = df.ask(user_prompt)  # Use .ask() on the DataFrame
-        st.session_state["chat_history"].append(("user", user_prompt))
-        st.session_state["chat_history"].append(("assistant", response))
+        if isinstance(df, LazyDataset):
+            # The generated code may use any column, so the table is read (once per data version) only now
+            df = df.to_pandas()
+        # The summary and the recent turns give the model the context at a bounded prompt size
+        response = df.ask(st.session_state["chat_memory"].prompt(user_prompt))  # Use .ask() on the DataFrame
+        record_turn(user_prompt, response)
 
     except Exception as e:
         st.error(f"An error occurred: {e}")
-        st.session_state["chat_history"].append(("user", user_prompt))
-        st.session_state["chat_history"].append(("assistant", f"Error: {e}"))
+        record_turn(user_prompt, f"Error: {e}")
 
 
 def chat_with_ai_tab():
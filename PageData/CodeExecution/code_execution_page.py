@@ -5,7 +5,14 @@ from io import StringIO
 import pandas as pd
 import sys
 from PageData.DB.database import create_view, execute_sql, insert_code_snippet, get_table_names, DB_PATH
-from PageData.utils import get_common_vars, execute_python_code
+from PageData.approximating import approximate_sql
+from PageData.core.engines import ENGINES, duckdb_available
+from PageData.core.query import execute_python_code
+from PageData.core.results import OpResult
+from PageData.exporting import export_controls
+from PageData.fragments import panel, rerun_page
+from PageData.searching import snippet_search_section
+from PageData.utils import get_common_vars
 from streamlit_ace import st_ace, KEYBINDINGS, LANGUAGES, THEMES
 
 class CodeExecutionTab:
@@ -29,41 +36,51 @@ class CodeExecutionTab:
         self.python_code_name = "Untitled Python Script"
         self.view_name = "Untitled View"
         self.category = "" # Added category value
+        self.pipeline_inputs = ""
+        self.pipeline_output = ""
+        self.sql_engine = "auto"
+        self.sql_approximate = False
 
     def _handle_sql_execute(self):
         if self.sql_code:
-            conn = sqlite3.connect("file::memory:?cache=shared", uri=True)
+            conn = self.conn
             try:
-                result = execute_sql(self.sql_code, conn)
+                result = execute_sql(self.sql_code, conn, engine=self.sql_engine)
                 if isinstance(result, pd.DataFrame):
                     self.output_placeholder.dataframe(result)  # Use the shared placeholder
                 else:
                     self.output_placeholder.error(result)
             except Exception as e:
                 self.output_placeholder.error(f"SQL execution error: {e}")
-            conn.close()
+
+    def _handle_sql_approximate(self):
+        with self.output_placeholder.container():
+            result = approximate_sql(self.conn, self.sql_code, "sql_editor", engine=self.sql_engine)
+            if isinstance(result, pd.DataFrame):
+                st.dataframe(result)
+            else:
+                st.error(result)
 
     def _handle_sql_save(self):
         if self.sql_code and self.sql_code_name:
-            conn = sqlite3.connect("file::memory:?cache=shared", uri=True)
-            insert_code_snippet(conn, "sql", self.sql_code, self.sql_code_name, category = self.category)
-            self.output_placeholder.success("SQL script saved!") #Placeholder
-            conn.close()
+            conn = self.conn
+            insert_code_snippet(conn, "sql", self.sql_code, self.sql_code_name, category = self.category,
+                                inputs=self.pipeline_inputs, output=self.pipeline_output, engine=self.sql_engine)
+            rerun_page(OpResult().success("SQL script saved!"))  # the saved scripts panel lists it
 
     def _handle_sql_create(self):
         if self.sql_code and self.view_name:
-            conn = sqlite3.connect("file::memory:?cache=shared", uri=True)
+            conn = self.conn
             result = create_view(self.sql_code, conn, self.view_name)
             if isinstance(result, str):
                 self.output_placeholder.error(f"View creation failed: {result}")
             else:
                 insert_code_snippet(conn, "sql", self.sql_code, self.view_name, is_view=True, category = self.category)
-                self.output_placeholder.success("View created successfully!")
-            conn.close()
+                rerun_page(OpResult().success("View created successfully!"))
 
     def _handle_python_execute(self):
         if self.python_code:
-            output, error = execute_python_code(self.python_code, get_common_vars())
+            output, error = execute_python_code(self.python_code, get_common_vars(self.python_code))
             if error:
                 self.output_placeholder.error(f"Execution error: { error}") #Placeholder
             else:
@@ -71,29 +88,33 @@ class CodeExecutionTab:
 
     def _handle_python_save(self):
         if self.python_code and self.python_code_name:
-            conn = sqlite3.connect("file::memory:?cache=shared", uri=True)
-            insert_code_snippet(conn, "python", self.python_code, self.python_code_name, category = self.category)
-            self.output_placeholder.success("Python script saved!")#Placeholder
-            conn.close()
+            conn = self.conn
+            insert_code_snippet(conn, "python", self.python_code, self.python_code_name, category = self.category,
+                                inputs=self.pipeline_inputs, output=self.pipeline_output)
+            rerun_page(OpResult().success("Python script saved!"))
 
     def display(self):
-        """Displays the Code Execution tab using tabs for SQL and Python forms."""
+        """Displays the Code Execution tab using tabs for SQL and Python forms.
+
+        Every form and list is a panel (see PageData.fragments): typing in the editor or pressing
+        Execute reruns only that form.
+        """
         st.header("Code Execution")
 
         sql_tab, python_tab = st.tabs(["SQL", "Python"])
 
-        # Create the output placeholder BEFORE the forms
-        self.output_placeholder = st.empty()
-
         with sql_tab:
             self.display_sql_form()
         with python_tab:
             self.display_python_form()
 
         self.display_saved_scripts() #Add to display the data
+        snippet_search_section(self.conn)
 
+    @panel
     def display_sql_form(self):
         """Displays the SQL Code form with execute, save, and create view options."""
+        self.output_placeholder = st.empty()  # Results show above the editor
         self.sql_code = st_ace(
             value=self.sql_code,
             placeholder="Type Query",
@@ -104,19 +125,38 @@ class CodeExecutionTab:
         self.sql_code_name = st.text_input("Script Name:", value=self.sql_code_name)
         self.view_name = st.text_input("View Name:", value=self.view_name)
         self.category = st.text_input("Category", value=self.category, key="sql_category") # Adds a category to the SQL FORM. Added key
+        self.sql_engine = st.selectbox(
+            "Engine", ENGINES, key="sql_engine", disabled=not duckdb_available(),
+            help="auto runs large aggregate queries on DuckDB when it is installed, everything else on SQLite.",
+        )
+        self.sql_approximate = st.toggle(
+            "Approximate", key="sql_approximate",
+            help="Estimates SUM, COUNT and AVG queries over _df from a stratified sample, with error bounds.",
+        )
+        self.display_pipeline_fields("sql")
         col1, col2, col3 = st.columns(3)
         with col1:
             if st.button("Execute SQL", key="sql_execute"):
-                self._handle_sql_execute()
+                # The approximate result stays on screen, so its "Run exact" button works on the next rerun
+                st.session_state["sql_approximate_query"] = self.sql_code if self.sql_approximate else None
+                if not self.sql_approximate:
+                    self._handle_sql_execute()
         with col2:
             if st.button("Save SQL Script", key="sql_save"):
                 self._handle_sql_save()
         with col3:
             if st.button("Save SQL View", key="sql_view_create"):
                 self._handle_sql_create()
+        if self.sql_approximate and self.sql_code and st.session_state.get("sql_approximate_query") == self.sql_code:
+            self._handle_sql_approximate()
+        if self.sql_code:
+            with st.expander("Export result"):
+                export_controls(self.conn, self.sql_code, "sql_editor", self.sql_code_name)
 
+    @panel
     def display_python_form(self):
         """Displays the Python Code form with execute and save options."""
+        self.output_placeholder = st.empty()
         self.python_code  = st_ace(
             value=self.python_code,
             placeholder="Type Query",
@@ -127,6 +167,7 @@ class CodeExecutionTab:
 
         self.python_code_name = st.text_input("Script Name:", value=self.python_code_name)
         self.category = st.text_input("Category", value=self.category, key="python_category") # Adds a category to the Python FORM. Added key
+        self.display_pipeline_fields("python")
 
         col1, col2 = st.columns(2)
         with col1:
@@ -136,13 +177,26 @@ class CodeExecutionTab:
             if st.button("Save Python", key="python_save"):
                 self._handle_python_save()
 
+    def display_pipeline_fields(self, code_type: str):
+        """Optional pipeline inputs/output of the saved script (see the Pipeline tab of Data Analysis)."""
+        with st.expander("Pipeline (optional)"):
+            self.pipeline_inputs = st.text_input(
+                "Input tables (comma-separated)", value=self.pipeline_inputs, key=f"{code_type}_pipeline_inputs",
+                help="Tables or other pipeline outputs this script reads, e.g. _df, totals",
+            )
+            self.pipeline_output = st.text_input(
+                "Output table", value=self.pipeline_output, key=f"{code_type}_pipeline_output",
+                help="Register the result as this table. Python scripts assign a DataFrame to `result`.",
+            )
+
+    @panel
     def display_saved_scripts(self):
         """Displays saved scripts and available views."""
         conn = self.conn
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("Saved Scripts")
-            scripts = execute_sql("SELECT id, name, type, is_view, category FROM code_snippets", conn)
+            scripts = execute_sql("SELECT id, name, type, is_view, category, inputs, output FROM code_snippets", conn)
             if isinstance(scripts, pd.DataFrame) and not scripts.empty: #Added security
                 st.dataframe(scripts)
             else:
@@ -0,0 +1,63 @@
+import sqlite3
+import uuid
+
+from PageData.DB.query_log import QueryLogWriter
+
+CREATE_CHAT_HISTORY = """
+    CREATE TABLE IF NOT EXISTS chat_history (
+        id TEXT PRIMARY KEY,
+        question TEXT,
+        answer TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+class ChatHistoryWriter(QueryLogWriter):
+    """Writes chat turns to the chat_history table of a chat store in batches on a background thread.
+
+    A chat store is a SQLite file per workspace (see WorkspaceManager.chat_store_path), not the
+    in-memory workspace database: the conversation must outlive the session and the server.
+    See QueryLogWriter for the batching.
+    """
+    create_sql = CREATE_CHAT_HISTORY
+    insert_sql = "INSERT INTO chat_history (id, question, answer) VALUES (?, ?, ?)"
+    thread_name = "chat-history-writer"
+
+    def record_turn(self, question: str, answer: str, store_path: str):
+        self._put(store_path, (uuid.uuid4().hex, question, answer))
+
+
+_writer = ChatHistoryWriter()
+
+
+def get_chat_history_writer() -> ChatHistoryWriter:
+    return _writer
+
+
+def save_turn(store_path: str, question: str, answer):
+    """Queues one question and its answer for the chat store at store_path."""
+    _writer.record_turn(question, str(answer), store_path)
+
+
+def load_chat_history(store_path: str, limit: int) -> list:
+    """Returns the last limit turns of the chat store at store_path as (question, answer) tuples, oldest first.
+
+    Turns still queued for the writer are included without waiting for it, since the writer is
+    shared by every session.
+    """
+    queued = _writer.queued(store_path)
+    conn = sqlite3.connect(store_path)
+    try:
+        conn.execute(CREATE_CHAT_HISTORY)
+        rows = conn.execute(
+            "SELECT id, question, answer FROM (SELECT rowid, id, question, answer FROM chat_history "
+            "ORDER BY rowid DESC LIMIT ?) ORDER BY rowid",
+            (limit,),
+        ).fetchall()
+    finally:
+        conn.close()
+    # A queued turn may have been written since: the ids tell
+    written = {row[0] for row in rows}
+    turns = [tuple(row[1:]) for row in rows] + [tuple(row[1:]) for row in queued if row[0] not in written]
+    return turns[max(len(turns) - limit, 0):]
@@ -1,12 +1,24 @@
-import io
-import os
+import re
 import sqlite3
 from sqlite3 import Connection
 import pandas as pd
 import streamlit as st
 import uuid
-import tempfile
-DB_PATH = "file::memory:?cache=shared"
+from PageData.core.dataset import get_frame_cache
+from PageData.core.engines import get_arrow_cache
+from PageData.core.query import create_view, execute_sql
+from PageData.core.schema import DB_PATH, bump_data_version, create_app_tables, get_data_version
+from PageData.core.storage import database_to_bytes
+from PageData.core.workspaces import get_workspace_manager
+from PageData.DB.query_log import get_query_log_writer
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Queued query_log records must reach a workspace before it is written to disk
+get_workspace_manager().before_spill.append(lambda uri: get_query_log_writer().flush(uri))
+# The Arrow copies DuckDB queries and the selections of _df read by scripts count towards the
+# session's quota and are dropped with its workspace
+get_workspace_manager().add_cache(get_arrow_cache())
+get_workspace_manager().add_cache(get_frame_cache())
 
 def save_database(conn):
     """
@@ -18,87 +30,54 @@ def save_database(conn):
     Returns:
         bytes: The database as a byte stream, or None if an error occurred.
     """
-    try:
-        # Create a temporary file
-        with tempfile.NamedTemporaryFile(suffix=".db", delete=False) as tmp_file:
-            temp_filename = tmp_file.name
+    result = database_to_bytes(conn)
+    if not result.ok:
+        st.error(f"Error creating database byte stream: {result.errors[0].message}")
+        return None
+    return result.value
 
-        # Connect to the temporary file as a database
-        temp_conn = sqlite3.connect(temp_filename)
+# Query parameter that keeps the workspace id in the page URL
+WORKSPACE_PARAM = "workspace"
 
-        # Backup the in-memory database to the temporary file
-        with temp_conn:
-            conn.backup(temp_conn)
+def get_workspace_id() -> str:
+    """Returns the workspace of the current Streamlit session, or "default" outside of one (scripts, benchmarks).
 
-        temp_conn.close() # Close temporary connection to get the data flushed to disk
+    The id is a random token kept in the page URL, not the session id: a refresh or a reconnect opens
+    a new session, which finds its workspace (and restores it if it was spilled) by the URL.
+    """
+    if get_script_run_ctx() is None:
+        return "default"
+    workspace_id = st.query_params.get(WORKSPACE_PARAM, "")
+    if not re.fullmatch(r"[0-9a-f]{32}", workspace_id):
+        workspace_id = uuid.uuid4().hex
+        st.query_params[WORKSPACE_PARAM] = workspace_id
+    return workspace_id
 
-        # Read the temporary file into a byte stream
-        with open(temp_filename, "rb") as f:
-            db_bytes = f.read()
+def workspace_in_use():
+    """Keeps the current session's workspace in memory while the block runs (see WorkspaceManager.in_use)."""
+    return get_workspace_manager().in_use(get_workspace_id())
 
-        # Remove the temporary file
-        os.remove(temp_filename)
 
-        return db_bytes
+def initialize_database() -> Connection:
+    """Opens the current session's in-memory workspace database, restoring it if it was spilled to disk.
 
-    except Exception as e:
-        st.error(f"Error creating database byte stream: {e}")
-        return None
+    Every session has its own database (see core.workspaces), so one user's upload never replaces another's _df.
+    """
+    return get_workspace_manager().connect(get_workspace_id())
 
-def initialize_database() -> Connection:
-    """Initializes the in-memory SQLite database and creates tables."""
-    conn = sqlite3.connect(DB_PATH, uri=True)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS api_keys (
-            id TEXT PRIMARY KEY,
-            service TEXT,
-            key TEXT
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS chat_history (
-            id TEXT PRIMARY KEY,
-            question TEXT,
-            answer TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS code_snippets (
-            id TEXT PRIMARY KEY,
-            type TEXT,
-            code TEXT,
-            name TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            is_view BOOLEAN DEFAULT FALSE,
-            category TEXT  -- Added the category field
-        )
-    ''')
-
-    conn.commit()
-    return conn
-
-def create_view(query: str, conn: Connection, view_name: str = "temp_view") -> pd.DataFrame or str:
-    """Creates a temporary view from a SQL query."""
-    try:
-        cursor = conn.cursor()
-        _query = f"CREATE VIEW IF NOT EXISTS \"{view_name}\" AS {query}"
-        cursor.execute(_query)
-        conn.commit()
-        return pd.read_sql(f"SELECT * FROM \"{view_name}\"", conn)
-    except Exception as e:
-        return str(e)
+def snapshot_store_path() -> str:
+    """Returns the file with the current session's named snapshots of its database (see core.snapshots)."""
+    return get_workspace_manager().snapshot_store_path(get_workspace_id())
 
-def execute_sql(query: str, conn: Connection) -> pd.DataFrame or str:
-    """Executes a SQL query and returns the result."""
-    try:
-        return pd.read_sql(query, conn)
-    except Exception as e:
-        return str(e)
+def chat_store_path() -> str:
+    """Returns the file with the current session's chat turns (see DB.chat_history)."""
+    return get_workspace_manager().chat_store_path(get_workspace_id())
+
+def display_workspace_usage():
+    """Shows how much of its memory quota the session's database uses."""
+    usage = get_workspace_manager().usage(get_workspace_id())
+    cached = f" + {usage['cache_bytes'] / 2 ** 20:.1f} MB cached" if usage["cache_bytes"] else ""
+    st.caption(f"Session database: {usage['bytes'] / 2 ** 20:.1f} MB{cached} of {usage['quota_bytes'] / 2 ** 20:.0f} MB")
 
 def get_only_views_names(conn: Connection) -> list:
     """Retrieves table and view names from the database."""
@@ -139,14 +118,20 @@ def update_record(conn: sqlite3.Connection, table_name: str, record_id: str, dic
         st.error(f"Error updating record: {e}")
         conn.rollback()
 
-def insert_code_snippet(conn: Connection, code_type: str, code: str, name: str, is_view: bool = False, category: str = None):
-    """Inserts a code snippet into the database."""
+def insert_code_snippet(conn: Connection, code_type: str, code: str, name: str, is_view: bool = False, category: str = None,
+                        inputs: str = None, output: str = None, engine: str = None):
+    """Inserts a code snippet into the database. Snippets with an output table are pipeline nodes.
+
+    engine is the query engine of SQL snippets (see core.engines); None means auto.
+    """
 
     code_id = str(uuid.uuid4())
     try:
         cursor = conn.cursor()
-        cursor.execute("INSERT INTO code_snippets (id, type, code, name, is_view, category) VALUES (?, ?, ?, ?, ?, ?)",
-                       (code_id, code_type, code, name, is_view, category))
+        cursor.execute("INSERT INTO code_snippets (id, type, code, name, is_view, category, inputs, output, engine) "
+                       "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                       (code_id, code_type, code, name, is_view, category, inputs or None, output or None,
+                        engine if engine != "auto" else None))
         conn.commit()
         st.success(f"{code_type.upper()} code saved successfully with ID: {code_id}")
     except Exception as e:
@@ -179,4 +164,3 @@ def delete_view_by_name(conn: Connection, view_name: str):
     except Exception as e:
         st.error(f"Error deleting view: {e}")
         conn.rollback()
-
@@ -0,0 +1,151 @@
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+from sqlite3 import Connection
+
+import pandas as pd
+
+from PageData.core.schema import DB_PATH, database_uri, get_data_version
+
+
+class QueryLogWriter:
+    """Writes query_log records in batches on a background thread.
+
+    record() only puts the entry on a queue, so logging adds no latency to the query itself.
+    The thread inserts everything queued in one transaction per database every flush_interval
+    seconds, or as soon as batch_size records are waiting. Records carry the database they belong
+    to, since every session has its own workspace database, and are kept per database until
+    written, so a session can wait for or read its own records without the other sessions' ones.
+    """
+    insert_sql = ("INSERT INTO query_log (snippet_id, sql_hash, duration_ms, rows_returned, data_version) "
+                  "VALUES (?, ?, ?, ?, ?)")
+    create_sql = None  # run before every batch, for databases that may not have the table yet
+    thread_name = "query-log-writer"
+
+    def __init__(self, db_path: str = DB_PATH, batch_size: int = 100, flush_interval: float = 2.0):
+        self.db_path = db_path  # default for records without a database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._pending = {}  # database -> records queued but not written yet, oldest first
+        self._written = threading.Condition()
+
+    def record(self, snippet_id: str, sql: str, duration_ms: float, rows_returned: int or None, data_version: int,
+               db_path: str = None):
+        sql_hash = hashlib.sha1(sql.encode("utf-8")).hexdigest()
+        self._put(db_path, (snippet_id, sql_hash, duration_ms, rows_returned, data_version))
+
+    def _put(self, db_path: str or None, row: tuple):
+        self._ensure_started()
+        db_path = db_path or self.db_path
+        with self._written:
+            self._pending.setdefault(db_path, []).append(row)
+        self._queue.put((db_path, row))
+
+    def flush(self, db_path: str = None):
+        """Blocks until every record queued so far for db_path (default: any database) has been written."""
+        with self._written:
+            self._written.wait_for(lambda: not (self._pending.get(db_path) if db_path else self._pending))
+
+    def queued(self, db_path: str) -> list:
+        """Records queued for db_path that are not written yet, oldest first."""
+        with self._written:
+            return list(self._pending.get(db_path, ()))
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+            by_database = {}
+            for db_path, row in batch:
+                by_database.setdefault(db_path, []).append(row)
+            for db_path, rows in by_database.items():
+                # Connections are not kept open: they would keep a spilled workspace alive in memory
+                conn = sqlite3.connect(db_path, uri=True)
+                self._write(conn, rows)
+                conn.close()
+                with self._written:
+                    del self._pending[db_path][:len(rows)]
+                    if not self._pending[db_path]:
+                        del self._pending[db_path]
+                    self._written.notify_all()
+
+    def _write(self, conn: Connection, batch: list, retries: int = 5):
+        for attempt in range(retries):
+            try:
+                with conn:
+                    if self.create_sql:
+                        conn.execute(self.create_sql)
+                    conn.executemany(self.insert_sql, batch)
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e):
+                    return  # e.g. the workspace was spilled and this is a new, empty database
+                # The shared in-memory database is locked while a page writes; try again shortly
+                time.sleep(0.05 * (attempt + 1))
+            except sqlite3.Error:
+                return
+        # Logging must never break the app, so a batch that cannot be written is dropped
+
+
+_writer = QueryLogWriter()
+
+
+def get_query_log_writer() -> QueryLogWriter:
+    return _writer
+
+
+def log_query(conn: Connection, snippet_id: str, code: str, duration_ms: float, rows_returned: int = None):
+    """Queues one snippet execution for the query_log table."""
+    _writer.record(snippet_id, code, duration_ms, rows_returned, get_data_version(conn), database_uri(conn))
+
+
+def slow_query_report(conn: Connection) -> pd.DataFrame:
+    """Returns run count and duration percentiles per snippet, slowest p90 first."""
+    _writer.flush(database_uri(conn))
+    log = pd.read_sql(
+        "SELECT q.snippet_id, s.name, s.type, q.duration_ms, q.rows_returned, q.data_version, q.timestamp "
+        "FROM query_log q LEFT JOIN code_snippets s ON s.id = q.snippet_id",
+        conn,
+    )
+    if log.empty:
+        return log
+    grouped = log.groupby(["snippet_id", "name", "type"], dropna=False)
+    report = grouped["duration_ms"].agg(
+        runs="count",
+        p50=lambda d: d.quantile(0.5),
+        p90=lambda d: d.quantile(0.9),
+        p99=lambda d: d.quantile(0.99),
+        max="max",
+    )
+    report["avg_rows"] = grouped["rows_returned"].mean()
+    report["last_run"] = grouped["timestamp"].max()
+    return report.reset_index().sort_values("p90", ascending=False)
+
+
+def duration_by_data_version(conn: Connection) -> pd.DataFrame:
+    """Returns the median duration of every snippet per data version, to spot snippets that got slower after an upload."""
+    _writer.flush(database_uri(conn))
+    log = pd.read_sql(
+        "SELECT COALESCE(s.name, q.snippet_id) AS snippet, q.data_version, q.duration_ms "
+        "FROM query_log q LEFT JOIN code_snippets s ON s.id = q.snippet_id",
+        conn,
+    )
+    if log.empty:
+        return log
+    return log.pivot_table(index="snippet", columns="data_version", values="duration_ms", aggfunc="median")
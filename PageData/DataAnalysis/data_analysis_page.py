@@ -1,8 +1,20 @@
+import time
 
 import streamlit as st
 import pandas as pd
-from PageData.DB.database import execute_sql
-from PageData.utils import get_common_vars, execute_python_code
+from PageData.DB.database import execute_sql, get_data_version
+from PageData.DB.query_log import log_query
+from PageData.approximating import approximate_sql
+from PageData.core.cube import cube_is_current, measure_column, query_cube, read_cube_definition, write_cube
+from PageData.core.figures import DEFAULT_POINT_BUDGET, figure_cache_key, frame_fingerprint
+from PageData.core.pipeline import load_pipeline, run_pipeline
+from PageData.core.schema import database_uri
+from PageData.exporting import export_controls
+from PageData.fragments import panel, rerun_page
+from PageData.plotting import execute_python_cached
+from PageData.searching import element_search_section
+from PageData.utils import get_common_vars, report_result
+from PageData.validating import validation_section
 from multipage_streamlit import State
 
 
@@ -10,7 +22,7 @@ def data_analysis_tab(conn):
     """Handles the combined SQL and Python Data View tab."""
     st.header("Data Analysis")
     # Include 'code' column in the initial query
-    code_snippets = execute_sql("SELECT id, name, type, code, category FROM code_snippets", conn)
+    code_snippets = execute_sql("SELECT id, name, type, code, category, inputs, output, engine FROM code_snippets", conn)
 
     if isinstance(code_snippets, pd.DataFrame): # Check if code_snippets is a DataFrame
         if not code_snippets.empty:
@@ -18,6 +30,15 @@ def data_analysis_tab(conn):
             categories = code_snippets['category'].unique()
             # Sidebar selections *before* tabs are created
             selected_python_ids, selected_sql_tables = get_sidebar_selections(code_snippets)
+            point_budget = st.sidebar.number_input(
+                "Plot point budget", min_value=0, value=DEFAULT_POINT_BUDGET, step=1000,
+                key=State(__name__)("plot_point_budget"),
+                help="Lines and scatter plots with more points are downsampled before rendering. 0 disables it.",
+            )
+            approximate = st.sidebar.toggle(
+                "Approximate SQL results", key=State(__name__)("approximate"),
+                help="Estimates SUM, COUNT and AVG queries over _df from a stratified sample, with error bounds.",
+            )
 
             if len(categories) > 1 or (len(categories) == 1 and pd.isna(categories[0])): # Display tabs only if more than 1 category, or if there is a default category
                 tab_names = [cat if not pd.isna(cat) else "default" for cat in categories] # Replace NaN with 'default'
@@ -31,15 +52,20 @@ def data_analysis_tab(conn):
                         st.subheader(f"Category: {category if not pd.isna(category) else 'default'}")
 
                         # Filter snippets by type and category, and display
-                        display_snippets(cat_snippets, conn, selected_python_ids, selected_sql_tables)
+                        display_snippets(cat_snippets, conn, selected_python_ids, selected_sql_tables, point_budget,
+                                         approximate)
             else:
                 # if only default category is present we show data as before
-                st.subheader(f"Category: default")
-                display_snippets(code_snippets, conn, selected_python_ids, selected_sql_tables)
+                st.subheader("Category: default")
+                display_snippets(code_snippets, conn, selected_python_ids, selected_sql_tables, point_budget, approximate)
+            pipeline_section(code_snippets, conn)
         else:
             st.info("No saved code snippets available.")
     else:
         st.error(f"Error retrieving code snippets: {code_snippets}")
+    element_search_section(conn)
+    validation_section(conn)
+    takeoff_cube_section(conn)
 
 
 def get_sidebar_selections(code_snippets):
@@ -70,30 +96,161 @@ def get_sidebar_selections(code_snippets):
     return selected_python_ids, selected_sql_tables
 
 
-def display_snippets(snippets, conn, selected_python_ids, selected_sql_tables):
-    """Displays Python and SQL snippets based on sidebar selections."""
+def display_snippets(snippets, conn, selected_python_ids, selected_sql_tables, point_budget=DEFAULT_POINT_BUDGET,
+                     approximate=False):
+    """Displays Python and SQL snippets based on sidebar selections.
+
+    Every SQL snippet is a panel (see PageData.fragments), so its export and "Run exact" buttons
+    rerun only that snippet. Python snippet output (text and figures) is cached by code and data version,
+    so reruns replay it instead of executing and rendering again. With approximate, aggregate SQL
+    snippets are estimated from the sample of _df.
+    """
     python_snippets = snippets[snippets["type"] == "python"]
     sql_snippets = snippets[snippets["type"] == "sql"]
 
     # Execute selected Python snippets
     for code_id in selected_python_ids:
         if code_id in python_snippets.index:  # Check if ID is in this category
-            code = python_snippets.loc[code_id, 'code']
-            if code:
+            if python_snippets.loc[code_id, 'code']:
                 with st.expander(f"Executing: {python_snippets.loc[code_id, 'name']}"):
-                    output, error = execute_python_code(code, get_common_vars())
-                    if error:
-                        st.error(f"Execution error: {error}")
-                    else:
-                        st.text(output or "No output generated")
+                    display_python_snippet(python_snippets.loc[code_id], conn, point_budget)
 
     # Display selected SQL views
     for table in selected_sql_tables:
         if table in sql_snippets['name'].values:  # Check if table name is in this category
             with st.expander(f"Executing sql: {table}"):
-                sql_snippet = sql_snippets[sql_snippets["name"] == table]
-                data = execute_sql(sql_snippet['code'].iloc[0], conn)
-                if isinstance(data, pd.DataFrame):
-                    st.dataframe(data)
-                else:
-                    st.error(f"Failed to load data from {table}")
\ No newline at end of file
+                sql_snippet_panel(sql_snippets[sql_snippets["name"] == table].iloc[0], conn, approximate)
+
+
+def display_python_snippet(snippet, conn, point_budget):
+    # Not a panel: snippets may draw into the sidebar, which fragments can't
+    code = snippet['code']
+    common_vars = get_common_vars(code)
+    cache_key = figure_cache_key(code, database_uri(conn), get_data_version(conn), frame_fingerprint(common_vars["df"]),
+                                 point_budget)
+    start = time.perf_counter()
+    output, error, cached = execute_python_cached(code, common_vars, cache_key, point_budget)
+    if cached:
+        st.caption("Replayed from the figure cache")
+    else:
+        log_query(conn, snippet['id'], code, (time.perf_counter() - start) * 1000)
+    if error:
+        st.error(f"Execution error: {error}")
+    else:
+        st.text(output or "No output generated")
+
+
+@panel
+def sql_snippet_panel(snippet, conn, approximate):
+    if approximate:
+        data = approximate_sql(conn, snippet['code'], f"snippet_{snippet['id']}", engine=snippet['engine'],
+                               snippet_id=snippet['id'])
+    else:
+        data = execute_sql(snippet['code'], conn, snippet_id=snippet['id'], engine=snippet['engine'])
+    if isinstance(data, pd.DataFrame):
+        st.caption(f"Engine: {data.attrs['engine']}")
+        st.dataframe(data)
+    else:
+        st.error(f"Failed to load data from {snippet['name']}")
+    export_controls(conn, snippet['code'], f"snippet_{snippet['id']}", snippet['name'])
+
+
+@panel
+def pipeline_section(code_snippets, conn):
+    """Runs the snippets that declare an output table as a pipeline, re-executing only changed nodes."""
+    nodes = load_pipeline(code_snippets)
+    if not nodes:
+        return
+    state = State(__name__)
+    st.subheader("Pipeline")
+    st.dataframe(pd.DataFrame([
+        {"output": output, "name": node["name"], "type": node["type"], "inputs": ", ".join(node["inputs"])}
+        for output, node in nodes.items()
+    ]), hide_index=True)
+
+    targets = st.multiselect("Outputs to update (default: all)", list(nodes), key=state("pipeline_targets"))
+    force = st.checkbox("Re-run unchanged nodes", key=state("pipeline_force"))
+    if st.button("Run Pipeline", key=state("pipeline_run")):
+        with st.spinner("Running pipeline..."):
+            result = run_pipeline(conn, code_snippets, targets, {"pd": pd}, force=force)
+        st.session_state[state("pipeline_runs")] = result.value
+        if any(run["status"] == "executed" for run in result.value or []):
+            rerun_page(result)  # snippets may show the rewritten output tables
+        report_result(result)
+
+    runs = st.session_state.get(state("pipeline_runs"))
+    if runs:
+        st.dataframe(pd.DataFrame(runs).drop(columns=["printed"]), hide_index=True)
+        for run in runs:
+            if run["printed"]:
+                with st.expander(f"Output of {run['name']}"):
+                    st.text(run["printed"])
+        output = st.selectbox("Preview output", [run["output"] for run in runs if run["status"] in ("executed", "cached")],
+                              key=state("pipeline_preview"))
+        if output:
+            data = execute_sql(f'SELECT * FROM "{output}" LIMIT 1000', conn)
+            if isinstance(data, pd.DataFrame):
+                st.dataframe(data)
+            else:
+                st.error(data)
+
+
+@panel
+def takeoff_cube_section(conn):
+    """Defines the takeoff cube over _df and answers pivot queries from its precomputed rollups."""
+    types = {row[1]: (row[2] or "").upper() for row in conn.execute("PRAGMA table_info(_df)")}
+    if not types:
+        return
+    state = State(__name__)
+    st.subheader("Takeoff cube")
+    definition = read_cube_definition(conn)
+
+    with st.expander("Cube definition", expanded=definition is None):
+        numeric = [col for col, sql_type in types.items() if sql_type in ("REAL", "INTEGER", "FLOAT", "NUMERIC")]
+        dimensions = st.multiselect(
+            "Dimensions", [col for col in types if col not in numeric],
+            default=definition["dimensions"] if definition else None, key=state("cube_dimensions"),
+        )
+        measures = st.multiselect(
+            "Measures", numeric, default=definition["measures"] if definition else None, key=state("cube_measures"),
+        )
+        if st.button("Build cube", key=state("cube_build")):
+            with st.spinner("Precomputing rollups..."):
+                df = pd.read_sql("SELECT * FROM _df", conn)
+                report_result(write_cube(conn, df, dimensions, measures))
+            definition = read_cube_definition(conn)
+
+    if definition is None:
+        st.info("Pick dimensions and measures and build the cube to query aggregates without scanning _df.")
+        return
+    if not cube_is_current(conn):
+        st.warning("The cube was built for an older version of the data. Build it again to refresh it.")
+
+    dimensions = definition["dimensions"]
+    rows = st.multiselect("Rows", dimensions, default=dimensions[:1], key=state("cube_rows"))
+    column = st.selectbox("Columns", [None] + [dim for dim in dimensions if dim not in rows],
+                          format_func=lambda dim: "(none)" if dim is None else dim, key=state("cube_column"))
+    measure = st.selectbox("Measure", definition["measures"], key=state("cube_measure"))
+    aggregate = st.selectbox("Aggregate", ["sum", "count", "avg", "min", "max"], key=state("cube_aggregate"))
+
+    # Filters on the remaining dimensions drill down into one member
+    filters = {}
+    grouped = rows + ([column] if column else [])
+    filter_columns = st.columns(max(len(dimensions) - len(grouped), 1))
+    for position, dim in enumerate(dim for dim in dimensions if dim not in grouped):
+        members = query_cube(conn, [dim])[dim].dropna().sort_values().tolist()
+        choice = filter_columns[position].selectbox(dim, ["(all)"] + members, key=state(f"cube_filter_{dim}"))
+        if choice != "(all)":
+            filters[dim] = choice
+
+    start = time.perf_counter()
+    result = query_cube(conn, grouped, filters)
+    value = measure_column(aggregate, measure)
+    if column:
+        pivot = result.pivot_table(index=rows or None, columns=column, values=value, aggfunc="first", dropna=False)
+    elif rows:
+        pivot = result.set_index(rows)[[value, "_rows"]]
+    else:
+        pivot = result[[value, "_rows"]]
+    st.caption(f"Answered from the cube in {(time.perf_counter() - start) * 1000:.1f} ms")
+    st.dataframe(pivot)
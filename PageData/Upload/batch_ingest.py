@@ -0,0 +1,21 @@
+import os
+
+import pandas as pd
+import streamlit as st
+
+from PageData.core.ingest import ingest_files
+from PageData.utils import report_result
+
+
+def load_batch_data(uploaded_files, max_workers: int = None) -> pd.DataFrame or None:
+    """Parses many exported files (all sheets) in a process pool and unions them into one DataFrame."""
+    sources = [(uploaded_file.name, uploaded_file.getvalue()) for uploaded_file in uploaded_files]
+    if not sources:
+        st.info("Please upload one or more files.")
+        return None
+
+    workers = min(max_workers or os.cpu_count() or 1, len(sources))
+    with st.spinner(f"Parsing {len(sources)} files with {workers} workers..."):
+        result = ingest_files(sources, max_workers)
+    report_result(result)
+    return result.value if result.ok else None
@@ -1,10 +1,22 @@
+import json
 import os
-import sqlite3
+import tempfile
 import pandas as pd
 import streamlit as st
-from PageData.Upload.sql_from_df_creator import   create_sql_table
-from PageData.DB.database import get_table_names, save_database, execute_sql
-from PageData.Upload.upload_ddc import  upload_ddc
+from multipage_streamlit import State
+from PageData.Upload.sql_from_df_creator import   create_sql_table, upsert_sql_table
+from PageData.DB.database import display_workspace_usage, get_table_names, initialize_database, save_database, \
+    snapshot_store_path
+from PageData.core.dataset import LazyDataset
+from PageData.core.column_stats import read_profile, write_profile
+from PageData.core.sampling import AUTO_SAMPLE_MIN_ROWS, SAMPLE_FRACTION, detect_strata, read_sample_definition, \
+    write_sample
+from PageData.core.snapshots import create_snapshot, delete_snapshot, diff_snapshots, list_snapshots, restore_snapshot
+from PageData.core.spatial import BOX_FIELDS, build_spatial_index, detect_box_columns, read_box_columns
+from PageData.core.storage import load_database
+from PageData.fragments import panel, rerun_page
+from PageData.utils import report_result
+from PageData.Upload.upload_ddc import  is_new_upload, upload_ddc
 
 
 # def handle_excel_upload(file, conn, create_table: bool,col1,col2):
@@ -67,71 +79,199 @@ def handle_sqlite_upload(uploaded_file,conn):
     """
 
     if uploaded_file is not None:
-        try:
-            # Read the uploaded file content as bytes
-            file_content = uploaded_file.read()
+        # sqlite3 can only back up from a file, so write the upload to a temporary one
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_file = os.path.join(tmp_dir, "upload.db")
+            with open(db_file, "wb") as f:
+                f.write(uploaded_file.read())
+            report_result(load_database(conn, db_file))
+    else:
+        st.info("Please upload a database file.")
 
-            # Load the database from the uploaded file into the in-memory database
-            with conn:
-                # Use executemany to insert bytes directly.  No decoding is needed for binary data.
-                # We'll need to know the schema to re-create tables if the database is meant to be used this way.
+def guess_key_column_index(df: pd.DataFrame) -> int:
+    """Returns the position of the column most likely to hold the Revit element ID."""
+    for i, col in enumerate(df.columns):
+        if str(col).lower().replace(" ", "").startswith(("elementid", "id")):
+            return i
+    return 0
 
-                # Option 1: Load into a new DB.  This assumes your file is a complete DB, and uses backup.
-                db_file = uploaded_file.name  # Get the filename for temporary storage
-                with open(db_file, "wb") as f: #Write to temporary db file. This gets rid of the decoding error, and works as expected
-                    f.write(file_content)
+def display_change_summary(summary: dict):
+    """Shows the number of inserted, updated, deleted and unchanged rows of an incremental update."""
+    for col, (label, value) in zip(st.columns(4), summary.items()):
+        col.metric(label.capitalize(), value)
 
-                # Create a temporary connection to the uploaded file. This requires a file, not bytes.
-                temp_conn = sqlite3.connect(db_file)
+@panel
+def display_column_profile(conn, table_name: str = "_df"):
+    """Shows the stored per-column statistics of a table instead of scanning it.
 
-                # Backup the uploaded data to the in memory db
-                conn.backup(temp_conn)  # Backup to in-memory database
+    Statistics are written with the table; for databases uploaded without them they are computed on request.
+    """
+    profile = read_profile(conn, table_name)
+    if profile is None:
+        if st.button("Compute column statistics"):
+            with st.spinner("Computing column statistics..."):
+                write_profile(conn, pd.read_sql(f'SELECT * FROM "{table_name}"', conn), table_name)
+            profile = read_profile(conn, table_name)
+        if profile is None:
+            return
 
-                temp_conn.close()
-                os.remove(db_file)
+    st.write(f"Column statistics of {table_name}:")
+    view = profile[["column_name", "dtype", "null_count", "distinct_estimate", "min_value", "max_value"]].copy()
+    view.insert(3, "null_percent", (profile["null_count"] / profile["rows"].where(profile["rows"] > 0) * 100).round(1))
+    for col in ("min_value", "max_value"):  # numbers and text mixed in one column
+        view[col] = view[col].map(lambda value: None if pd.isna(value) else str(value))
+    view["histogram"] = profile["histogram"].map(lambda h: json.loads(h)["counts"] if isinstance(h, str) else None)
+    view["top_values"] = profile["top_values"].map(
+        lambda t: ", ".join(f"{value} ({count})" for value, count in json.loads(t)) if isinstance(t, str) else None
+    )
+    st.dataframe(view, hide_index=True, column_config={
+        "distinct_estimate": st.column_config.NumberColumn("distinct (approx.)"),
+        "histogram": st.column_config.BarChartColumn("histogram"),
+    })
 
-            st.success("Database uploaded successfully.")
+@panel
+def display_spatial_index(conn, table_name: str = "_df"):
+    """Maps the bounding box columns of a table and builds its R*Tree for box queries."""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    mapping = read_box_columns(conn, table_name)
+    state = State(__name__)
+    with st.expander("Spatial index", expanded=False):
+        if mapping is None:
+            mapping = detect_box_columns(columns) or {}
+            st.caption("Bounding box columns detected by name. Leave z empty for a 2D index.")
+        else:
+            st.caption("Element bounding boxes are indexed. Use `spatial` in Python scripts or the "
+                       f"{table_name}_boxes and {table_name}_box_overlaps views in SQL.")
+        selected = {}
+        for col, field in zip(st.columns(2) * 3, BOX_FIELDS):
+            options = [None] + columns
+            selected[field] = col.selectbox(field, options, index=options.index(mapping.get(field)),
+                                            key=state(f"spatial_{field}"))
+        if st.button("Build spatial index", key=state("spatial_build")):
+            with st.spinner("Indexing bounding boxes..."):
+                report_result(build_spatial_index(conn, {field: col for field, col in selected.items() if col}, table_name))
 
-        except sqlite3.Error as e:
-            st.error(f"Error uploading database: {e}")
-        except Exception as e:
-            st.error(f"Failed to upload file. The file might not be a valid SQLite database or it might be corrupted. Error: {e}")
-    else:
-        st.info("Please upload a database file.")
+@panel
+def display_sample(conn, table_name: str = "_df"):
+    """Chooses the strata of the sample that approximate queries run on, and draws it."""
+    columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table_name}")')]
+    definition = read_sample_definition(conn, table_name)
+    state = State(__name__)
+    with st.expander("Sample for approximate queries", expanded=False):
+        if definition is None:
+            st.caption(f"Tables from {AUTO_SAMPLE_MIN_ROWS:,} rows are sampled on upload.")
+        else:
+            st.caption(f"{definition['sample_rows']:,} of {definition['rows']:,} rows sampled, "
+                       f"stratified by {', '.join(definition['strata']) or 'nothing'}.")
+        strata = st.multiselect("Stratify by", columns, key=state("sample_strata"),
+                                default=definition["strata"] if definition else detect_strata(columns))
+        fraction = st.number_input("Fraction", min_value=0.001, max_value=1.0, step=0.005, format="%.3f",
+                                   value=definition["fraction"] if definition else SAMPLE_FRACTION,
+                                   key=state("sample_fraction"))
+        if st.button("Draw sample", key=state("sample_build")):
+            with st.spinner("Sampling..."):
+                df = pd.read_sql(f'SELECT * FROM "{table_name}"', conn)
+                report_result(write_sample(conn, df, strata, table_name, fraction))
+
+@panel
+def display_snapshots(conn):
+    """Saves, compares and restores named snapshots of the session database."""
+    store_path = snapshot_store_path()
+    state = State(__name__)
+    with st.expander("Snapshots", expanded=False):
+        st.caption("A snapshot stores only the tables that changed since the earlier snapshots.")
+        name = st.text_input("Snapshot name", key=state("snapshot_name"))
+        if st.button("Save snapshot", key=state("snapshot_save")):
+            with st.spinner("Saving snapshot..."):
+                report_result(create_snapshot(conn, store_path, name.strip()))
+        snapshots = list_snapshots(store_path)
+        if snapshots.empty:
+            return
+        st.dataframe(snapshots, hide_index=True)
+        selected = st.selectbox("Snapshot", snapshots["name"].tolist(), key=state("snapshot_selected"))
+        other = st.selectbox("Compare with", ["Current database"] + [n for n in snapshots["name"] if n != selected],
+                             key=state("snapshot_other"))
+        col1, col2, col3 = st.columns(3)
+        if col1.button("Compare", key=state("snapshot_compare")):
+            result = diff_snapshots(conn, store_path, selected, None if other == "Current database" else other)
+            report_result(result)
+            if result.ok:
+                st.dataframe(result.value, hide_index=True)
+        if col2.button("Restore", key=state("snapshot_restore")):
+            with st.spinner("Restoring snapshot..."):
+                result = restore_snapshot(conn, store_path, selected)
+            if not result.ok:
+                report_result(result)
+                return
+            # A file uploaded but not yet written to SQL stays in the session
+            if not isinstance(st.session_state.get("excel_df"), pd.DataFrame):
+                st.session_state["excel_df"] = LazyDataset(initialize_database) if "_df" in get_table_names(conn) else None
+            st.session_state["sql_tables"] = get_table_names(conn)
+            rerun_page(result)  # every section shows the restored tables
+        if col3.button("Delete", key=state("snapshot_delete")):
+            rerun_page(delete_snapshot(store_path, selected))
 
 def data_upload_tab(conn):
     """Handles the Data Upload tab."""
+    if st.sidebar.button("Save Database"):
+        save_database_button(conn)
+    upload_panel(conn)
+
+@panel
+def upload_panel(conn):
+    """Uploads and writes the data. The sections showing the stored tables are nested panels, so they
+    rerun after a write and on their own when their widgets change."""
+    had_data = st.session_state.get("excel_df") is not None
     col1, col2 = st.columns(2)
-    df = st.session_state["excel_df"]
-    excel_handle_condition = "excel_df" in  st.session_state and isinstance(df, pd.DataFrame)
     with col1:
         st.header("Data Upload")
         upload_ddc()#genereted df in session from ddc excel file or ddc revit file
         sqlite_file = st.file_uploader("Upload SQLite database", type=["db", "sqlite"])
-        if sqlite_file:
+        if sqlite_file and is_new_upload(sqlite_file, "sqlite"):
             handle_sqlite_upload(sqlite_file, conn)
-        if st.sidebar.button("Save Database"):
-            save_database_button(conn)
+        # Read after the uploads, which may have replaced it
+        df = st.session_state["excel_df"]
+        excel_handle_condition = isinstance(df, pd.DataFrame)
         if excel_handle_condition:
-            if st.button("Create SQL table from Excel data"):
+            update_mode = "Replace table"
+            if "_df" in get_table_names(conn):
+                update_mode = st.radio("SQL table update mode", ["Replace table", "Incremental update"], horizontal=True)
+            if update_mode == "Incremental update":
+                key_column = st.selectbox("Element ID column", df.columns.tolist(), index=guess_key_column_index(df))
+                if st.button("Update SQL table from Excel data"):
+                    summary = upsert_sql_table(df, conn, key_column)
+                    if summary is not None:
+                        display_change_summary(summary)
+                    st.session_state["sql_tables"] = get_table_names(conn)
+            elif st.button("Create SQL table from Excel data"):
                 create_sql_table(df, conn)
                 st.session_state["sql_tables"] = get_table_names(conn)
 
         sql_table = get_table_names(conn)
         if "_df" in sql_table:
-            _query ="select * from _df"
-            res = execute_sql(_query,conn)
-            if st.button("Update session from sql data") and isinstance(res,pd.DataFrame):
-                st.session_state["excel_df"] =res
-                st.info("update data in session from sql table")
+            # The session reads _df on demand (see core.dataset) instead of holding a copy of it
+            if st.button("Update session from sql data"):
+                st.session_state["excel_df"] = LazyDataset(initialize_database)
+                st.info("The session now reads the data from the sql table")
+            display_spatial_index(conn)
+            display_sample(conn)
         st.write("SQL Tables:")
         st.write(sql_table)  # Display SQL tables
+        display_workspace_usage()
+        display_snapshots(conn)
 
     with col2:
         st.subheader("Data Preview and SQL Tables")
         if excel_handle_condition:
             st.write("Preview of Uploaded Data:")
             st.dataframe(df.head())  # Show data head
+        elif isinstance(df, LazyDataset) and "_df" in sql_table:
+            st.write("Preview of the SQL data in the session:")
+            st.dataframe(df.head())  # Reads only these rows
+        if "_df" in sql_table:
+            display_column_profile(conn)
+    if not had_data and st.session_state.get("excel_df") is not None:
+        rerun_page()  # the navigation offers the other pages once data is loaded
 
 
 
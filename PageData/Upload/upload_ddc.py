@@ -1,36 +1,36 @@
 import streamlit as st
+from multipage_streamlit import State
 import os
 import subprocess
 import pandas as pd
 
-
-
-
+from PageData.core.ingest import TABULAR_FORMATS, get_file_format, read_source
+from PageData.core.ingest import read_converter_output as core_read_converter_output
+from PageData.utils import report_result
 
 def load_excel_data(uploaded_file):
     """Loads data from an uploaded Excel file."""
-    try:
-        df = pd.read_excel(uploaded_file)
-        # Find duplicate column names
-        seen_cols = set()
-        duplicate_cols = []
-        original_cols = df.columns.tolist()  # make it list for the purposes of this scope
-        for col in original_cols:
-            if col in seen_cols:
-                duplicate_cols.append(col)
-            else:
-                seen_cols.add(col)
-        # Handle duplicate column names
-        if duplicate_cols:
-            st.warning("The Excel file contains duplicate column names. Please fix these in the Excel file.")
-            st.write("Duplicate columns:", duplicate_cols)
-            return None
-
-        st.success("Excel file loaded successfully!")
-        return df
-    except Exception as e:
-        st.error(f"Error loading Excel file: {e}")
+    result = read_source(uploaded_file, "Excel")
+    report_result(result)
+    return result.value if result.ok else None
+
+
+def load_tabular_data(uploaded_file):
+    """Loads data from an uploaded CSV, Parquet or Feather file."""
+    file_format = get_file_format(uploaded_file.name)
+    if file_format is None:
+        st.error(f"Unsupported file type: {uploaded_file.name}")
         return None
+    result = read_source(uploaded_file, file_format)
+    report_result(result)
+    return result.value if result.ok else None
+
+
+def read_converter_output(file_path: str) -> pd.DataFrame or None:
+    """Reads the converted data for a Revit file (see PageData.core.ingest.read_converter_output)."""
+    result = core_read_converter_output(file_path)
+    report_result(result)
+    return result.value if result.ok else None
 
 def convert_revit_data(path_conv, file_path):
     """Converts Revit data using the DDC converter.
@@ -54,10 +54,10 @@ def convert_revit_data(path_conv, file_path):
             stdout, stderr = process.communicate()
             if process.returncode == 0:
                 st.success("Conversion finished")
-                output_file = file_path[:-4] + "_rvt.xlsx"
-                df = pd.read_excel(output_file)
+                df = read_converter_output(file_path)
                 # df.columns = [col.split(' : ')[0] for col in df.columns]  # remove storage type does not work in streamlit visualisation
-                st.success("Revit data successfully loaded!")
+                if df is not None:
+                    st.success("Revit data successfully loaded!")
                 return df
             else:
                  st.error(f"Conversion failed. Error message: {stderr.decode('utf-8')}")
@@ -66,16 +66,46 @@ def convert_revit_data(path_conv, file_path):
         st.error(f"Error during Revit conversion: {e}")
         return None
 
+def is_new_upload(uploaded_file, uploader: str) -> bool:
+    """True the first time uploader holds this file, so reruns don't parse the same file again."""
+    key = State(__name__)(f"{uploader}_file_id")
+    if st.session_state.get(key) == uploaded_file.file_id:
+        return False
+    st.session_state[key] = uploaded_file.file_id
+    return True
+
 def upload_ddc():
     st.title("Data Upload")
-    data_source = st.radio("Select Data Source", ["Excel File", "Revit Converter"])
+    data_source = st.radio("Select Data Source", ["Excel File", "CSV / Parquet / Feather", "Batch Files", "Revit Converter"])
     if data_source == "Excel File":
         uploaded_file = st.file_uploader("Upload an Excel file", type="xlsx")
-        if uploaded_file is not None:
+        if uploaded_file is not None and is_new_upload(uploaded_file, "excel"):
             df = load_excel_data(uploaded_file)
             if df is not None:
                 st.session_state["excel_df"] = df
 
+    elif data_source == "CSV / Parquet / Feather":
+        uploaded_file = st.file_uploader(
+            "Upload a CSV, Parquet or Feather file",
+            type=[ext.lstrip(".") for ext in TABULAR_FORMATS],
+        )
+        if uploaded_file is not None and is_new_upload(uploaded_file, "tabular"):
+            df = load_tabular_data(uploaded_file)
+            if df is not None:
+                st.session_state["excel_df"] = df
+
+    elif data_source == "Batch Files":
+        from PageData.Upload.batch_ingest import load_batch_data  # batch_ingest reuses the readers above
+        uploaded_files = st.file_uploader(
+            "Upload exports (all sheets of every file are merged into one table)",
+            type=["xlsx"] + [ext.lstrip(".") for ext in TABULAR_FORMATS],
+            accept_multiple_files=True,
+        )
+        if uploaded_files and st.button("Load Batch"):
+            df = load_batch_data(uploaded_files)
+            if df is not None:
+                st.session_state["excel_df"] = df
+
     elif data_source == "Revit Converter":
         base_path_conv_path = r"e:\DDC"
         base_revit_file_path = r"e:\DDC\2022 rstadvancedsampleproject.rvt"
@@ -91,3 +121,16 @@ def upload_ddc():
             else:
                 st.warning("Please enter DDC converter folder and Revit file path.")
 
+        if st.button("Load Converted Output"):  # Skip the converter and reuse its last export
+            if file_path:
+                try:
+                    df = read_converter_output(file_path)
+                except Exception as e:
+                    st.error(f"Error loading converter output: {e}")
+                    df = None
+                if df is not None:
+                    st.session_state["excel_df"] = df
+                    st.success("Revit data successfully loaded!")
+            else:
+                st.warning("Please enter Revit file path.")
+
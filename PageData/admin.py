@@ -1,90 +1,14 @@
 import pandas as pd
 
-from PageData.DB.database import execute_sql, get_only_views_names, delete_view_by_name
+from PageData.DB.database import execute_sql, delete_view_by_name
+from PageData.DB.query_log import duration_by_data_version, slow_query_report
+from PageData.core.admin_changes import apply_api_key_changes, apply_snippet_changes
+from PageData.utils import report_result
 
 from sqlite3 import Connection
 import streamlit as st
 
 
-def delete_api_key(conn: Connection, id: str) -> None:
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM api_keys WHERE id = ?", (id,))
-    conn.commit()
-
-def update_api_key(conn: Connection, id: str, service: str, key: str) -> None:
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE api_keys SET service = ?, key = ? WHERE id = ?",
-        (service, key, id),
-    )
-    conn.commit()
-
-def update_code_snippet(conn: Connection, id: str, type_: str, code: str, name: str, is_view: bool, category:str) -> None:
-    """Updates a code snippet in the database.  If it's a view, recreates the view."""
-    cursor = conn.cursor()
-    try:
-        if is_view:
-            # Get the old view name (assuming it's stored in the 'name' column)
-            cursor.execute("SELECT name FROM code_snippets WHERE id = ?", (id,))
-            old_view_name = cursor.fetchone()[0]
-
-            # Drop the old view
-            cursor.execute(f'DROP VIEW IF EXISTS "{old_view_name}"') # Escape the view name, important for security and compatibility
-
-            # Create the new view
-            try:
-                cursor.execute(f'CREATE VIEW "{name}" AS {code}')  # Use the new name and code, escape the name
-            except Exception as e:
-                st.error(f"Error creating view: {e}")
-                conn.rollback()  # Rollback the transaction if view creation fails
-                return
-
-            # Update the code snippet in the database with the new name and code
-            cursor.execute(
-                "UPDATE code_snippets SET type = ?, code = ?, name = ?, is_view = ?, category=? WHERE id = ?",
-                (type_, code, name, is_view, category, id),
-            )
-        else:
-            # If not a view, just update the snippet
-            cursor.execute(
-                "UPDATE code_snippets SET type = ?, code = ?, name = ?, is_view = ?, category=? WHERE id = ?",
-                (type_, code, name, is_view, category, id),
-            )
-
-        conn.commit()
-        st.success(f"Code snippet with ID {id} updated successfully.")
-
-    except Exception as e:
-        st.error(f"Error updating code: {e}")
-        conn.rollback()  # Rollback the transaction in case of any error
-
-
-def delete_code_snippet(conn: Connection, code_id: str):
-    """Deletes a code snippet from the database. If it's a view, it also drops the view."""
-    try:
-        cursor = conn.cursor()
-
-        # Check if the code snippet is a view
-        cursor.execute("SELECT name, is_view FROM code_snippets WHERE id = ?", (code_id,))
-        result = cursor.fetchone()
-
-        if result:
-            view_name, is_view = result
-            if is_view:
-                # Drop the view if it exists
-                cursor.execute(f"DROP VIEW IF EXISTS \"{view_name}\"") # Escape the view name
-
-            # Delete the code snippet from the table
-            cursor.execute("DELETE FROM code_snippets WHERE id = ?", (code_id,))
-            conn.commit()
-            st.success(f"Code snippet with ID {code_id} deleted successfully.")
-        else:
-            st.warning(f"Code snippet with ID {code_id} not found.")
-
-    except Exception as e:
-        st.error(f"Error deleting code: {e}")
-        conn.rollback()
-
 def create_code_snippet(conn: Connection, type_: str, code: str, name: str, is_view: bool) -> None:
     """Creates a new code snippet in the database. If it's a view, it also creates the view."""
     cursor = conn.cursor()
@@ -115,7 +39,7 @@ def create_code_snippet(conn: Connection, type_: str, code: str, name: str, is_v
 def admin_panel(conn):
     """Displays the admin panel for managing data."""
     st.title("Admin Panel")
-    tab1, tab2, tab3 = st.tabs(["Code Snippets", "Views", "API Keys"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Code Snippets", "Views", "API Keys", "Slow queries"])
 
     with tab1:
         st.header("Code Snippets Management")
@@ -142,14 +66,9 @@ def admin_panel(conn):
                 hide_index=True #Hide the index.
             )
 
-            # Handle Updates and Deletions
+            # Handle Updates and Deletions: only rows that differ from the loaded data, in one transaction
             if st.button("Apply Changes"):
-                for index, row in edited_snippets.iterrows():
-                    if row["delete"]:
-                        delete_code_snippet(conn, row["id"])
-                    else:
-                        update_code_snippet(conn, row["id"], row["type"], row["code"], row["name"], row["is_view"],row["category"])
-                st.success("Changes Applied")
+                report_result(apply_snippet_changes(conn, code_snippets, edited_snippets))
         else:
             st.info("No code snippets found.")
 
@@ -215,16 +134,18 @@ def admin_panel(conn):
             )
 
             # Handle Updates, Delete
-            if st.button("Apply Changes"): #The button should be the last thing that happens.
-                for index, row in edited_api_keys.iterrows():
-                    if row["delete"]:
-                        delete_api_key(conn, row["id"])
-                    else:
-                        update_api_key(conn, row["id"], row["service"], row["key"])
-                st.success("Changes Applied")
+            if st.button("Apply Changes", key="api_keys_apply"): #The button should be the last thing that happens.
+                report_result(apply_api_key_changes(conn, api_keys, edited_api_keys))
         else:
             st.info("No API keys found.")
 
-
-
-
+    with tab4:
+        st.header("Slow Queries")
+        report = slow_query_report(conn)
+        if not report.empty:
+            st.subheader("Duration per snippet (ms)")
+            st.dataframe(report.round(1), hide_index=True)
+            st.subheader("Median duration per data version (ms)")
+            st.dataframe(duration_by_data_version(conn).round(1))
+        else:
+            st.info("No snippet executions logged yet.")
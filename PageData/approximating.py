@@ -0,0 +1,26 @@
+import streamlit as st
+from multipage_streamlit import State
+
+from PageData.DB.database import execute_sql
+from PageData.core.sampling import approximate_query
+
+
+def approximate_sql(conn, query: str, key: str, engine: str = "sqlite", snippet_id=None):
+    """Runs an aggregate query on the sample, with a button that re-runs it exactly.
+
+    Queries the sample can't answer (see core.sampling.parse_aggregate_query) run exactly right away.
+
+    Returns:
+        pandas DataFrame or str: The result, or the error message like execute_sql.
+    """
+    state = State(__name__)
+    result = approximate_query(conn, query)
+    if not result.ok:
+        st.caption(f"Exact result: {result.messages[-1][1]}")
+        return execute_sql(query, conn, snippet_id=snippet_id, engine=engine)
+    col1, col2 = st.columns([3, 1], vertical_alignment="center")
+    if col2.button("Run exact", key=state(f"{key}_exact")):
+        col1.caption("Exact result.")
+        return execute_sql(query, conn, snippet_id=snippet_id, engine=engine)
+    col1.caption(result.messages[-1][1])
+    return result.value
@@ -0,0 +1,212 @@
+"""Batch command line interface over the headless core engine.
+
+Usage:
+    python -m PageData.cli ingest exports/ --db model.db --workers 8
+    python -m PageData.cli ingest exports/ --db model.db --key "ElementId : ElementId"
+    python -m PageData.cli ingest exports/ --db model.db --spatial
+    python -m PageData.cli run-snippets --db model.db --category QA --output-dir results/
+    python -m PageData.cli run-pipeline --db model.db --target summary
+    python -m PageData.cli validate --db model.db --category QA --output violations.csv
+    python -m PageData.cli export --db model.db --table _df --output model.parquet
+
+The database written by `ingest` opens in the app with "Upload SQLite database".
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import sys
+
+import pandas as pd
+
+from PageData.DB.query_log import get_query_log_writer
+from PageData.core.dataset import LazyDataset
+from PageData.core.export import DEFAULT_CHUNK_ROWS, export_query
+from PageData.core.ingest import ingest_files, list_exports
+from PageData.core.pipeline import run_pipeline
+from PageData.core.results import OpResult
+from PageData.core.schema import create_app_tables
+from PageData.core.spatial import build_spatial_index, detect_box_columns, read_box_columns
+from PageData.core.snippets import load_snippets, run_snippets
+from PageData.core.tables import upsert_table, write_table
+from PageData.core.validation import check_rules, load_rules, violation_frame
+
+def print_result(result: OpResult, as_json: bool = False):
+    """Prints the messages of a result to stderr, or the whole result as JSON to stdout."""
+    if as_json:
+        print(json.dumps(result.to_dict(), default=str, indent=2))
+        return
+    for level, text, details in result.messages:
+        print(f"[{level}] {text}" + (f" {details}" if details is not None else ""), file=sys.stderr)
+
+
+def open_database(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    create_app_tables(conn)
+    return conn
+
+
+def collect_sources(paths: list) -> list:
+    """Expands folders into their supported files. Returns (file_name, path) pairs."""
+    sources = []
+    for path in paths:
+        if os.path.isdir(path):
+            sources.extend(list_exports(path))
+        else:
+            sources.append((os.path.basename(path), path))
+    return sources
+
+
+def cmd_ingest(args) -> OpResult:
+    sources = collect_sources(args.paths)
+    result = ingest_files(sources, args.workers)
+    if not result.ok:
+        return result
+    conn = open_database(args.db)
+    table_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (args.table,)).fetchone()
+    if args.key and table_exists:
+        table_result = upsert_table(result.value, conn, args.key, args.table)
+    else:
+        table_result = write_table(result.value, conn, args.table)
+    if args.spatial and table_result.ok and read_box_columns(conn, args.table) is None:
+        mapping = detect_box_columns(result.value.columns)
+        if mapping is None:
+            table_result.warning("No bounding box columns found, the spatial index was not built.")
+        else:
+            table_result.extend(build_spatial_index(conn, mapping, args.table))
+    conn.close()
+    result.extend(table_result)
+    result.ok = table_result.ok
+    result.value = table_result.value
+    return result
+
+
+def cmd_run_snippets(args) -> OpResult:
+    conn = open_database(args.db)
+    snippets = load_snippets(conn, args.name, args.category)
+    if snippets.empty:
+        conn.close()
+        return OpResult().fail("No matching snippets found.")
+    has_data = conn.execute("SELECT 1 FROM sqlite_master WHERE name = '_df'").fetchone()
+    python_vars = {"pd": pd, "df": LazyDataset(conn) if has_data else None}
+    result = run_snippets(conn, snippets, python_vars)
+    conn.close()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+        for run in result.value:
+            file_stem = os.path.join(args.output_dir, re.sub(r"[^\w\-]+", "_", run["name"]))
+            if "data" in run:
+                run["data"].to_csv(file_stem + ".csv", index=False)
+            elif run.get("output"):
+                with open(file_stem + ".txt", "w") as f:
+                    f.write(run["output"])
+        summary = [{key: value for key, value in run.items() if key != "data"} for run in result.value]
+        with open(os.path.join(args.output_dir, "summary.json"), "w") as f:
+            json.dump(summary, f, default=str, indent=2)
+        result.success(f"Results written to {args.output_dir}")
+    return result
+
+
+def cmd_run_pipeline(args) -> OpResult:
+    conn = open_database(args.db)
+    snippets = pd.read_sql("SELECT * FROM code_snippets", conn)
+    result = run_pipeline(conn, snippets, args.target, {"pd": pd}, args.workers, args.force)
+    conn.close()
+    for run in result.value:
+        duration = f"{run['duration_ms']:.0f} ms" if run["duration_ms"] is not None else ""
+        result.info(f"{run['output']}: {run['status']} {duration}".rstrip())
+    return result
+
+
+def cmd_validate(args) -> OpResult:
+    conn = open_database(args.db)
+    rules = load_rules(conn, args.category)
+    if rules.empty:
+        conn.close()
+        return OpResult().fail("No matching validation rules found.")
+    result = check_rules(conn, rules)
+    if result.ok and args.output:
+        violation_frame(conn, result.value, limit=None).to_csv(args.output, index=False)
+        result.success(f"Violating elements written to {args.output}")
+    conn.close()
+    if not result.ok:
+        return result
+    for rule in result.value["rules"].itertuples():
+        result.info(f"{rule.name} ({rule.severity}): {rule.violations} violations")
+    errors = result.value["rules"].query("severity == 'error' and violations > 0")
+    if args.strict and not errors.empty:
+        result.fail(f"Rules with severity error are violated: {len(errors)}.", details=errors["name"].tolist())
+    return result
+
+
+def cmd_export(args) -> OpResult:
+    extension = os.path.splitext(args.output)[1]
+    query = args.query or f'SELECT * FROM "{args.table}"'
+    conn = open_database(args.db)
+    result = export_query(conn, query, extension, args.output, args.chunk_rows)
+    conn.close()
+    return result
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m PageData.cli", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--json", action="store_true", help="Print the structured result as JSON")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    ingest = subparsers.add_parser("ingest", help="Load exports (files or folders) into a database")
+    ingest.add_argument("paths", nargs="+")
+    ingest.add_argument("--db", required=True, help="SQLite database file to create or update")
+    ingest.add_argument("--table", default="_df")
+    ingest.add_argument("--workers", type=int, help="Parser processes (default: number of CPUs)")
+    ingest.add_argument("--key", help="Element ID column; updates an existing table incrementally")
+    ingest.add_argument("--spatial", action="store_true",
+                        help="Index the element bounding boxes (columns detected by name) in an R*Tree")
+    ingest.set_defaults(func=cmd_ingest)
+
+    snippets = subparsers.add_parser("run-snippets", help="Run saved code snippets against a database")
+    snippets.add_argument("--db", required=True)
+    snippets.add_argument("--name", action="append", help="Snippet name (repeatable); default: all")
+    snippets.add_argument("--category")
+    snippets.add_argument("--output-dir", help="Write SQL results as CSV and a summary.json here")
+    snippets.set_defaults(func=cmd_run_snippets)
+
+    pipeline = subparsers.add_parser("run-pipeline", help="Bring pipeline output tables up to date")
+    pipeline.add_argument("--db", required=True)
+    pipeline.add_argument("--target", action="append", help="Output table (repeatable); default: all")
+    pipeline.add_argument("--workers", type=int, default=4, help="Threads for Python nodes")
+    pipeline.add_argument("--force", action="store_true", help="Re-run nodes whose inputs did not change")
+    pipeline.set_defaults(func=cmd_run_pipeline)
+
+    validate = subparsers.add_parser("validate", help="Check the validation rules against the data in one pass")
+    validate.add_argument("--db", required=True)
+    validate.add_argument("--category")
+    validate.add_argument("--output", help="Write the violating elements with the rules they violate to this CSV")
+    validate.add_argument("--strict", action="store_true", help="Exit with 1 if a rule with severity error is violated")
+    validate.set_defaults(func=cmd_validate)
+
+    export = subparsers.add_parser("export", help="Export a table or query to CSV, Parquet or Excel")
+    export.add_argument("--db", required=True)
+    source = export.add_mutually_exclusive_group(required=True)
+    source.add_argument("--table")
+    source.add_argument("--query")
+    export.add_argument("--output", required=True, help="File to write; the extension picks the format")
+    export.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS,
+                        help="Rows read and written at a time (Parquet row group size)")
+    export.set_defaults(func=cmd_export)
+    return parser
+
+
+def main(argv: list = None) -> int:
+    args = build_parser().parse_args(argv)
+    result = args.func(args)
+    # The query log is written by a daemon thread, which would die with the process
+    get_query_log_writer().flush()
+    print_result(result, args.json)
+    return 0 if result.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
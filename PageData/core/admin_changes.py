@@ -0,0 +1,161 @@
+import re
+from sqlite3 import Connection
+
+import pandas as pd
+
+from PageData.core.results import OpResult
+
+SNIPPET_COLUMNS = ["type", "code", "name", "is_view", "category", "inputs", "output", "engine"]
+API_KEY_COLUMNS = ["service", "key"]
+
+
+def diff_rows(original: pd.DataFrame, edited: pd.DataFrame, columns: list, key: str = "id",
+              delete_column: str = "delete") -> tuple:
+    """Compares an editor's output with the data it was loaded from.
+
+    Args:
+        original: Rows as loaded from the database.
+        edited: Rows returned by st.data_editor, with a boolean delete_column.
+        columns: Editable columns to compare.
+        key: Column identifying a row.
+        delete_column: Checkbox column marking rows for deletion.
+
+    Returns:
+        tuple: (changed rows of edited that are not deleted, list of keys marked for deletion)
+    """
+    if delete_column in edited:
+        deleted_mask = edited[delete_column].fillna(False).astype(bool)
+    else:
+        deleted_mask = pd.Series(False, index=edited.index)
+    deleted = edited.loc[deleted_mask, key].tolist()
+    kept = edited[~deleted_mask]
+
+    before = original.set_index(key)[columns].reindex(kept[key])
+    after = kept.set_index(key)[columns]
+    # NaN != NaN, so cells that are empty on both sides count as equal
+    same = (before == after) | (before.isna() & after.isna())
+    changed_keys = same.index[~same.all(axis=1)]
+    return kept[kept[key].isin(changed_keys)], deleted
+
+
+def referenced_views(code: str, view_names) -> set:
+    """Returns the names in view_names that a SQL definition refers to."""
+    return {name for name in view_names
+            if re.search(rf'(?<![\w"]){re.escape(name)}(?![\w"])|"{re.escape(name)}"', code or "", re.IGNORECASE)}
+
+
+def order_by_dependency(views: dict) -> list:
+    """Orders view names so that every view comes after the views it selects from.
+
+    Args:
+        views: view name -> SQL definition.
+
+    Returns:
+        list: View names, dependencies first. Views in a cycle keep their given order at the end.
+    """
+    dependencies = {name: referenced_views(code, views) - {name} for name, code in views.items()}
+    ordered = []
+    remaining = list(views)
+    while remaining:
+        ready = [name for name in remaining if dependencies[name].issubset(ordered)]
+        if not ready:
+            ordered.extend(remaining)
+            break
+        ordered.extend(ready)
+        remaining = [name for name in remaining if name not in ready]
+    return ordered
+
+
+def dependent_views(conn: Connection, names) -> list:
+    """Returns the views of conn that select from any of names, directly or through other views, in dependency order."""
+    views = dict(conn.execute("SELECT name, sql FROM sqlite_master WHERE type = 'view'").fetchall())
+    found, added = set(), set(names)
+    while added:
+        added = {name for name, sql in views.items() if name not in found and referenced_views(sql, added)}
+        found |= added
+    return [name for name in order_by_dependency(views) if name in found]
+
+
+def apply_snippet_changes(conn: Connection, original: pd.DataFrame, edited: pd.DataFrame) -> OpResult:
+    """Applies only the changed and deleted rows of the code snippet editor, in one transaction.
+
+    Views are dropped and recreated only for rows that changed. Recreated views are built
+    in dependency order and validated, and so are the views that select from a changed or
+    deleted view. Any failure rolls back every change.
+
+    Returns:
+        OpResult: value is a dict with the number of "updated", "deleted" and "views_rebuilt" rows.
+    """
+    result = OpResult()
+    changed, deleted = diff_rows(original, edited, SNIPPET_COLUMNS)
+    if changed.empty and not deleted:
+        result.value = {"updated": 0, "deleted": 0, "views_rebuilt": 0}
+        return result.info("No changes to apply.")
+
+    old = original.set_index("id")
+    touched = changed["id"].tolist() + deleted
+    old_views = {old.loc[i, "name"]: old.loc[i, "code"] for i in touched if old.loc[i, "is_view"]}
+    new_views = {row["name"]: row["code"] for _, row in changed.iterrows() if row["is_view"]}
+
+    cursor = conn.cursor()
+    try:
+        if not conn.in_transaction:
+            cursor.execute("BEGIN")  # DDL would otherwise autocommit outside the transaction
+        # Dependents first, so no view is dropped while another changed view still selects from it
+        for view_name in reversed(order_by_dependency(old_views)):
+            cursor.execute(f'DROP VIEW IF EXISTS "{view_name}"')
+        cursor.executemany("DELETE FROM code_snippets WHERE id = ?", [(code_id,) for code_id in deleted])
+        cursor.executemany(
+            "UPDATE code_snippets SET type = ?, code = ?, name = ?, is_view = ?, category = ?, inputs = ?, output = ?, "
+            "engine = ? WHERE id = ?",
+            [(row["type"], row["code"], row["name"], bool(row["is_view"]), row["category"], row["inputs"], row["output"],
+              row["engine"], row["id"])
+             for _, row in changed.iterrows()],
+        )
+        for view_name in order_by_dependency(new_views):
+            try:
+                cursor.execute(f'CREATE VIEW "{view_name}" AS {new_views[view_name]}')
+                cursor.execute(f'SELECT * FROM "{view_name}" LIMIT 0')  # SQLite only resolves tables when queried
+            except Exception as e:
+                conn.rollback()
+                return result.fail(f"Error creating view '{view_name}': {e}. No changes were applied.", e, view=view_name)
+        # Views that were not edited but select from a renamed, changed or deleted one
+        for view_name in dependent_views(conn, set(old_views) | set(new_views)):
+            if view_name in new_views:
+                continue
+            try:
+                cursor.execute(f'SELECT * FROM "{view_name}" LIMIT 0')
+            except Exception as e:
+                conn.rollback()
+                return result.fail(f"View '{view_name}' depends on a changed or deleted view: {e}. No changes were applied.", e,
+                                   view=view_name)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return result.fail(f"Error updating code: {e}. No changes were applied.", e)
+
+    result.value = {"updated": len(changed), "deleted": len(deleted), "views_rebuilt": len(new_views)}
+    return result.success(f"Updated {len(changed)} and deleted {len(deleted)} code snippets, "
+                          f"rebuilt {len(new_views)} views.")
+
+
+def apply_api_key_changes(conn: Connection, original: pd.DataFrame, edited: pd.DataFrame) -> OpResult:
+    """Applies only the changed and deleted rows of the API key editor, in one transaction."""
+    result = OpResult()
+    changed, deleted = diff_rows(original, edited, API_KEY_COLUMNS)
+    if changed.empty and not deleted:
+        result.value = {"updated": 0, "deleted": 0}
+        return result.info("No changes to apply.")
+    try:
+        cursor = conn.cursor()
+        cursor.executemany("DELETE FROM api_keys WHERE id = ?", [(key_id,) for key_id in deleted])
+        cursor.executemany(
+            "UPDATE api_keys SET service = ?, key = ? WHERE id = ?",
+            [(row["service"], row["key"], row["id"]) for _, row in changed.iterrows()],
+        )
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return result.fail(f"Error updating API keys: {e}. No changes were applied.", e)
+    result.value = {"updated": len(changed), "deleted": len(deleted)}
+    return result.success(f"Updated {len(changed)} and deleted {len(deleted)} API keys.")
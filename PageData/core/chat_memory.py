@@ -0,0 +1,86 @@
+import re
+from collections import deque
+
+DEFAULT_WINDOW_TURNS = 20
+# Turns read back from chat_history to rebuild the summary after a restart
+SUMMARY_SOURCE_TURNS = 200
+SUMMARY_MAX_CHARS = 2000
+SUMMARY_TEXT_CHARS = 160
+PROMPT_ANSWER_CHARS = 1000
+
+
+def _clip(text, max_chars: int) -> str:
+    """Collapses whitespace and cuts text to max_chars, at the end of a sentence if there is one."""
+    text = re.sub(r"\s+", " ", str(text)).strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text[:max_chars]
+    sentence_end = cut.rfind(". ")
+    return cut[:sentence_end + 1] if sentence_end > max_chars // 2 else cut.rstrip() + "…"
+
+
+def summarize_turns(summary: str, turns: list, max_chars: int = SUMMARY_MAX_CHARS) -> str:
+    """Folds turns into the rolling summary, one line per turn with the question and the start of the answer.
+
+    Only the most recent lines that fit into max_chars are kept, so the summary does not grow with
+    the conversation.
+    """
+    lines = summary.splitlines() if summary else []
+    lines += [f"- Q: {_clip(question, SUMMARY_TEXT_CHARS)} A: {_clip(answer, SUMMARY_TEXT_CHARS)}"
+              for question, answer in turns]
+    while len(lines) > 1 and sum(len(line) + 1 for line in lines) > max_chars:
+        lines.pop(0)
+    return "\n".join(lines)
+
+
+class ChatMemory:
+    """The context of a chat: the last window_turns turns verbatim and a rolling summary of the older ones.
+
+    Prompts built by prompt() stay the same size however long the conversation gets. The memory
+    only holds the context; the turns are persisted by the caller (see DB.chat_history), and
+    from_history() rebuilds the memory from them.
+
+    Args:
+        summarizer: Function (summary, turns) -> new summary for the turns that leave the window,
+            e.g. one that asks an LLM. Defaults to summarize_turns.
+    """
+
+    def __init__(self, window_turns: int = DEFAULT_WINDOW_TURNS, summarizer=None):
+        self.window_turns = max(window_turns, 2)
+        self.summarizer = summarizer or summarize_turns
+        self.turns = deque()
+        self.summary = ""
+        self.summarized_turns = 0
+
+    @classmethod
+    def from_history(cls, history: list, window_turns: int = DEFAULT_WINDOW_TURNS, summarizer=None) -> "ChatMemory":
+        """Rebuilds the memory from (question, answer) turns, oldest first."""
+        memory = cls(window_turns, summarizer)
+        for question, answer in history:
+            memory.add(question, answer)
+        return memory
+
+    def add(self, question: str, answer):
+        self.turns.append((question, answer))
+        if len(self.turns) > self.window_turns:
+            # Half a window at a time, so the summarizer runs every window_turns / 2 turns instead of every turn
+            old = [self.turns.popleft() for _ in range(len(self.turns) - self.window_turns // 2)]
+            self.summary = self.summarizer(self.summary, old)
+            self.summarized_turns += len(old)
+
+    def messages(self) -> list:
+        """The turns in the window as (role, content) chat messages."""
+        return [message for question, answer in self.turns for message in (("user", question), ("assistant", answer))]
+
+    def prompt(self, question: str) -> str:
+        """The question with the summary and the recent turns in front of it."""
+        parts = []
+        if self.summary:
+            parts.append(f"Summary of the earlier conversation:\n{self.summary}")
+        if self.turns:
+            parts.append("Recent conversation:\n" + "\n".join(
+                f"User: {_clip(q, PROMPT_ANSWER_CHARS)}\nAssistant: {_clip(a, PROMPT_ANSWER_CHARS)}" for q, a in self.turns
+            ))
+        if not parts:
+            return question
+        return "\n\n".join(parts + [f"Question: {question}"])
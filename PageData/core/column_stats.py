@@ -0,0 +1,167 @@
+import json
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from PageData.core.schema import get_data_version
+
+HLL_PRECISION = 12  # 4096 registers, about 1.6% standard error
+HISTOGRAM_BINS = 20
+TOP_K = 10
+
+PROFILE_COLUMNS = ["column_name", "position", "dtype", "rows", "null_count", "distinct_estimate", "min_value",
+                   "max_value", "histogram", "top_values", "data_version"]
+
+
+def profile_table_name(table_name: str) -> str:
+    """Returns the name of the table holding the per-column statistics of table_name."""
+    return f"{table_name}_profile"
+
+
+def hll_registers(hashes: np.ndarray, precision: int = HLL_PRECISION) -> np.ndarray:
+    """Builds HyperLogLog registers from 64-bit hashes, vectorized."""
+    hashes = hashes.astype(np.uint64, copy=False)
+    registers = np.zeros(1 << precision, dtype=np.uint8)
+    if not len(hashes):
+        return registers
+    index = (hashes >> np.uint64(64 - precision)).astype(np.int64)
+    # Position of the first 1 bit in the remaining bits; the guard bit bounds it for all-zero remainders
+    remainder = (hashes << np.uint64(precision)) | np.uint64(1 << (precision - 1))
+    _, exponent = np.frexp(remainder.astype(np.float64))
+    rank = (65 - exponent).astype(np.uint8)
+    np.maximum.at(registers, index, rank)
+    return registers
+
+
+def hll_estimate(registers: np.ndarray) -> int:
+    """Estimates the number of distinct values from HyperLogLog registers."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(np.exp2(-registers.astype(np.float64)))
+    zeros = int(np.count_nonzero(registers == 0))
+    if estimate <= 2.5 * m and zeros:
+        estimate = m * np.log(m / zeros)  # linear counting is more accurate for small cardinalities
+    return int(round(estimate))
+
+
+def _to_sql_value(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def column_profile(series: pd.Series) -> dict:
+    """Computes the statistics of one column: nulls, distinct estimate, min/max, histogram and top values."""
+    values = series.dropna()
+    profile = {
+        "dtype": str(series.dtype),
+        "rows": len(series),
+        "null_count": int(len(series) - len(values)),
+        "distinct_estimate": hll_estimate(hll_registers(pd.util.hash_pandas_object(values, index=False).to_numpy()))
+        if len(values) else 0,
+        "min_value": None,
+        "max_value": None,
+        "histogram": None,
+        "top_values": None,
+    }
+    if not len(values):
+        return profile
+
+    if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+        numbers = values.to_numpy(dtype=np.float64)
+        numbers = numbers[np.isfinite(numbers)]
+        if len(numbers):
+            profile["min_value"], profile["max_value"] = _to_sql_value(values.min()), _to_sql_value(values.max())
+            counts, edges = np.histogram(numbers, bins=HISTOGRAM_BINS)
+            profile["histogram"] = json.dumps({"edges": edges.tolist(), "counts": counts.tolist()})
+    else:
+        # Mixed object columns (e.g. numbers and text from Excel) are compared as text
+        text = values if pd.api.types.is_datetime64_any_dtype(values.dtype) else values.astype(str)
+        profile["min_value"], profile["max_value"] = _to_sql_value(text.min()), _to_sql_value(text.max())
+
+    top = values.astype(str).value_counts().head(TOP_K) if values.dtype == object else values.value_counts().head(TOP_K)
+    profile["top_values"] = json.dumps([[_to_sql_value(value), int(count)] for value, count in top.items()], default=str)
+    return profile
+
+
+def compute_profile(df: pd.DataFrame, columns: list = None) -> pd.DataFrame:
+    """Returns one row of statistics per column of df (or of the given columns)."""
+    positions = {col: position for position, col in enumerate(df.columns)}
+    rows = [{"column_name": str(col), "position": positions[col], **column_profile(df[col])}
+            for col in (columns if columns is not None else df.columns)]
+    return pd.DataFrame(rows, columns=PROFILE_COLUMNS[:-1])
+
+
+def write_profile(conn: sqlite3.Connection, df: pd.DataFrame, table_name: str = "_df", columns: list = None):
+    """Computes and stores the statistics of df, the current contents of table_name.
+
+    With columns given, only those columns are recomputed and the rows of the others are kept;
+    every row is stamped with the current data version so stale profiles can be detected.
+    """
+    data_version = get_data_version(conn)
+    profile = compute_profile(df, columns)
+    profile["data_version"] = data_version
+    profile_table = profile_table_name(table_name)
+    cursor = conn.cursor()
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS "{profile_table}" (
+            column_name TEXT PRIMARY KEY,
+            position INTEGER,
+            dtype TEXT,
+            rows INTEGER,
+            null_count INTEGER,
+            distinct_estimate INTEGER,
+            min_value,
+            max_value,
+            histogram TEXT,
+            top_values TEXT,
+            data_version INTEGER
+        )
+    ''')
+    if columns is None:
+        cursor.execute(f'DELETE FROM "{profile_table}"')
+    else:
+        # Columns that were not recomputed are unchanged, so they move to the new version as well
+        cursor.execute(f'UPDATE "{profile_table}" SET data_version = ?', (data_version,))
+    placeholders = ", ".join("?" for _ in PROFILE_COLUMNS)
+    cursor.executemany(
+        f'INSERT OR REPLACE INTO "{profile_table}" ({", ".join(PROFILE_COLUMNS)}) VALUES ({placeholders})',
+        [tuple(_to_sql_value(value) for value in row) for row in profile[PROFILE_COLUMNS].itertuples(index=False)],
+    )
+    conn.commit()
+
+
+def profile_is_current(conn: sqlite3.Connection, table_name: str = "_df") -> bool:
+    """True if table_name has stored statistics for the current data version."""
+    profile_table = profile_table_name(table_name)
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name = ?", (profile_table,)).fetchone():
+        return False
+    versions = conn.execute(f'SELECT MIN(data_version), MAX(data_version) FROM "{profile_table}"').fetchone()
+    return versions[0] is not None and versions[0] == versions[1] == get_data_version(conn)
+
+
+def read_profile(conn: sqlite3.Connection, table_name: str = "_df") -> pd.DataFrame or None:
+    """Returns the stored statistics of table_name, or None if there are none for the current data version."""
+    if not profile_is_current(conn, table_name):
+        return None
+    return pd.read_sql(f'SELECT * FROM "{profile_table_name(table_name)}" ORDER BY position', conn)
+
+
+def changed_columns(old_rows: pd.DataFrame, new_rows: pd.DataFrame) -> list:
+    """Returns the columns whose values differ between two versions of the same rows (aligned by index)."""
+    old_rows = old_rows.reindex(new_rows.index)
+    changed = []
+    for col in new_rows.columns:
+        if col not in old_rows:
+            changed.append(col)
+            continue
+        old, new = old_rows[col], new_rows[col]
+        same = (old == new) | (old.isna() & new.isna())
+        if not same.all():
+            changed.append(col)
+    return changed
@@ -0,0 +1,162 @@
+import itertools
+import json
+import sqlite3
+
+import pandas as pd
+
+from PageData.core.results import OpResult
+from PageData.core.schema import get_data_version
+
+CUBE_TABLE = "_cube"
+GROUPING_COLUMN = "_grouping"
+ROWS_COLUMN = "_rows"
+AGGREGATES = ["sum", "count", "min", "max"]
+# Up to this many dimensions every combination is precomputed; above it only rollups and single dimensions
+MAX_FULL_CUBE_DIMENSIONS = 5
+
+
+def measure_column(aggregate: str, measure: str) -> str:
+    return f"{aggregate}({measure})"
+
+
+def default_grouping_sets(dimensions: list) -> list:
+    """Returns the grouping sets worth precomputing: all combinations for a few dimensions,
+    otherwise the ROLLUP prefixes (Category > Level > ...) plus every single dimension."""
+    if len(dimensions) <= MAX_FULL_CUBE_DIMENSIONS:
+        return [list(combination) for size in range(len(dimensions), -1, -1)
+                for combination in itertools.combinations(dimensions, size)]
+    sets = [dimensions[:size] for size in range(len(dimensions), -1, -1)]
+    sets.extend([dimension] for dimension in dimensions[1:])
+    return sets
+
+
+def grouping_mask(dimensions: list, grouping_set: list) -> int:
+    """Bit i is set when dimension i is aggregated away, like SQL's GROUPING_ID."""
+    return sum(1 << i for i, dimension in enumerate(dimensions) if dimension not in grouping_set)
+
+
+def _rollup(finest: pd.DataFrame, grouping_set: list, measures: list) -> pd.DataFrame:
+    """Aggregates the finest level further. Sums and counts add up, minima and maxima combine."""
+    functions = {ROWS_COLUMN: "sum"}
+    for measure in measures:
+        for aggregate in AGGREGATES:
+            functions[measure_column(aggregate, measure)] = "sum" if aggregate in ("sum", "count") else aggregate
+    if not grouping_set:
+        return finest.agg(functions).to_frame().T
+    return finest.groupby(grouping_set, dropna=False, sort=False).agg(functions).reset_index()
+
+
+def build_cube(df: pd.DataFrame, dimensions: list, measures: list, grouping_sets: list = None) -> pd.DataFrame:
+    """Precomputes sum, count, min and max of the measures at every grouping set, in one pass over df.
+
+    Only the finest level (all dimensions) is aggregated from df; every other grouping set is
+    rolled up from that much smaller result. Dimensions missing from a grouping set are NULL and
+    the _grouping bitmask tells them apart from real NULL values.
+    """
+    grouping_sets = grouping_sets or default_grouping_sets(dimensions)
+    values = df[dimensions].copy()
+    named = {}
+    for measure in measures:
+        values[measure] = pd.to_numeric(df[measure], errors="coerce")
+        for aggregate in AGGREGATES:
+            named[measure_column(aggregate, measure)] = pd.NamedAgg(column=measure, aggfunc=aggregate)
+    named[ROWS_COLUMN] = pd.NamedAgg(column=dimensions[0], aggfunc="size")
+    finest = values.groupby(dimensions, dropna=False, sort=False).agg(**named).reset_index()
+
+    levels = []
+    for grouping_set in grouping_sets:
+        level = finest if sorted(grouping_set) == sorted(dimensions) else _rollup(finest, grouping_set, measures)
+        level = level.reindex(columns=dimensions + list(named))
+        level.insert(0, GROUPING_COLUMN, grouping_mask(dimensions, grouping_set))
+        levels.append(level)
+    return pd.concat(levels, ignore_index=True)
+
+
+def read_cube_definition(conn: sqlite3.Connection) -> dict or None:
+    """Returns {"table", "dimensions", "measures", "grouping_sets", "data_version"} of the stored cube, or None."""
+    try:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'cube_definition'").fetchone()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def cube_is_current(conn: sqlite3.Connection) -> bool:
+    definition = read_cube_definition(conn)
+    return definition is not None and definition["data_version"] == get_data_version(conn)
+
+
+def write_cube(conn: sqlite3.Connection, df: pd.DataFrame, dimensions: list, measures: list,
+               table_name: str = "_df", grouping_sets: list = None) -> OpResult:
+    """Builds the cube over df (the contents of table_name) and stores it in the _cube table.
+
+    The definition is kept in app_meta, so write_table and upsert_table rebuild the cube whenever
+    the table changes.
+    """
+    result = OpResult()
+    missing = [col for col in dimensions + measures if col not in df.columns]
+    if missing:
+        return result.fail(f"Columns not found in {table_name}: {missing}", columns=missing)
+    if not dimensions or not measures:
+        return result.fail("Pick at least one dimension and one measure.")
+    try:
+        grouping_sets = grouping_sets or default_grouping_sets(dimensions)
+        cube = build_cube(df, dimensions, measures, grouping_sets)
+        cube.to_sql(CUBE_TABLE, conn, if_exists="replace", index=False)
+        conn.execute(f'CREATE INDEX IF NOT EXISTS "{CUBE_TABLE}_grouping" ON "{CUBE_TABLE}" ({GROUPING_COLUMN})')
+        definition = {"table": table_name, "dimensions": dimensions, "measures": measures,
+                      "grouping_sets": grouping_sets, "data_version": get_data_version(conn)}
+        conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('cube_definition', ?)", (json.dumps(definition),))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return result.fail(f"Error building the takeoff cube: {e}", e)
+    result.value = {"rows": len(cube), "grouping_sets": len(grouping_sets)}
+    return result.success(f"Takeoff cube built: {len(grouping_sets)} grouping sets, {len(cube)} rows.")
+
+
+def refresh_cube(conn: sqlite3.Connection, df: pd.DataFrame, table_name: str) -> OpResult or None:
+    """Rebuilds the cube after table_name was written, if a cube is defined over it."""
+    definition = read_cube_definition(conn)
+    if definition is None or definition["table"] != table_name:
+        return None
+    return write_cube(conn, df, definition["dimensions"], definition["measures"], table_name,
+                      definition["grouping_sets"])
+
+
+def query_cube(conn: sqlite3.Connection, group_by: list, filters: dict = None) -> pd.DataFrame:
+    """Answers an aggregate query from the cube instead of scanning the table.
+
+    Args:
+        conn: The database holding the cube.
+        group_by: Dimensions to group by.
+        filters: dimension -> value to restrict to (None matches empty values).
+
+    Returns:
+        pandas DataFrame: One row per group with _rows and sum/count/min/max/avg of every measure.
+    """
+    definition = read_cube_definition(conn)
+    dimensions = definition["dimensions"]
+    filters = filters or {}
+    needed = set(group_by) | set(filters)
+    # The smallest precomputed grouping set that contains every dimension the query needs
+    grouping_set = min((set(grouping_set) for grouping_set in definition["grouping_sets"] if needed <= set(grouping_set)),
+                       key=len, default=set(dimensions))
+
+    conditions = [f"{GROUPING_COLUMN} = ?"]
+    params = [grouping_mask(dimensions, grouping_set)]
+    for dimension, value in filters.items():
+        if value is None:
+            conditions.append(f'"{dimension}" IS NULL')
+        else:
+            conditions.append(f'"{dimension}" = ?')
+            params.append(value)
+    rows = pd.read_sql(f'SELECT * FROM "{CUBE_TABLE}" WHERE {" AND ".join(conditions)}', conn, params=params)
+
+    if grouping_set != set(group_by):
+        rows = _rollup(rows, group_by, definition["measures"])
+    rows = rows[group_by + [col for col in rows.columns if col not in dimensions and col != GROUPING_COLUMN]]
+    for measure in definition["measures"]:
+        total, count = rows[measure_column("sum", measure)], rows[measure_column("count", measure)]
+        rows[measure_column("avg", measure)] = total / count.where(count > 0)
+    return rows.reset_index(drop=True)
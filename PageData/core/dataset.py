@@ -0,0 +1,388 @@
+import ast
+import io
+import re
+import sqlite3
+import threading
+import tokenize
+from collections import OrderedDict
+
+import pandas as pd
+
+from PageData.core.engines import VERSIONED_TABLES
+from PageData.core.schema import database_uri, get_data_version
+
+# Per database: cached selections count towards their workspace's memory (see core.workspaces)
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+# Methods that return rows of the frame with all of its columns: which columns are read depends on
+# what the code does with the result. dropna and drop_duplicates look at every column, so they are not here.
+ROW_METHODS = {"query", "head", "tail", "sample", "sort_values", "sort_index", "nlargest", "nsmallest",
+               "groupby", "reset_index"}
+COMPARISONS = {ast.Eq: "=", ast.NotEq: "!=", ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+MIRRORED = {ast.Eq: ast.Eq, ast.NotEq: ast.NotEq, ast.Lt: ast.Gt, ast.LtE: ast.GtE, ast.Gt: ast.Lt, ast.GtE: ast.LtE}
+NULL_CHECKS = {"isna": "IS NULL", "isnull": "IS NULL", "notna": "IS NOT NULL", "notnull": "IS NOT NULL"}
+
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+class FrameCache:
+    """Materialized selections of versioned tables, least recently used first out beyond max_bytes per database.
+
+    Registered with the workspace manager (see WorkspaceManager.add_cache), which sets budget to
+    limit the selections of a workspace to what is left of its quota.
+    """
+
+    def __init__(self, max_bytes: int = MAX_FRAME_BYTES):
+        self.max_bytes = max_bytes
+        self.budget = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry[0]
+            return None
+
+    def put(self, key: tuple, df: pd.DataFrame):
+        size = int(df.memory_usage(index=False, deep=True).sum())
+        database, table_name, version = key[:3]
+        budget = self.budget(database) if self.budget else None
+        limit = self.max_bytes if budget is None else min(self.max_bytes, budget)
+        with self._lock:
+            # Selections of older versions of the same table are never read again
+            for old_key in [k for k in self._entries if k[:2] == (database, table_name) and k[2] != version]:
+                del self._entries[old_key]
+            if size > limit:
+                return
+            self._entries[key] = (df, size)
+            while self._nbytes(database) > limit:
+                del self._entries[next(k for k in self._entries if k[0] == database)]
+
+    def _nbytes(self, database: str) -> int:
+        return sum(entry[1] for key, entry in self._entries.items() if key[0] == database)
+
+    def nbytes(self, database: str) -> int:
+        with self._lock:
+            return self._nbytes(database)
+
+    def evict(self, database: str):
+        """Drops the selections of one database, e.g. when its workspace is spilled."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == database]:
+                del self._entries[key]
+
+
+_frame_cache = FrameCache()
+
+
+def get_frame_cache() -> FrameCache:
+    return _frame_cache
+
+
+def column_types(conn: sqlite3.Connection, table_name: str) -> dict:
+    """Returns the declared SQL type of every column of table_name, in table order."""
+    return {row[1]: row[2] or "" for row in conn.execute(f"PRAGMA table_info({_quote(table_name)})")}
+
+
+def _affinity(declared_type: str) -> str:
+    """SQLite's column affinity for a declared type (see "Determination Of Column Affinity")."""
+    declared_type = declared_type.upper()
+    if "INT" in declared_type:
+        return "INTEGER"
+    if any(text in declared_type for text in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if not declared_type or "BLOB" in declared_type:
+        return "BLOB"
+    if any(real in declared_type for real in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+
+def _query_names(text: str, columns: set) -> set:
+    """Columns named in a DataFrame.query string, quoted with backticks or as plain identifiers."""
+    return {name for name in re.findall(r"`([^`]*)`", text) + re.findall(r"\w+", text) if name in columns}
+
+
+def query_to_sql(expr: str, types: dict) -> tuple or None:
+    """Translates a DataFrame.query expression into an SQL condition, so SQLite filters the rows.
+
+    Handles comparisons of a column with a constant, "in" and "not in" lists, column.isna() and
+    column.notna(), and/or/not and &, |, ~. Comparisons are two-valued like in pandas: NULL (NaN)
+    is unequal to everything. They are only translated if the constant has the type the column
+    stores (text for TEXT columns, numbers for INTEGER and REAL ones): otherwise SQLite would
+    convert the constant (TEXT "1" = 1), where pandas compares "1" with 1 as unequal.
+
+    Args:
+        types: The declared type of every column, see column_types.
+
+    Returns:
+        tuple: (condition, params), or None if the expression uses anything else (@variables,
+            arithmetic, other method calls, comparisons between columns, ...).
+    """
+    names = {}
+
+    def placeholder(match):
+        names[f"__column{len(names)}__"] = match.group(1)
+        return f"__column{len(names) - 1}__"
+
+    try:
+        # Like pandas, & and | bind weaker than comparisons in a query ("a > 1 & b < 2")
+        tokens = [(tokenize.NAME, {"&": "and", "|": "or"}[token.string]) if token.string in ("&", "|")
+                  else (token.type, token.string)
+                  for token in tokenize.generate_tokens(io.StringIO(re.sub(r"`([^`]*)`", placeholder, expr)).readline)]
+        tree = ast.parse(tokenize.untokenize(tokens).strip(), mode="eval")
+    except (SyntaxError, tokenize.TokenError):
+        return None
+    known = {str(col): _affinity(declared_type) for col, declared_type in types.items()}
+    params = []
+
+    class Untranslatable(Exception):
+        pass
+
+    def column(node) -> str:
+        if isinstance(node, ast.Name) and names.get(node.id, node.id) in known:
+            return names.get(node.id, node.id)
+        raise Untranslatable
+
+    def compared(name: str, value) -> str:
+        """The placeholder for value compared with the column name, if SQLite compares them like pandas."""
+        if known[name] not in (("TEXT",) if isinstance(value, str) else ("INTEGER", "REAL")):
+            raise Untranslatable
+        params.append(value)
+        return "?"
+
+    def constant(node):
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+            value = constant(node.operand)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return -value
+        elif isinstance(node, ast.Constant) and isinstance(node.value, (str, int, float)):
+            return node.value
+        raise Untranslatable
+
+    def comparison(left, op, right) -> str:
+        if isinstance(op, (ast.In, ast.NotIn)):
+            if not isinstance(right, (ast.List, ast.Tuple, ast.Set)):
+                raise Untranslatable
+            name = column(left)
+            placeholders = ", ".join(compared(name, constant(value)) for value in right.elts)
+            negate = isinstance(op, ast.NotIn)
+            return f"COALESCE({_quote(name)} {'NOT ' if negate else ''}IN ({placeholders}), {int(negate)})"
+        if type(op) not in COMPARISONS:
+            raise Untranslatable
+        try:
+            name, value = column(left), constant(right)
+        except Untranslatable:
+            name, value, op = column(right), constant(left), MIRRORED[type(op)]()
+        placeholder = compared(name, value)
+        return f"COALESCE({_quote(name)} {COMPARISONS[type(op)]} {placeholder}, {int(isinstance(op, ast.NotEq))})"
+
+    def condition(node) -> str:
+        if isinstance(node, ast.BoolOp):
+            joiner = " AND " if isinstance(node.op, ast.And) else " OR "
+            return "(" + joiner.join(condition(value) for value in node.values) + ")"
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.Invert)):
+            return f"(NOT {condition(node.operand)})"
+        if isinstance(node, ast.Compare):
+            operands = [node.left] + node.comparators
+            parts = [comparison(operands[i], op, operands[i + 1]) for i, op in enumerate(node.ops)]
+            return parts[0] if len(parts) == 1 else "(" + " AND ".join(parts) + ")"
+        if (isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and node.func.attr in NULL_CHECKS
+                and not node.args and not node.keywords):
+            return f"({_quote(column(node.func.value))} {NULL_CHECKS[node.func.attr]})"
+        raise Untranslatable
+
+    try:
+        return condition(tree.body), params
+    except Untranslatable:
+        return None
+
+
+def _is_column_selection(node) -> bool:
+    """True for the key of df["a"] or df[["a", "b"]]."""
+    if isinstance(node, ast.Constant):
+        return isinstance(node.value, str)
+    return isinstance(node, (ast.List, ast.Tuple)) and all(_is_column_selection(element) for element in node.elts)
+
+
+def _reads_only_columns(node, parents: dict, known: set) -> bool:
+    """True if the frame-valued expression node is only used through selections of named columns."""
+    parent = parents.get(node)
+    if isinstance(parent, ast.Subscript) and parent.value is node:
+        if _is_column_selection(parent.slice):
+            return True
+        # A boolean mask keeps every column: what matters is how the filtered rows are used
+        if isinstance(parent.slice, (ast.Compare, ast.BoolOp, ast.BinOp, ast.UnaryOp)):
+            return _reads_only_columns(parent, parents, known)
+        return False
+    if isinstance(parent, ast.Attribute) and parent.value is node:
+        if parent.attr in known or parent.attr == "index":
+            return True
+        call = parents.get(parent)
+        if parent.attr in ROW_METHODS and isinstance(call, ast.Call) and call.func is parent:
+            return _reads_only_columns(call, parents, known)
+        if parent.attr == "loc" and isinstance(call, ast.Subscript) and call.value is parent:
+            key = call.slice
+            if isinstance(key, ast.Tuple) and len(key.elts) == 2:
+                return _is_column_selection(key.elts[1])
+            return _reads_only_columns(call, parents, known)
+        return False
+    # len(df) does not depend on the columns
+    return isinstance(parent, ast.Call) and isinstance(parent.func, ast.Name) and parent.func.id == "len"
+
+
+def _rebound_before_use(tree: ast.Module, name: str) -> bool:
+    """True if the first top-level statement mentioning name assigns it without reading it."""
+    for statement in tree.body:
+        mentions = [node for node in ast.walk(statement) if isinstance(node, ast.Name) and node.id == name]
+        if mentions:
+            return isinstance(statement, ast.Assign) and all(isinstance(node.ctx, ast.Store) for node in mentions)
+    return False
+
+
+def columns_used(code: str, columns, name: str = "df") -> list or None:
+    """Returns the columns that code reads from the frame in the variable name, in table order.
+
+    Code that only selects named columns (df["Volume"], df[["Level", "Area"]], df.Volume,
+    df[mask]["Volume"], df.loc[mask, "Volume"], df.groupby("Level")["Area"], df.query(...)["Area"])
+    needs only those; code that uses the whole frame (df.describe(), df.plot(), passing df
+    to a function, dynamic column names) may read any column. The analysis errs on the side
+    of reading more: names that only look like columns are included too.
+
+    Returns:
+        list: The columns, or None if the code may read any column.
+    """
+    try:
+        tree = ast.parse(code or "")
+    except SyntaxError:
+        return None
+    if _rebound_before_use(tree, name):
+        return []
+    known = set(map(str, columns))
+    parents = {child: node for node in ast.walk(tree) for child in ast.iter_child_nodes(node)}
+    used = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and node.id == name and isinstance(node.ctx, ast.Load):
+            if not _reads_only_columns(node, parents, known):
+                return None
+        elif isinstance(node, ast.Constant) and isinstance(node.value, str):
+            used |= {node.value} & known or _query_names(node.value, known)
+        elif isinstance(node, ast.Attribute) and node.attr in known:
+            used.add(node.attr)
+    return [col for col in columns if str(col) in used]
+
+
+class LazyDataset:
+    """A table of the database used like a DataFrame, read only as far as it is used.
+
+    The table stays the single copy of the data: selections are read from SQLite with only the
+    requested columns (projection) and rows (predicate), and kept per data version, so the same
+    selection is read once until the table is written again. Anything else a DataFrame offers
+    reads the whole table once (e.g. data.describe()).
+
+    Example:
+        data.select(["Level : String", "Volume : Double"], where='"Volume : Double" > ?', params=[1])
+        data.query("`Category : String` == 'Walls'", columns=["Volume : Double"])
+
+    Args:
+        conn: The database, or a function returning it; a function is called for every read, so the
+            dataset outlives connections that are replaced (e.g. a session workspace that was restored).
+    """
+
+    def __init__(self, conn, table_name: str = "_df"):
+        self._connect = (lambda: conn) if isinstance(conn, sqlite3.Connection) else conn
+        self.table_name = table_name
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._connect()
+
+    @property
+    def columns(self) -> pd.Index:
+        return pd.Index([row[1] for row in self.conn.execute(f"PRAGMA table_info({_quote(self.table_name)})")])
+
+    @property
+    def shape(self) -> tuple:
+        return len(self), len(self.columns)
+
+    def __len__(self) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {_quote(self.table_name)}").fetchone()[0]
+
+    def __iter__(self):
+        return iter(self.columns)
+
+    def __repr__(self) -> str:
+        return f"LazyDataset({self.table_name!r})"
+
+    def select(self, columns: list = None, where: str = None, params=(), keep_positions: bool = False) -> pd.DataFrame:
+        """Reads columns (default: all) of the rows matching the SQL condition where.
+
+        The rows are numbered from 0, or with keep_positions by their position in the whole table,
+        like a filter of the full frame numbers them.
+        """
+        conn = self.conn
+        params = tuple(params)
+        keep_positions = bool(where) and keep_positions
+        key = None
+        if self.table_name in VERSIONED_TABLES:
+            version = (database_uri(conn), self.table_name, get_data_version(conn))
+            key = version + (None if columns is None else tuple(columns), where, params, keep_positions)
+            cached = _frame_cache.get(key)
+            if cached is None and columns is not None:
+                cached = _frame_cache.get(version + (None, where, params, keep_positions))
+                cached = None if cached is None else cached[list(columns)]
+            if cached is not None:
+                # A shallow copy: code adding columns to its frame must not change the cached one
+                return cached.copy(deep=False)
+        condition = f" WHERE {where}" if where else ""
+        if keep_positions:
+            selected = "*" if columns is None else ", ".join(["__position__"] + list(map(_quote, columns)))
+            df = pd.read_sql(f"SELECT {selected} FROM (SELECT ROW_NUMBER() OVER (ORDER BY rowid) - 1 AS __position__, "
+                             f"* FROM {_quote(self.table_name)}){condition}", conn, params=params)
+            df = df.set_index("__position__").rename_axis(None)
+        elif columns is not None and not len(columns):
+            rows = conn.execute(f"SELECT COUNT(*) FROM {_quote(self.table_name)}{condition}", params).fetchone()[0]
+            df = pd.DataFrame(index=pd.RangeIndex(rows))
+        else:
+            selected = "*" if columns is None else ", ".join(map(_quote, columns))
+            df = pd.read_sql(f"SELECT {selected} FROM {_quote(self.table_name)}{condition}", conn, params=params)
+        if key is not None:
+            _frame_cache.put(key, df)
+        return df.copy(deep=False)
+
+    def query(self, expr: str, columns: list = None) -> pd.DataFrame:
+        """Rows matching a DataFrame.query expression; SQLite filters them if query_to_sql can translate it."""
+        types = column_types(self.conn, self.table_name)
+        table_columns = list(types)
+        translated = query_to_sql(expr, types)
+        if translated is not None:
+            return self.select(columns, *translated, keep_positions=True)
+        if columns is None:
+            return self.select().query(expr, level=1)
+        needed = list(dict.fromkeys(list(columns) + [col for col in table_columns
+                                                     if col in _query_names(expr, set(table_columns))]))
+        return self.select(needed).query(expr, level=1)[list(columns)]
+
+    def head(self, n: int = 5) -> pd.DataFrame:
+        return pd.read_sql(f"SELECT * FROM {_quote(self.table_name)} LIMIT ?", self.conn, params=(n,))
+
+    def to_pandas(self) -> pd.DataFrame:
+        return self.select()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.select([key])[key]
+        if isinstance(key, list) and all(isinstance(col, str) for col in key):
+            return self.select(key)
+        return self.to_pandas()[key]
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self.columns:
+            return self[name]
+        return getattr(self.to_pandas(), name)
@@ -0,0 +1,207 @@
+import importlib.util
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from PageData.core.schema import database_uri, get_data_version
+
+ENGINES = ["auto", "sqlite", "duckdb"]
+# Only these tables are changed exclusively by write_table/upsert_table, which bump the data version
+VERSIONED_TABLES = {"_df"}
+# Below this many rows SQLite answers fast enough that the hand-over to DuckDB is not worth it
+AUTO_MIN_ROWS = 100_000
+# Per database: Arrow copies count towards their workspace's memory (see core.workspaces)
+MAX_ARROW_BYTES = 512 * 1024 * 1024
+# Constructs that behave differently in DuckDB (integer division, case-insensitive LIKE, date
+# functions, SQLite-only functions), so auto mode keeps such queries on SQLite
+SQLITE_ONLY_PATTERN = re.compile(
+    r"/|\b(like|glob|regexp|match|strftime|date|time|datetime|julianday|unixepoch|typeof|printf|format|"
+    r"group_concat|total|ifnull|instr|rowid|likelihood|random)\b",
+    re.IGNORECASE,
+)
+AGGREGATE_PATTERN = re.compile(r"\bgroup\s+by\b|\b(sum|count|avg|min|max)\s*\(", re.IGNORECASE)
+
+
+def duckdb_available() -> bool:
+    return importlib.util.find_spec("duckdb") is not None
+
+
+class ArrowTableCache:
+    """Arrow copies of versioned tables, least recently used first out beyond max_bytes per database.
+
+    Registered with the workspace manager (see WorkspaceManager.add_cache), which sets budget to
+    limit the copies of a workspace to what is left of its quota.
+    """
+
+    def __init__(self, max_bytes: int = MAX_ARROW_BYTES):
+        self.max_bytes = max_bytes
+        self.budget = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, table, text_columns: set):
+        database, table_name, _ = key
+        budget = self.budget(database) if self.budget else None
+        limit = self.max_bytes if budget is None else min(self.max_bytes, budget)
+        with self._lock:
+            # Older versions of the same table are never queried again
+            for old_key in [k for k in self._entries if k[:2] == (database, table_name)]:
+                del self._entries[old_key]
+            if table.nbytes > limit:
+                return  # used for this query only
+            self._entries[key] = (table, text_columns)
+            while self._nbytes(database) > limit:
+                del self._entries[next(k for k in self._entries if k[0] == database)]
+
+    def _nbytes(self, database: str) -> int:
+        return sum(entry[0].nbytes for key, entry in self._entries.items() if key[0] == database)
+
+    def nbytes(self, database: str) -> int:
+        with self._lock:
+            return self._nbytes(database)
+
+    def evict(self, database: str):
+        """Drops the copies of one database, e.g. when its workspace is spilled."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == database]:
+                del self._entries[key]
+
+
+_arrow_cache = ArrowTableCache()
+
+
+def get_arrow_cache() -> ArrowTableCache:
+    return _arrow_cache
+
+
+def to_arrow(df: pd.DataFrame):
+    """Converts df to an Arrow table. Columns mixing numbers and text (e.g. from Excel) become text.
+
+    Returns:
+        tuple: (pyarrow Table, set of the columns converted to text)
+    """
+    import pyarrow as pa
+
+    text_columns = set()
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if df[col].dtype == object and pd.api.types.infer_dtype(df[col], skipna=True).startswith("mixed"):
+            df[col] = df[col].map(lambda value: value if value is None or value != value else str(value))
+            text_columns.add(str(col))
+    return pa.Table.from_pandas(df, preserve_index=False), text_columns
+
+
+def _arrow_table(conn: sqlite3.Connection, table_name: str):
+    """Returns the Arrow copy of a versioned table, read from SQLite on first use after every change.
+
+    The copy is made from the stored rows, so its types are SQLite's (e.g. bools are 0/1).
+    """
+    key = (database_uri(conn), table_name, get_data_version(conn))
+    entry = _arrow_cache.get(key)
+    if entry is None:
+        entry = to_arrow(pd.read_sql(f'SELECT * FROM "{table_name}"', conn))
+        _arrow_cache.put(key, *entry)
+    return entry
+
+
+def referenced_tables(conn: sqlite3.Connection, query: str) -> list:
+    """Returns the tables and views of the database that the query mentions."""
+    names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")]
+    return [name for name in names
+            if re.search(rf'"{re.escape(name)}"|(?<![\w"]){re.escape(name)}(?![\w"])', query, re.IGNORECASE)]
+
+
+def choose_engine(conn: sqlite3.Connection, query: str, engine: str = "auto") -> str:
+    """Resolves "auto" to the engine that answers the query faster with the same result.
+
+    DuckDB is chosen for aggregate queries over large versioned tables, unless the query uses
+    constructs whose semantics differ between the engines. The Arrow copy DuckDB queries is
+    only made once a query is sent to it.
+    """
+    if engine == "sqlite" or not duckdb_available():
+        return "sqlite"
+    if engine == "duckdb":
+        return "duckdb"
+    tables = referenced_tables(conn, query)
+    if not tables or not set(tables) <= VERSIONED_TABLES:
+        return "sqlite"
+    if not AGGREGATE_PATTERN.search(query) or SQLITE_ONLY_PATTERN.search(query):
+        return "sqlite"
+    # max(rowid) is a lookup, unlike COUNT(*); deletes only make it overestimate
+    rows = max(conn.execute(f'SELECT COALESCE(MAX(rowid), 0) FROM "{table}"').fetchone()[0] for table in tables)
+    if rows < AUTO_MIN_ROWS:
+        return "sqlite"
+    entries = [_arrow_table(conn, table) for table in tables]
+    if any(col in query for entry in entries for col in entry[1]):
+        return "sqlite"  # mixed columns are text in the Arrow copy, so comparisons would differ
+    return "duckdb"
+
+
+def run_duckdb(conn: sqlite3.Connection, query: str) -> pd.DataFrame:
+    """Runs a query on DuckDB over Arrow copies of the tables it references.
+
+    Versioned tables come from the cache; other tables and views are read from SQLite for this query.
+    Without an ORDER BY the rows are sorted like SQLite returns groups (by the leading columns,
+    NULLs first), and columns get the names SQLite would give them (e.g. SUM("Volume") instead of
+    DuckDB's sum("Volume")), so both engines give the same frame.
+    """
+    import duckdb
+
+    query = query.strip().rstrip(";")
+    try:
+        # Only prepares the query in SQLite, nothing is scanned
+        sqlite_columns = [column[0] for column in conn.execute(f"SELECT * FROM ({query}) LIMIT 0").description]
+    except sqlite3.Error:
+        sqlite_columns = None
+    duck = duckdb.connect()
+    try:
+        for table_name in referenced_tables(conn, query):
+            if table_name in VERSIONED_TABLES:
+                table = _arrow_table(conn, table_name)[0]
+            else:
+                table = to_arrow(pd.read_sql(f'SELECT * FROM "{table_name}"', conn))[0]
+            duck.register(table_name, table)
+        if not re.search(r"\border\s+by\b", query, re.IGNORECASE):
+            query = f"SELECT * FROM ({query}) ORDER BY ALL NULLS FIRST"
+        cursor = duck.execute(query)
+        types = [str(column[1]) for column in cursor.description]
+        result = cursor.df()
+        for col, column_type in zip(result.columns, types):
+            # SUM of integers is a HUGEINT in DuckDB, which pandas gets as float; SQLite returns an integer
+            if column_type == "HUGEINT" and result[col].notna().all():
+                result[col] = result[col].astype("int64")
+        if sqlite_columns is not None and len(sqlite_columns) == len(result.columns):
+            result.columns = sqlite_columns
+        return result
+    finally:
+        duck.close()
+
+
+def frames_match(left: pd.DataFrame, right: pd.DataFrame, rtol: float = 1e-9) -> bool:
+    """True if two results hold the same rows, values and kinds of numbers (bool, integer, float), ignoring row order."""
+    if left.shape != right.shape or list(left.columns) != list(right.columns):
+        return False
+    left = left.sort_values(list(left.columns), na_position="first", ignore_index=True)
+    right = right.sort_values(list(right.columns), na_position="first", ignore_index=True)
+    for col in left.columns:
+        a, b = left[col], right[col]
+        if pd.api.types.is_numeric_dtype(a.dtype) and pd.api.types.is_numeric_dtype(b.dtype):
+            if a.dtype.kind.replace("u", "i") != b.dtype.kind.replace("u", "i"):
+                return False
+            a, b = a.astype("float64").to_numpy(), b.astype("float64").to_numpy()
+            same = (abs(a - b) <= rtol * abs(a).clip(min=1)) | (pd.isna(a) & pd.isna(b))
+        else:
+            same = (a.astype(object) == b.astype(object)) | (a.isna() & b.isna())
+        if not same.all():
+            return False
+    return True
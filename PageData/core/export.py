@@ -0,0 +1,169 @@
+import csv
+import io
+import sqlite3
+import tempfile
+
+import pandas as pd
+
+from PageData.core.results import OpResult
+
+DEFAULT_CHUNK_ROWS = 50_000
+# Exports up to this size stay in memory, larger ones roll over to a temporary file on disk
+SPOOL_MAX_BYTES = 32 * 1024 * 1024
+EXCEL_MAX_ROWS = 1_048_576
+
+EXPORT_FORMATS = {
+    ".csv": "text/csv",
+    ".parquet": "application/vnd.apache.parquet",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+class CsvChunkWriter:
+    def __init__(self, target, columns: list):
+        # newline="" lets the csv module write its own line endings
+        self.text = io.TextIOWrapper(target, encoding="utf-8", newline="")
+        self.writer = csv.writer(self.text)
+        self.writer.writerow(columns)
+
+    def write(self, rows: list):
+        self.writer.writerows(rows)
+
+    def close(self):
+        self.text.flush()
+        self.text.detach()  # keep the underlying file open for the download
+
+
+def _text_column(rows: list, index: int) -> list:
+    # Taken from the raw rows, so integers next to NULLs don't come out as "1.0"
+    return [None if row[index] is None else str(row[index]) for row in rows]
+
+
+class ParquetChunkWriter:
+    """Writes every chunk as one row group. The schema is taken from the first chunk."""
+
+    def __init__(self, target, columns: list):
+        self.target = target
+        self.columns = columns
+        self.schema = None
+        self.writer = None
+
+    def write(self, rows: list):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        chunk = pd.DataFrame.from_records(rows, columns=self.columns)
+        if self.schema is None:
+            # SQLite columns can mix numbers and text (e.g. from Excel); those are written as text
+            for index, col in enumerate(self.columns):
+                if pd.api.types.infer_dtype(chunk[col], skipna=True).startswith("mixed"):
+                    chunk[col] = pd.Series(_text_column(rows, index), dtype=object)
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            # Columns that are empty in the first chunk may hold text later on
+            self.schema = pa.schema([field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                                     for field in schema])
+            self.writer = pq.ParquetWriter(self.target, self.schema)
+        for index, field in enumerate(self.schema):
+            if pa.types.is_string(field.type):
+                chunk[field.name] = pd.Series(_text_column(rows, index), dtype=object)
+        try:
+            table = pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+            raise ValueError(f"Column types differ from the first chunk, export to CSV instead: {e}")
+        self.writer.write_table(table, row_group_size=len(rows))
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class ExcelChunkWriter:
+    """Appends rows to a write-only workbook, which keeps only the current row in memory."""
+
+    def __init__(self, target, columns: list):
+        from openpyxl import Workbook
+
+        self.target = target
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("Export")
+        self.sheet.append(columns)
+
+    def write(self, rows: list):
+        for row in rows:
+            self.sheet.append(row)
+
+    def close(self):
+        self.workbook.save(self.target)
+
+
+CHUNK_WRITERS = {".csv": CsvChunkWriter, ".parquet": ParquetChunkWriter, ".xlsx": ExcelChunkWriter}
+
+
+def count_rows(conn: sqlite3.Connection, query: str) -> int or None:
+    """Returns the number of rows the query returns, or None if it can't be wrapped in a COUNT."""
+    try:
+        return conn.execute(f"SELECT COUNT(*) FROM ({query.strip().rstrip(';')})").fetchone()[0]
+    except sqlite3.Error:
+        return None
+
+
+def export_query(conn: sqlite3.Connection, query: str, extension: str, target=None,
+                 chunk_rows: int = DEFAULT_CHUNK_ROWS, progress=None) -> OpResult:
+    """Streams the result of a query to a CSV, Parquet or Excel file in chunks of chunk_rows.
+
+    Only one chunk is held in memory at a time. Without a target the file is written to a
+    SpooledTemporaryFile, which moves to disk beyond SPOOL_MAX_BYTES.
+
+    Args:
+        conn: The database to query.
+        query: The SQL query.
+        extension: ".csv", ".parquet" or ".xlsx".
+        target: Binary file object or path to write to.
+        chunk_rows: Rows fetched (and, for Parquet, written as one row group) at a time.
+        progress: Optional callable(rows_written, total_rows); total_rows is None if unknown.
+
+    Returns:
+        OpResult: value is the target file object rewound to the start (or the path),
+            with the row count in the success message.
+    """
+    result = OpResult()
+    extension = extension.lower()
+    if extension not in CHUNK_WRITERS:
+        return result.fail(f"Unsupported export format: {extension} (use {', '.join(CHUNK_WRITERS)})")
+    total_rows = count_rows(conn, query) if progress else None
+    if extension == ".xlsx" and total_rows is not None and total_rows >= EXCEL_MAX_ROWS:
+        return result.fail(f"{total_rows} rows don't fit in an Excel sheet, export to CSV or Parquet instead.")
+
+    path = target if isinstance(target, str) else None
+    file = open(path, "wb") if path else (target or tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES))
+    written = 0
+    writer = None
+    try:
+        cursor = conn.execute(query)
+        if cursor.description is None:
+            raise ValueError("The statement returns no rows to export.")
+        writer = CHUNK_WRITERS[extension](file, [column[0] for column in cursor.description])
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            written += len(rows)
+            if extension == ".xlsx" and written >= EXCEL_MAX_ROWS:
+                raise ValueError("The result doesn't fit in an Excel sheet, export to CSV or Parquet instead.")
+            writer.write(rows)
+            if progress:
+                progress(written, total_rows)
+        writer.close()
+    except Exception as e:
+        if isinstance(writer, ParquetChunkWriter) and writer.writer is not None:
+            writer.writer.close()  # it would write its footer into the closed file when collected
+        file.close()
+        return result.fail(f"Export failed: {e}", e, rows_written=written)
+
+    if path:
+        file.close()
+        result.value = path
+    else:
+        file.seek(0)
+        result.value = file
+    return result.success(f"Exported {written} rows" + (f" to {path}" if path else ""))
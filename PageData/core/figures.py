@@ -0,0 +1,186 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Points per line/scatter drawn at most; longer series are downsampled before rendering
+DEFAULT_POINT_BUDGET = 5000
+
+
+class FigureCache:
+    """LRU cache of rendered snippet output (images plus whatever else the snippet displayed).
+
+    Entries are evicted least recently used first once there are more than max_entries
+    or they take more than max_bytes (images, output and the data of recorded calls, see
+    payload_bytes). An entry larger than max_bytes is not cached.
+    """
+
+    def __init__(self, max_entries: int = 64, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key: str, value, size: int):
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._entries[key] = value
+            self._sizes[key] = size
+            self._entries.move_to_end(key)
+            while self._entries and (len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes):
+                evicted, _ = self._entries.popitem(last=False)
+                del self._sizes[evicted]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._sizes.clear()
+
+
+def payload_bytes(value) -> int:
+    """Memory held by the frames, arrays and bytes in value, nested in lists, tuples and dicts."""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(payload_bytes(item) for item in value)
+    if isinstance(value, dict):
+        return sum(payload_bytes(item) for item in value.values())
+    # e.g. a Styler from df.style keeps its frame in data
+    data = getattr(value, "data", None)
+    return payload_bytes(data) if isinstance(data, pd.DataFrame) else 0
+
+
+def frame_fingerprint(df, sample_rows: int = 256) -> str:
+    """Cheap fingerprint of a DataFrame: shape, columns, dtypes and a hash of evenly spaced rows.
+
+    Guards cache keys against the session frame changing without the data version (e.g. a file
+    loaded but not yet written to SQL); it is not a full content hash.
+    """
+    if not isinstance(df, pd.DataFrame):
+        return repr(type(df))
+    sample = df.iloc[np.linspace(0, len(df) - 1, min(len(df), sample_rows)).astype(int)] if len(df) else df
+    digest = hashlib.sha256(repr((df.shape, list(df.columns), list(map(str, df.dtypes)))).encode("utf-8"))
+    # Frames without columns (code that doesn't read df gets one) have no rows to hash
+    if len(df.columns):
+        digest.update(pd.util.hash_pandas_object(sample, index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+def figure_cache_key(code: str, database: str, data_version: int, *parts) -> str:
+    """Keys a snippet's rendered output by its code, the database and its data version and any further inputs.
+
+    database is the URI of the session's database (see schema.database_uri): every workspace counts
+    its data versions from 1, so the version alone doesn't tell two sessions' data apart.
+    """
+    key = "\0".join([code or "", database or "", str(data_version)] + [str(part) for part in parts])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def minmax_indices(y: np.ndarray, budget: int) -> np.ndarray:
+    """Indices of the minimum and maximum of each of budget/2 equal buckets, plus the end points.
+
+    Keeps every peak and trough of a line, unlike plain striding.
+    """
+    n = len(y)
+    buckets = max(budget // 2, 1)
+    size = -(-n // buckets)  # ceil
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    padded = padded.reshape(buckets, size)
+    nan = np.isnan(padded)
+    offsets = np.arange(buckets) * size
+    lows = np.where(nan, np.inf, padded).argmin(axis=1) + offsets
+    highs = np.where(nan, -np.inf, padded).argmax(axis=1) + offsets
+    indices = np.concatenate([[0, n - 1], lows, highs])
+    return np.unique(indices[indices < n])
+
+
+def _downsample_line(line, budget: int) -> bool:
+    y = line.get_ydata()
+    if len(y) <= budget:
+        return False
+    try:
+        y_values = np.asarray(y, dtype=float)
+    except (TypeError, ValueError):
+        return False  # e.g. categorical y values
+    indices = minmax_indices(y_values, budget)
+    line.set_data(np.asarray(line.get_xdata())[indices], np.asarray(y)[indices])
+    return True
+
+
+def _downsample_scatter(collection, budget: int) -> bool:
+    offsets = collection.get_offsets()
+    n = len(offsets)
+    if n <= budget:
+        return False
+    # A fixed-seed random sample keeps the point density; striding would bias sorted data
+    indices = np.sort(np.random.default_rng(0).choice(n, budget, replace=False))
+    collection.set_offsets(offsets[indices])
+    values = collection.get_array()
+    if values is not None and len(values) == n:
+        collection.set_array(values[indices])
+    else:
+        for getter, setter in (("get_facecolors", "set_facecolors"), ("get_edgecolors", "set_edgecolors")):
+            colors = getattr(collection, getter)()
+            if len(colors) == n:
+                getattr(collection, setter)(colors[indices])
+    sizes = collection.get_sizes()
+    if len(sizes) == n:
+        collection.set_sizes(sizes[indices])
+    return True
+
+
+def downsample_figure(fig, point_budget: int = DEFAULT_POINT_BUDGET) -> int:
+    """Downsamples the lines and scatter plots of a matplotlib figure in place.
+
+    Lines are reduced with min/max bucketing, scatter plots with a random sample of point_budget
+    points. A point_budget of 0 or less disables downsampling.
+
+    Returns:
+        int: Number of artists that were downsampled.
+    """
+    if point_budget is None or point_budget <= 0:
+        return 0
+    from matplotlib.collections import PathCollection
+
+    downsampled = 0
+    for ax in fig.get_axes():
+        for line in ax.get_lines():
+            downsampled += _downsample_line(line, point_budget)
+        for collection in ax.collections:
+            if isinstance(collection, PathCollection):
+                downsampled += _downsample_scatter(collection, point_budget)
+    return downsampled
+
+
+def render_figure(fig, fmt: str = "png", dpi: int = 200) -> bytes:
+    """Renders a matplotlib figure to PNG or SVG bytes, the way st.pyplot does."""
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight")
+    return buffer.getvalue()
@@ -0,0 +1,240 @@
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from PageData.core.results import OpError, OpResult
+
+# Columnar/text formats parsed with pyarrow's multithreaded readers, keyed by file extension
+TABULAR_FORMATS = {
+    ".csv": "CSV",
+    ".parquet": "Parquet",
+    ".feather": "Feather",
+    ".arrow": "Feather",
+}
+# Extensions accepted by read_source, ingest_files and ingest_folder
+SUPPORTED_EXTENSIONS = [".xlsx"] + list(TABULAR_FORMATS)
+# Converter outputs checked before falling back to the slow *_rvt.xlsx, fastest first
+CONVERTER_OUTPUT_SUFFIXES = ["_rvt.parquet", "_rvt.feather", "_rvt.csv", "_rvt.xlsx"]
+
+SOURCE_FILE_COLUMN = "_source_file"
+SOURCE_SHEET_COLUMN = "_source_sheet"
+
+
+def find_duplicate_columns(columns) -> list:
+    """Returns the column names that occur more than once, in order of their repeat."""
+    seen_cols = set()
+    duplicate_cols = []
+    for col in columns:
+        if col in seen_cols:
+            duplicate_cols.append(col)
+        else:
+            seen_cols.add(col)
+    return duplicate_cols
+
+
+def check_duplicate_columns(df: pd.DataFrame, file_kind: str = "Excel") -> OpResult:
+    """Fails the result if the DataFrame has duplicate column names."""
+    result = OpResult(value=df)
+    duplicate_cols = find_duplicate_columns(df.columns.tolist())
+    if duplicate_cols:
+        result.fail(f"The {file_kind} file contains duplicate column names. Please fix these in the {file_kind} file.",
+                    details=duplicate_cols, duplicate_columns=duplicate_cols)
+        result.value = None
+    return result
+
+
+def get_file_format(file_name: str) -> str or None:
+    """Returns the tabular format name for a file name, or None for unsupported extensions."""
+    return TABULAR_FORMATS.get(os.path.splitext(file_name)[1].lower())
+
+
+def read_tabular_file(source, file_format: str) -> pd.DataFrame:
+    """Reads a CSV, Parquet or Feather source with pyarrow's multithreaded readers.
+
+    Args:
+        source: A file path or a binary file-like object (e.g. a Streamlit UploadedFile).
+        file_format: One of the values of TABULAR_FORMATS.
+
+    Returns:
+        pandas DataFrame: The parsed data.
+    """
+    # pyarrow is imported on first use to keep it off the upload page's cold start
+    import pyarrow.csv as pa_csv
+    import pyarrow.feather as pa_feather
+    import pyarrow.parquet as pa_parquet
+
+    if file_format == "CSV":
+        table = pa_csv.read_csv(source, read_options=pa_csv.ReadOptions(use_threads=True))
+    elif file_format == "Parquet":
+        table = pa_parquet.read_table(source, use_threads=True)
+    elif file_format == "Feather":
+        table = pa_feather.read_table(source, use_threads=True)
+    else:
+        raise ValueError(f"Unsupported file format: {file_format}")
+    return table.to_pandas(use_threads=True)
+
+
+def get_file_kind(file_name: str) -> str or None:
+    """Returns "Excel" or the tabular format name for a file name, or None for unsupported extensions."""
+    return "Excel" if file_name.lower().endswith(".xlsx") else get_file_format(file_name)
+
+
+def read_source(source, file_kind: str) -> OpResult:
+    """Reads the first sheet of an Excel file, or a CSV/Parquet/Feather file.
+
+    Args:
+        source: A file path or a binary file-like object.
+        file_kind: "Excel" or one of the values of TABULAR_FORMATS (see get_file_kind).
+
+    Returns:
+        OpResult: value is the DataFrame when ok.
+    """
+    try:
+        df = pd.read_excel(source) if file_kind == "Excel" else read_tabular_file(source, file_kind)
+    except Exception as e:
+        return OpResult().fail(f"Error loading {file_kind} file: {e}", e)
+    result = check_duplicate_columns(df, file_kind)
+    if result.ok:
+        result.success(f"{file_kind} file loaded successfully!")
+    return result
+
+
+def find_converter_output(file_path: str) -> str or None:
+    """Finds the freshest converter output for a Revit file, preferring the fastest format.
+
+    A Parquet/Feather/CSV export is only used when it is at least as new as the
+    *_rvt.xlsx written by the converter, so a fresh conversion is never shadowed
+    by an outdated sidecar file.
+    """
+    base_path = file_path[:-4]
+    xlsx_path = base_path + "_rvt.xlsx"
+    xlsx_mtime = os.path.getmtime(xlsx_path) if os.path.exists(xlsx_path) else None
+    for suffix in CONVERTER_OUTPUT_SUFFIXES:
+        output_file = base_path + suffix
+        if not os.path.exists(output_file):
+            continue
+        if suffix == "_rvt.xlsx" or xlsx_mtime is None or os.path.getmtime(output_file) >= xlsx_mtime:
+            return output_file
+    return None
+
+
+def read_converter_output(file_path: str) -> OpResult:
+    """Reads the converted data for a Revit file.
+
+    The *_rvt.xlsx output is parsed once and cached next to it as *_rvt.parquet,
+    so loading the same model again goes through the multithreaded Parquet reader.
+    """
+    output_file = find_converter_output(file_path)
+    if output_file is None:
+        return OpResult().fail(f"No converter output found for {file_path}", file=file_path)
+    result = read_source(output_file, get_file_kind(output_file))
+    if result.ok and output_file.endswith(".xlsx"):
+        try:
+            result.value.to_parquet(file_path[:-4] + "_rvt.parquet", index=False)
+        except Exception as e:
+            result.warning(f"Could not cache converter output as Parquet: {e}")
+    return result
+
+
+def parse_source(file_name: str, content) -> dict:
+    """Parses every sheet of one exported file. Runs inside a worker process.
+
+    Args:
+        file_name: Name of the file, used to pick the reader.
+        content: Raw bytes of the file, or its path.
+
+    Returns:
+        dict: {"file": name, "sheets": [(sheet_name, df), ...], "duplicates": {sheet: [cols]}, "error": str or None}
+    """
+    result = {"file": file_name, "sheets": [], "duplicates": {}, "error": None}
+    source = io.BytesIO(content) if isinstance(content, bytes) else content
+    try:
+        if file_name.lower().endswith(".xlsx"):
+            sheets = pd.read_excel(source, sheet_name=None)
+        else:
+            file_format = get_file_format(file_name)
+            if file_format is None:
+                raise ValueError(f"Unsupported file type: {file_name}")
+            sheets = {"": read_tabular_file(source, file_format)}
+
+        for sheet_name, df in sheets.items():
+            duplicate_cols = find_duplicate_columns(df.columns.tolist())
+            if duplicate_cols:
+                result["duplicates"][sheet_name] = duplicate_cols
+                continue
+            df[SOURCE_FILE_COLUMN] = file_name
+            df[SOURCE_SHEET_COLUMN] = sheet_name
+            result["sheets"].append((sheet_name, df))
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def union_frames(frames: list) -> pd.DataFrame:
+    """Unions frames with different columns into one, aligning schemas by column name.
+
+    Columns missing from a frame are filled with NaN; the source columns are moved to the front.
+    """
+    df = pd.concat(frames, ignore_index=True, sort=False)
+    source_cols = [SOURCE_FILE_COLUMN, SOURCE_SHEET_COLUMN]
+    return df[source_cols + [col for col in df.columns if col not in source_cols]]
+
+
+def ingest_files(sources: list, max_workers: int = None) -> OpResult:
+    """Parses many exported files (all sheets) in a process pool and unions them into one DataFrame.
+
+    Args:
+        sources: (file_name, content) pairs, content being the file's bytes or its path.
+        max_workers: Size of the process pool, defaults to the number of CPUs.
+
+    Returns:
+        OpResult: value is the unioned DataFrame when at least one sheet could be loaded.
+    """
+    result = OpResult()
+    if not sources:
+        return result.fail("No files to load.")
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(sources))
+    if max_workers == 1:
+        parsed = [parse_source(name, content) for name, content in sources]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            parsed = list(executor.map(parse_source, *zip(*sources)))
+
+    frames = []
+    for file_result in parsed:
+        if file_result["error"]:
+            result.warning(f"Error loading {file_result['file']}: {file_result['error']}")
+            result.errors.append(OpError(file_result["error"], context={"file": file_result["file"]}))
+        for sheet_name, duplicate_cols in file_result["duplicates"].items():
+            result.warning(f"Skipped sheet '{sheet_name}' of {file_result['file']}: duplicate column names {duplicate_cols}")
+        frames.extend(df for _, df in file_result["sheets"])
+
+    if not frames:
+        return result.fail("No data could be loaded from the files.")
+
+    result.value = union_frames(frames)
+    result.success(f"Loaded {len(frames)} sheets from {len(sources)} files "
+                   f"({len(result.value)} rows, {len(result.value.columns)} columns).")
+    return result
+
+
+def list_exports(folder: str) -> list:
+    """Returns (file_name, path) pairs of the supported exports in a folder (not recursive)."""
+    names = sorted(
+        name for name in os.listdir(folder)
+        if os.path.splitext(name)[1].lower() in SUPPORTED_EXTENSIONS and not name.startswith("~$")  # ~$ = Excel lock files
+    )
+    return [(name, os.path.join(folder, name)) for name in names]
+
+
+def ingest_folder(folder: str, max_workers: int = None) -> OpResult:
+    """Loads every supported export in a folder with ingest_files.
+
+    Workers read the files from disk themselves, so only the parsed frames cross process boundaries.
+    """
+    if not os.path.isdir(folder):
+        return OpResult().fail(f"Folder not found: {folder}", folder=folder)
+    return ingest_files(list_exports(folder), max_workers)
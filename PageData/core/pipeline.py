@@ -0,0 +1,266 @@
+import builtins
+import contextvars
+import functools
+import hashlib
+import io
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from sqlite3 import Connection
+
+import pandas as pd
+
+from PageData.core.results import OpResult
+from PageData.core.schema import database_uri, get_data_version
+from PageData.profiler import profile_span
+
+# Python node results kept in memory so downstream Python nodes don't read them back from SQLite
+MAX_CACHED_FRAMES = 16
+_frame_cache = OrderedDict()
+
+
+def parse_inputs(inputs) -> list:
+    """Splits a snippet's comma-separated inputs column into table names."""
+    if not isinstance(inputs, str):
+        return []
+    return [name.strip() for name in inputs.split(",") if name.strip()]
+
+
+def load_pipeline(snippets: pd.DataFrame) -> dict:
+    """Returns the pipeline nodes of a snippet table: snippets that declare an output table.
+
+    Returns:
+        dict: output table name -> {"id", "name", "type", "code", "inputs", "output"}
+    """
+    nodes = {}
+    for snippet in snippets.itertuples(index=False):
+        output = getattr(snippet, "output", None)
+        if not isinstance(output, str) or not output.strip():
+            continue
+        nodes[output.strip()] = {
+            "id": snippet.id,
+            "name": snippet.name,
+            "type": snippet.type,
+            "code": snippet.code,
+            "inputs": parse_inputs(getattr(snippet, "inputs", None)),
+            "output": output.strip(),
+        }
+    return nodes
+
+
+def find_cycle(nodes: dict) -> list or None:
+    """Returns the outputs forming a dependency cycle, or None if the pipeline is a DAG."""
+    visiting, done = [], set()
+
+    def visit(output):
+        if output in done:
+            return None
+        if output in visiting:
+            return visiting[visiting.index(output):]
+        visiting.append(output)
+        for name in nodes[output]["inputs"]:
+            if name in nodes:
+                cycle = visit(name)
+                if cycle:
+                    return cycle
+        visiting.pop()
+        done.add(output)
+        return None
+
+    for output in nodes:
+        cycle = visit(output)
+        if cycle:
+            return cycle
+    return None
+
+
+def upstream_of(nodes: dict, targets: list) -> dict:
+    """Restricts the pipeline to the targets and every node they depend on."""
+    selected = {}
+    stack = [target for target in targets if target in nodes]
+    while stack:
+        output = stack.pop()
+        if output not in selected:
+            selected[output] = nodes[output]
+            stack.extend(name for name in nodes[output]["inputs"] if name in nodes)
+    return {output: node for output, node in nodes.items() if output in selected}
+
+
+def node_hash(node: dict, input_hashes: dict) -> str:
+    """Hashes a node's code together with the versions of everything it reads."""
+    key = "\0".join([node["type"], node["code"] or ""] + [f"{name}={input_hashes[name]}" for name in sorted(node["inputs"])])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def _cache_frame(key: str, df: pd.DataFrame):
+    _frame_cache[key] = df
+    _frame_cache.move_to_end(key)
+    while len(_frame_cache) > MAX_CACHED_FRAMES:
+        _frame_cache.popitem(last=False)
+
+
+def _object_type(conn: Connection, name: str) -> str or None:
+    row = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def _run_sql_node(conn: Connection, node: dict) -> int:
+    """Materializes a SQL node as a table inside SQLite. Returns the row count."""
+    output = node["output"]
+    cursor = conn.cursor()
+    if not conn.in_transaction:
+        cursor.execute("BEGIN")  # keep the previous table if the new query fails
+    cursor.execute(f'DROP TABLE IF EXISTS "{output}"')
+    cursor.execute(f'CREATE TABLE "{output}" AS {node["code"].strip().rstrip(";")}')
+    conn.commit()
+    return cursor.execute(f'SELECT COUNT(*) FROM "{output}"').fetchone()[0]
+
+
+def _run_python_node(node: dict, frames: dict, python_vars: dict) -> tuple:
+    """Runs a Python node in a worker thread. Returns (result DataFrame, captured output).
+
+    The snippet sees its inputs as variables named after the tables (and in the `inputs` dict)
+    and registers its output by assigning a DataFrame to `result`. print() writes to a
+    per-node buffer, since sys.stdout is shared between the worker threads.
+    """
+    output = io.StringIO()
+    env = {"__builtins__": builtins, **python_vars, "inputs": frames, "print": functools.partial(print, file=output)}
+    env.update({re.sub(r"\W", "_", name): df for name, df in frames.items()})
+    exec(node["code"], env)
+    result = env.get("result")
+    if not isinstance(result, pd.DataFrame):
+        raise ValueError("Pipeline Python snippets must assign a DataFrame to `result`")
+    return result, output.getvalue()
+
+
+def run_pipeline(conn: Connection, snippets: pd.DataFrame, targets: list = None, python_vars: dict = None,
+                 max_workers: int = 4, force: bool = False) -> OpResult:
+    """Runs pipeline snippets in dependency order, re-executing only nodes whose inputs changed.
+
+    Every node is memoized by a hash of its code plus the hashes of its inputs (the data version
+    for plain tables such as _df), stored in pipeline_nodes next to the registered output table.
+    SQL nodes are materialized inside SQLite on the calling thread; Python nodes run in a thread
+    pool, so independent branches execute in parallel.
+
+    Args:
+        conn: The database holding the input tables; outputs are written to it.
+        snippets: Rows of code_snippets including the inputs and output columns.
+        targets: Output tables to bring up to date; default: the whole pipeline.
+        python_vars: Extra variables for Python nodes (e.g. "pd").
+        max_workers: Threads for Python nodes.
+        force: Re-execute every node even if its hash is unchanged.
+
+    Returns:
+        OpResult: value is a list of dicts (output, name, type, status, rows, duration_ms, error, printed)
+        in completion order, status being "executed", "cached", "failed" or "skipped".
+    """
+    result = OpResult(value=[])
+    nodes = load_pipeline(snippets)
+    if targets:
+        nodes = upstream_of(nodes, targets)
+    if not nodes:
+        return result.info("No pipeline snippets found. Give a snippet an output table to add it to the pipeline.")
+    cycle = find_cycle(nodes)
+    if cycle:
+        return result.fail(f"The pipeline has a dependency cycle: {' -> '.join(cycle + cycle[:1])}", cycle=cycle)
+
+    data_version = get_data_version(conn)
+    database = database_uri(conn)  # frames are cached per database: every session has its own workspace
+    stored = dict(conn.execute("SELECT output, node_hash FROM pipeline_nodes").fetchall())
+    python_vars = python_vars or {}
+    hashes, failed = {}, set()
+    pending = list(nodes)
+    running = {}
+
+    def record(node, status, rows=None, duration_ms=None, error=None, printed=None):
+        result.value.append({"output": node["output"], "name": node["name"], "type": node["type"], "status": status,
+                             "rows": rows, "duration_ms": duration_ms, "error": error, "printed": printed})
+        if status == "failed":
+            failed.add(node["output"])
+            result.fail(f"{node['name']} ({node['output']}): {error}", snippet_id=node["id"])
+        elif status == "skipped":
+            failed.add(node["output"])
+        if status == "executed":
+            conn.execute("INSERT OR REPLACE INTO pipeline_nodes (output, node_hash, rows, duration_ms) VALUES (?, ?, ?, ?)",
+                         (node["output"], hashes[node["output"]], rows, duration_ms))
+            conn.commit()
+
+    def load_frame(name):
+        key = f"{database}|{hashes.get(name, f'{name}@{data_version}')}"
+        if key not in _frame_cache:
+            _cache_frame(key, pd.read_sql(f'SELECT * FROM "{name}"', conn))
+        return _frame_cache[key]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            progressed = False
+            for output in list(pending):
+                node = nodes[output]
+                upstream = [name for name in node["inputs"] if name in nodes]
+                if any(name in failed for name in upstream):
+                    pending.remove(output)
+                    record(node, "skipped", error="an input failed")
+                    progressed = True
+                    continue
+                if not all(name in hashes and name not in running for name in upstream):
+                    continue
+                pending.remove(output)
+                progressed = True
+                input_hashes = {name: hashes.get(name, f"table@{data_version}") for name in node["inputs"]}
+                hashes[output] = node_hash(node, input_hashes)
+
+                existing = _object_type(conn, output)
+                if not force and stored.get(output) == hashes[output] and existing == "table":
+                    record(node, "cached")
+                    continue
+                if existing is not None and (existing != "table" or output not in stored):
+                    record(node, "failed", error=f"'{output}' already exists and is not a pipeline table")
+                    continue
+
+                start = time.perf_counter()
+                if node["type"] == "sql":
+                    try:
+                        with profile_span(f"pipeline:{node['name']}", "pipeline", output=output):
+                            rows = _run_sql_node(conn, node)
+                        record(node, "executed", rows, (time.perf_counter() - start) * 1000)
+                    except Exception as e:
+                        conn.rollback()
+                        record(node, "failed", error=str(e))
+                else:
+                    try:
+                        frames = {name: load_frame(name) for name in node["inputs"]}
+                    except Exception as e:
+                        record(node, "failed", error=f"Could not load inputs: {e}")
+                        continue
+                    # copy_context keeps the worker's spans in the current profiler run
+                    context = contextvars.copy_context()
+                    future = executor.submit(context.run, _profiled_python_node, node, frames, python_vars)
+                    running[output] = (future, start)
+
+            if running and not progressed:
+                done, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+                for output in [output for output, (future, _) in running.items() if future in done]:
+                    future, start = running.pop(output)
+                    node = nodes[output]
+                    try:
+                        df, printed = future.result()
+                        df.to_sql(output, conn, if_exists="replace", index=False)
+                        _cache_frame(f"{database}|{hashes[output]}", df)
+                        record(node, "executed", len(df), (time.perf_counter() - start) * 1000, printed=printed)
+                    except Exception as e:
+                        record(node, "failed", error=str(e))
+            elif not running and not progressed and pending:
+                # Inputs that are neither pipeline outputs nor running can't block; this is unreachable for a DAG
+                break
+
+    executed = sum(run["status"] == "executed" for run in result.value)
+    cached = sum(run["status"] == "cached" for run in result.value)
+    if result.ok:
+        result.success(f"Pipeline finished: {executed} nodes executed, {cached} up to date.")
+    return result
+
+
+def _profiled_python_node(node: dict, frames: dict, python_vars: dict) -> tuple:
+    with profile_span(f"pipeline:{node['name']}", "pipeline", output=node["output"]):
+        return _run_python_node(node, frames, python_vars)
@@ -0,0 +1,86 @@
+import sys
+import time
+from io import StringIO
+from sqlite3 import Connection
+
+import pandas as pd
+
+from PageData.DB.query_log import log_query
+from PageData.core.engines import choose_engine, run_duckdb
+from PageData.core.schema import bump_data_version
+from PageData.profiler import profile_span
+
+
+def create_view(query: str, conn: Connection, view_name: str = "temp_view") -> pd.DataFrame or str:
+    """Creates a temporary view from a SQL query."""
+    with profile_span("create_view", "sql", sql=query, view=view_name) as span:
+        try:
+            cursor = conn.cursor()
+            _query = f"CREATE VIEW IF NOT EXISTS \"{view_name}\" AS {query}"
+            cursor.execute(_query)
+            conn.commit()
+            result = pd.read_sql(f"SELECT * FROM \"{view_name}\"", conn)
+            span["rows"] = len(result)
+            return result
+        except Exception as e:
+            span["error"] = str(e)
+            return str(e)
+
+
+def _write_stamp(conn: Connection) -> tuple:
+    """Rows changed by conn so far and the schema version: a statement that differs them wrote."""
+    return conn.total_changes, conn.execute("PRAGMA schema_version").fetchone()[0]
+
+
+def execute_sql(query: str, conn: Connection, snippet_id: str = None, engine: str = "sqlite") -> pd.DataFrame or str:
+    """Executes a SQL query and returns the result.
+
+    Runs of saved snippets (snippet_id given) are recorded in the query_log table.
+    engine is "sqlite", "duckdb" or "auto" (see core.engines, None means auto); the engine that answered
+    is in result.attrs["engine"]. If DuckDB fails on a query in auto mode, SQLite runs it.
+    A statement that changes rows or the schema (e.g. UPDATE _df) bumps the data version, so the
+    caches keyed by it (frames, Arrow copies, snapshot hashes) don't return the old contents.
+    """
+    with profile_span("execute_sql", "sql", sql=query) as span:
+        start = time.perf_counter()
+        stamp = _write_stamp(conn)
+        # Snippets without a stored engine (NULL/NaN) run in auto mode
+        used = choose_engine(conn, query, engine if isinstance(engine, str) else "auto")
+        try:
+            if used == "duckdb":
+                try:
+                    result = run_duckdb(conn, query)
+                except Exception:
+                    if engine == "duckdb":
+                        raise
+                    used = "sqlite"
+            if used == "sqlite":
+                try:
+                    result = pd.read_sql(query, conn)
+                finally:
+                    if _write_stamp(conn) != stamp:
+                        bump_data_version(conn)
+            result.attrs["engine"] = used
+            span["rows"] = len(result)
+            span["engine"] = used
+        except Exception as e:
+            span["error"] = str(e)
+            return str(e)
+        if snippet_id is not None:
+            log_query(conn, snippet_id, query, (time.perf_counter() - start) * 1000, len(result))
+        return result
+
+
+def execute_python_code(code, local_vars=None):
+    """Executes Python code and captures output/errors."""
+    old_stdout = sys.stdout
+    sys.stdout = captured_output = StringIO()
+    with profile_span("execute_python_code", "python", code=code) as span:
+        try:
+            exec(code, globals(), local_vars or {})
+            return captured_output.getvalue(), None
+        except Exception as e:
+            span["error"] = str(e)
+            return None, str(e)
+        finally:
+            sys.stdout = old_stdout
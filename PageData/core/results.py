@@ -0,0 +1,57 @@
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class OpError:
+    """An error raised by a core operation, kept as data so callers decide how to show it."""
+    message: str
+    exception_type: str = None
+    context: dict = field(default_factory=dict)
+
+
+@dataclass
+class OpResult:
+    """Outcome of a core operation: the value plus the messages the UI or CLI should show.
+
+    messages holds (level, text, details) tuples with level one of "info", "success",
+    "warning" or "error"; details is optional extra data (e.g. a list of column names).
+    """
+    ok: bool = True
+    value: Any = None
+    messages: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+
+    def info(self, text: str, details=None) -> "OpResult":
+        self.messages.append(("info", text, details))
+        return self
+
+    def success(self, text: str, details=None) -> "OpResult":
+        self.messages.append(("success", text, details))
+        return self
+
+    def warning(self, text: str, details=None) -> "OpResult":
+        self.messages.append(("warning", text, details))
+        return self
+
+    def fail(self, text: str, exception: BaseException = None, details=None, **context) -> "OpResult":
+        """Marks the operation as failed and records the error."""
+        self.ok = False
+        self.messages.append(("error", text, details))
+        self.errors.append(OpError(text, type(exception).__name__ if exception else None, context))
+        return self
+
+    def extend(self, other: "OpResult") -> "OpResult":
+        """Appends the messages and errors of another result, without changing ok or value."""
+        self.messages.extend(other.messages)
+        self.errors.extend(other.errors)
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            "ok": self.ok,
+            # Frames and bytes stay out of the serialized form; summaries and paths are kept
+            "value": self.value if isinstance(self.value, (dict, str, int, float)) else None,
+            "messages": [{"level": level, "text": text} for level, text, _ in self.messages],
+            "errors": [error.__dict__ for error in self.errors],
+        }
@@ -0,0 +1,384 @@
+import json
+import re
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from PageData.core.results import OpResult
+from PageData.core.schema import get_data_version
+
+WEIGHT_COLUMN = "_weight"
+STRATUM_COLUMN = "_stratum"
+REPLICATE_COLUMN = "_replicate"
+SAMPLE_FRACTION = 0.01
+# Small strata are sampled with at least this many rows (or completely), so every category and level shows up
+MIN_STRATUM_ROWS = 50
+# Random groups of the sample for the delete-a-group jackknife
+REPLICATES = 20
+# ingest keeps a sample of tables from this size on; smaller tables answer exact queries fast enough
+AUTO_SAMPLE_MIN_ROWS = 100_000
+# Two-sided 95% normal quantile for the error bounds
+CONFIDENCE_Z = 1.96
+STRATUM_NAMES = ("category", "level")
+APPROXIMATE_AGGREGATES = ("sum", "total", "count", "avg")
+
+
+def sample_table_name(table_name: str) -> str:
+    """Returns the name of the stratified sample of table_name."""
+    return f"{table_name}_sample"
+
+
+def detect_strata(columns: list) -> list:
+    """Returns the Category and Level columns of an export (names without the " : Type" suffix)."""
+    strata = []
+    for stratum in STRATUM_NAMES:
+        for col in columns:
+            if str(col).split(" : ")[0].strip().lower() == stratum:
+                strata.append(col)
+                break
+    return strata
+
+
+def build_sample(df: pd.DataFrame, strata: list, fraction: float = SAMPLE_FRACTION,
+                 min_rows: int = MIN_STRATUM_ROWS, seed: int = 0) -> pd.DataFrame:
+    """Draws a stratified random sample of df with the weights and replicate groups for estimation.
+
+    Every stratum (combination of the strata columns) keeps fraction of its rows, but at least
+    min_rows. _weight is the number of rows a sampled row stands for. _replicate spreads the rows of a
+    stratum evenly over REPLICATES random groups; strata sampled completely get -1, they add no error.
+    """
+    rng = np.random.default_rng(seed)
+    stratum = df.groupby(strata, dropna=False, sort=False).ngroup().to_numpy() if strata else np.zeros(len(df), int)
+    sizes = np.bincount(stratum)
+    taken = np.minimum(sizes, np.maximum(np.ceil(sizes * fraction), min_rows)).astype(int)
+    # Rank of every row within its stratum in a random order; the first taken[h] rows of stratum h are sampled
+    order = pd.Series(rng.random(len(df))).groupby(stratum).rank(method="first").to_numpy().astype(int)
+    selected = order <= taken[stratum]
+
+    sample = df[selected].copy()
+    sampled_strata = stratum[selected]
+    sample[WEIGHT_COLUMN] = sizes[sampled_strata] / taken[sampled_strata]
+    sample[STRATUM_COLUMN] = sampled_strata
+    sample[REPLICATE_COLUMN] = np.where(taken[sampled_strata] < sizes[sampled_strata], (order[selected] - 1) % REPLICATES, -1)
+    return sample
+
+
+def read_sample_definition(conn: sqlite3.Connection, table_name: str = "_df") -> dict or None:
+    """Returns {"strata", "fraction", "rows", "sample_rows", "data_version"} of the sample of table_name, or None."""
+    try:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (f"sample_definition:{table_name}",)).fetchone()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def write_sample(conn: sqlite3.Connection, df: pd.DataFrame, strata: list, table_name: str = "_df",
+                 fraction: float = SAMPLE_FRACTION) -> OpResult:
+    """Samples df (the contents of table_name) into <table>_sample for approximate queries.
+
+    The definition is kept in app_meta, so write_table and upsert_table draw a new sample whenever
+    the table changes.
+    """
+    result = OpResult()
+    missing = [col for col in strata if col not in df.columns]
+    if missing:
+        return result.fail(f"Columns not found in {table_name}: {missing}", columns=missing)
+    if not 0 < fraction <= 1:
+        return result.fail("The sample fraction must be between 0 and 1.")
+    try:
+        sample = build_sample(df, strata, fraction)
+        sample.to_sql(sample_table_name(table_name), conn, if_exists="replace", index=False)
+        definition = {"strata": strata, "fraction": fraction, "rows": len(df), "sample_rows": len(sample),
+                      "data_version": get_data_version(conn)}
+        conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)",
+                     (f"sample_definition:{table_name}", json.dumps(definition)))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        return result.fail(f"Error sampling {table_name}: {e}", e)
+    result.value = definition
+    return result.success(f"Sampled {len(sample)} of {len(df)} rows of {table_name}, stratified by "
+                          f"{', '.join(map(str, strata)) or 'nothing'}.")
+
+
+def refresh_sample(conn: sqlite3.Connection, df: pd.DataFrame, table_name: str) -> OpResult or None:
+    """Draws a new sample after table_name was written.
+
+    Large element tables get a sample stratified by Category and Level on their first write.
+    """
+    definition = read_sample_definition(conn, table_name)
+    if definition is not None:
+        return write_sample(conn, df, [col for col in definition["strata"] if col in df.columns], table_name,
+                            definition["fraction"])
+    if table_name == "_df" and len(df) >= AUTO_SAMPLE_MIN_ROWS:
+        return write_sample(conn, df, detect_strata(df.columns), table_name)
+    return None
+
+
+def _split_top_level(text: str, separator: str = ",") -> list:
+    """Splits text at separators outside parentheses and quotes."""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, char in enumerate(text):
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "[":
+            quote = "]"
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == separator and depth == 0:
+            parts.append(text[start:i].strip())
+            start = i + 1
+    parts.append(text[start:].strip())
+    return parts
+
+
+def _is_balanced(text: str) -> bool:
+    """True if text closes all its parentheses and quotes."""
+    return _closing_paren(f"({text})", 0) == len(text) + 1
+
+
+def _unquote(name: str) -> str:
+    if len(name) > 1 and name[0] + name[-1] in ('""', "''", "``", "[]"):
+        return name[1:-1]
+    return name
+
+
+def _closing_paren(text: str, start: int) -> int:
+    depth, quote = 0, None
+    for i in range(start, len(text)):
+        char = text[i]
+        if quote:
+            if char == quote:
+                quote = None
+        elif char in "'\"`":
+            quote = char
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+            if depth == 0:
+                return i
+    return -1
+
+
+_IDENTIFIER = r'(?:"[^"]+"|\[[^\]]+\]|`[^`]+`|\w+)'
+_AGGREGATE_CALL = re.compile(r"\b(sum|total|count|avg|min|max|group_concat)\s*\(", re.IGNORECASE)
+_UNSUPPORTED = re.compile(r"\b(select|join|union|intersect|except|having|over|distinct)\b", re.IGNORECASE)
+
+
+def _query_pattern(table_name: str) -> re.Pattern:
+    table = "|".join(re.escape(quoted) for quoted in (f'"{table_name}"', f"[{table_name}]", f"`{table_name}`")) + \
+        rf"|{re.escape(table_name)}\b"
+    return re.compile(
+        rf"^select\s+(?P<select>.+?)\s+from\s+(?:{table})"
+        rf"(?:\s+(?:as\s+)?(?P<alias>(?!(?:where|group|order|limit)\b){_IDENTIFIER}))?"
+        rf"(?:\s+where\s+(?P<where>.+?))?(?:\s+group\s+by\s+(?P<group>.+?))?"
+        rf"(?:\s+order\s+by\s+(?P<order>.+?))?(?:\s+limit\s+(?P<limit>\d+))?$",
+        re.IGNORECASE | re.DOTALL,
+    )
+
+
+def _output_name(expression: str) -> str:
+    """The column name SQLite gives an expression without alias: the bare column name, otherwise its text."""
+    if re.fullmatch(rf"(?:{_IDENTIFIER}\.)?{_IDENTIFIER}", expression):
+        return _unquote(_split_top_level(expression, ".")[-1])
+    return expression
+
+
+def parse_aggregate_query(query: str, table_name: str = "_df") -> dict:
+    """Splits an aggregate query over table_name into the parts the sample estimate needs.
+
+    Supported are single SELECTs over the table with SUM, TOTAL, COUNT and AVG of any expression,
+    grouped by any expressions, with WHERE, ORDER BY (output columns) and LIMIT.
+
+    Raises:
+        ValueError: if the query can't be estimated from the sample, with the reason.
+    """
+    query = re.sub(r"--[^\n]*", " ", query).strip().rstrip(";").strip()
+    match = _query_pattern(table_name).match(query)
+    if not match:
+        raise ValueError(f"Only single SELECT ... FROM {table_name} queries (with WHERE, GROUP BY, ORDER BY, "
+                         f"LIMIT) can be approximated.")
+    if _UNSUPPORTED.search(query[len("select"):]):
+        raise ValueError("Subqueries, joins, DISTINCT and HAVING need the exact answer.")
+
+    columns = []
+    for item in _split_top_level(match["select"]):
+        # "SUM(x) AS volume" or "SUM(x) volume"; a word after an operator or END is no alias
+        aliased = re.fullmatch(rf"(?P<expression>.+?)\s+as\s+(?P<alias>{_IDENTIFIER}|'[^']+')", item,
+                               re.IGNORECASE | re.DOTALL) or \
+            re.fullmatch(rf"(?P<expression>.+?[\w)\]\"`])\s+(?P<alias>(?!end$){_IDENTIFIER})", item, re.IGNORECASE | re.DOTALL)
+        if aliased and not _is_balanced(aliased["expression"]):
+            aliased = None
+        expression = aliased["expression"].strip() if aliased else item
+        name = _unquote(aliased["alias"]) if aliased else _output_name(item)
+        call = re.match(rf"({'|'.join(APPROXIMATE_AGGREGATES)})\s*\(", expression, re.IGNORECASE)
+        if call and _closing_paren(expression, call.end() - 1) == len(expression) - 1:
+            argument = expression[call.end():-1].strip()
+            if argument == "*" and call[1].lower() != "count":
+                raise ValueError(f"{expression} is not a valid aggregate.")
+            columns.append({"name": name, "expression": expression, "function": call[1].lower(),
+                            "argument": None if argument == "*" else argument})
+        elif _AGGREGATE_CALL.search(expression):
+            raise ValueError(f"Only plain SUM, TOTAL, COUNT and AVG can be estimated, {expression} needs the exact answer.")
+        elif expression == "*" or expression.endswith(".*"):
+            raise ValueError("SELECT * returns rows, not aggregates; the sample would only return some of them.")
+        else:
+            columns.append({"name": name, "expression": expression, "function": None})
+    if not any(column["function"] for column in columns):
+        raise ValueError("Not an aggregate query; the sample would only return some of the rows.")
+
+    group = []
+    for item in _split_top_level(match["group"]) if match["group"] else []:
+        # GROUP BY 1 and GROUP BY alias refer to the select list
+        column = columns[int(item) - 1] if item.isdigit() and 0 < int(item) <= len(columns) else \
+            next((column for column in columns if column["name"] == _unquote(item) and column["expression"] != item), None)
+        if column is not None and column["function"]:
+            raise ValueError(f"GROUP BY {item} refers to an aggregate.")
+        group.append(column["expression"] if column else item)
+    if not group and any(not column["function"] for column in columns):
+        raise ValueError("Columns outside the aggregates need a GROUP BY.")
+
+    order = []
+    for item in _split_top_level(match["order"]) if match["order"] else []:
+        sort = re.fullmatch(r"(?P<key>.+?)(?:\s+(?P<direction>asc|desc))?", item, re.IGNORECASE | re.DOTALL)
+        key = sort["key"].strip()
+        if key.isdigit() and 0 < int(key) <= len(columns):
+            column = columns[int(key) - 1]
+        else:
+            column = next((column for column in columns if key in (column["expression"], column["name"])
+                           or _unquote(key) == column["name"]), None)
+        if column is None:
+            raise ValueError(f"ORDER BY {key} is not a column of the result.")
+        order.append((column["name"], (sort["direction"] or "asc").lower() == "asc"))
+
+    return {"columns": columns, "group": group, "where": match["where"], "alias": match["alias"],
+            "order": order, "limit": int(match["limit"]) if match["limit"] else None}
+
+
+def _sample_query(parsed: dict, table_name: str) -> str:
+    """Rewrites the query into weighted partial sums per group, stratum and replicate group of the sample."""
+    selected = [f"{expression} AS _g{i}" for i, expression in enumerate(parsed["group"])]
+    for i, column in enumerate(parsed["columns"]):
+        if column["function"] is None:
+            selected.append(f"{column['expression']} AS _k{i}")
+            continue
+        argument = column["argument"]
+        if argument is None:
+            selected.append(f"SUM({WEIGHT_COLUMN}) AS _n{i}")
+        else:
+            selected.append(f"SUM(CASE WHEN ({argument}) IS NOT NULL THEN {WEIGHT_COLUMN} END) AS _n{i}")
+            if column["function"] != "count":
+                selected.append(f"SUM(({argument}) * {WEIGHT_COLUMN}) AS _s{i}")
+    alias = parsed["alias"] or f'"{table_name}"'
+    query = f'SELECT {", ".join(selected)}, {STRATUM_COLUMN}, {REPLICATE_COLUMN} FROM "{sample_table_name(table_name)}" AS {alias}'
+    if parsed["where"]:
+        query += f" WHERE {parsed['where']}"
+    return query + f" GROUP BY {', '.join(parsed['group'] + [STRATUM_COLUMN, REPLICATE_COLUMN])}"
+
+
+def _estimates(parsed: dict, totals: pd.DataFrame) -> pd.DataFrame:
+    """Turns weighted sums into the aggregates of the query (one column per aggregate)."""
+    estimates = {}
+    for i, column in enumerate(parsed["columns"]):
+        function = column["function"]
+        if function is None:
+            continue
+        count = totals[f"_n{i}"]
+        if function == "count":
+            estimates[i] = count.round()
+        elif function == "avg":
+            estimates[i] = totals[f"_s{i}"] / count.where(count > 0)
+        elif function == "sum":
+            estimates[i] = totals[f"_s{i}"].where(count > 0)  # SUM of nothing is NULL, TOTAL is 0
+        else:
+            estimates[i] = totals[f"_s{i}"]
+    return pd.DataFrame(estimates)
+
+
+def approximate_query(conn: sqlite3.Connection, query: str, table_name: str = "_df") -> OpResult:
+    """Answers an aggregate query over table_name from its stratified sample.
+
+    Sums and counts are scaled up by the sample weights. The error bound of every estimate is
+    CONFIDENCE_Z times its delete-a-group jackknife standard error: the estimate is recomputed
+    REPLICATES times, each time without one random group of the sample, and the spread of these
+    recomputations measures how much the estimate depends on which rows were sampled.
+
+    Returns:
+        OpResult: value is a DataFrame with the columns of the query, each aggregate followed by
+            "<name> ±" (the 95% error bound); fails with the reason if the query needs the exact answer.
+    """
+    result = OpResult()
+    definition = read_sample_definition(conn, table_name)
+    if definition is None:
+        return result.fail(f"{table_name} has no sample yet.")
+    if definition["data_version"] != get_data_version(conn):
+        return result.fail(f"The sample of {table_name} is out of date.")
+    try:
+        parsed = parse_aggregate_query(query, table_name)
+    except ValueError as e:
+        return result.fail(str(e))
+    try:
+        partials = pd.read_sql(_sample_query(parsed, table_name), conn)
+        design = pd.read_sql(f'SELECT {STRATUM_COLUMN}, {REPLICATE_COLUMN}, COUNT(*) AS n '
+                             f'FROM "{sample_table_name(table_name)}" GROUP BY 1, 2', conn)
+    except Exception as e:
+        return result.fail(f"The query could not run on the sample: {e}", e)
+
+    group_columns = [f"_g{i}" for i in range(len(parsed["group"]))]
+    groups = partials.groupby(group_columns, dropna=False, sort=False).ngroup().to_numpy() if group_columns \
+        else np.zeros(len(partials), int)
+    sums = partials[[col for col in partials.columns if col[:2] in ("_n", "_s")]]
+    values = sums.fillna(0).to_numpy(dtype=float)
+    group_count = groups.max() + 1 if len(groups) else 0
+    if not group_columns:
+        group_count = 1  # an aggregate without GROUP BY returns one row, even if nothing matched
+
+    # Dropping replicate group r of stratum h leaves n_h - n_hr sampled rows, which are weighted up to n_h
+    strata = design[STRATUM_COLUMN].max() + 1
+    sampled = np.zeros((strata, REPLICATES + 1))
+    np.add.at(sampled, (design[STRATUM_COLUMN].to_numpy(), design[REPLICATE_COLUMN].to_numpy()), design["n"].to_numpy())
+    stratum_rows = sampled.sum(axis=1, keepdims=True)
+    remaining = stratum_rows - sampled[:, :REPLICATES]
+    factors = np.divide(stratum_rows, remaining, out=np.ones_like(remaining), where=remaining > 0)
+
+    stratum = partials[STRATUM_COLUMN].to_numpy()
+    replicate = partials[REPLICATE_COLUMN].to_numpy()
+    full = np.zeros((group_count, values.shape[1]))
+    np.add.at(full, groups, values)
+    estimate = _estimates(parsed, pd.DataFrame(full, columns=sums.columns))
+    squares = np.zeros(estimate.shape)
+    for r in range(REPLICATES):
+        row_factors = np.where(replicate == r, 0.0, factors[stratum, r])
+        totals = np.zeros_like(full)
+        np.add.at(totals, groups, values * row_factors[:, None])
+        squares += (_estimates(parsed, pd.DataFrame(totals, columns=sums.columns)) - estimate).to_numpy() ** 2
+    bounds = CONFIDENCE_Z * np.sqrt((REPLICATES - 1) / REPLICATES * squares)
+
+    first_rows = np.unique(groups, return_index=True)[1]
+    frame = {}
+    for i, column in enumerate(parsed["columns"]):
+        if column["function"] is None:
+            frame[column["name"]] = partials[f"_k{i}"].iloc[first_rows].to_numpy()
+        else:
+            position = list(estimate.columns).index(i)
+            frame[column["name"]] = estimate[i].to_numpy()
+            frame[f"{column['name']} ±"] = bounds[:, position]
+    rows = pd.DataFrame(frame)
+    if parsed["order"]:
+        names, ascending = zip(*parsed["order"])
+        # SQLite sorts NULLs first in ascending order
+        rows = rows.sort_values(list(names), ascending=list(ascending), na_position="first" if ascending[0] else "last",
+                                ignore_index=True)
+    if parsed["limit"] is not None:
+        rows = rows.head(parsed["limit"])
+    rows.attrs["engine"] = "sample"
+    result.value = rows
+    return result.success(f"Estimated from a sample of {definition['sample_rows']:,} of {definition['rows']:,} rows; "
+                          f"± is the 95% error bound.")
@@ -0,0 +1,123 @@
+import sqlite3
+from sqlite3 import Connection
+
+from PageData.core.search import SNIPPET_INDEX, SNIPPET_SEARCH_COLUMNS, create_fts_index
+
+DB_PATH = "file::memory:?cache=shared"
+
+
+def create_app_tables(conn: Connection):
+    """Creates the application tables that are missing, e.g. after an older database was uploaded."""
+    cursor = conn.cursor()
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS api_keys (
+            id TEXT PRIMARY KEY,
+            service TEXT,
+            key TEXT
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_history (
+            id TEXT PRIMARY KEY,
+            question TEXT,
+            answer TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS code_snippets (
+            id TEXT PRIMARY KEY,
+            type TEXT,
+            code TEXT,
+            name TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_view BOOLEAN DEFAULT FALSE,
+            category TEXT,  -- Added the category field
+            inputs TEXT,  -- Comma-separated tables a pipeline snippet reads
+            output TEXT,  -- Table a pipeline snippet's result is registered as
+            engine TEXT  -- Engine of SQL snippets: auto (default), sqlite or duckdb
+        )
+    ''')
+    # Databases saved before pipelines and engines existed lack those columns
+    snippet_columns = {row[1] for row in cursor.execute("PRAGMA table_info(code_snippets)")}
+    for column in ("inputs", "output", "engine"):
+        if column not in snippet_columns:
+            cursor.execute(f"ALTER TABLE code_snippets ADD COLUMN {column} TEXT")
+
+    # Full-text index over the snippets, kept in sync by triggers; skipped if SQLite was built without FTS5
+    if not cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (SNIPPET_INDEX,)).fetchone():
+        try:
+            create_fts_index(cursor, SNIPPET_INDEX, "code_snippets", SNIPPET_SEARCH_COLUMNS)
+        except sqlite3.OperationalError:
+            pass
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS validation_rules (
+            id TEXT PRIMARY KEY,
+            name TEXT UNIQUE,
+            condition TEXT,  -- DataFrame.query expression selecting the elements that violate the rule
+            category TEXT,
+            severity TEXT,  -- error, warning or info
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS query_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            snippet_id TEXT,
+            sql_hash TEXT,
+            duration_ms REAL,
+            rows_returned INTEGER,
+            data_version INTEGER,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pipeline_nodes (
+            output TEXT PRIMARY KEY,
+            node_hash TEXT,
+            rows INTEGER,
+            duration_ms REAL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    ''')
+
+    conn.commit()
+
+
+def get_data_version(conn: Connection) -> int:
+    """Returns the version of the uploaded data, incremented every time _df is replaced or updated."""
+    try:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = 'data_version'").fetchone()
+        return int(row[0]) if row else 0
+    except sqlite3.Error:
+        return 0
+
+
+def bump_data_version(conn: Connection) -> int:
+    """Increments and returns the data version. Call after the uploaded data changed."""
+    version = get_data_version(conn) + 1
+    conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('data_version', ?)", (str(version),))
+    conn.commit()
+    return version
+
+
+def database_uri(conn: Connection) -> str:
+    """Returns the URI or file path conn was opened with, so other threads can open the same database."""
+    uri = getattr(conn, "uri", None)  # set on workspace connections (see core.workspaces)
+    if uri:
+        return uri
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    return path or DB_PATH
@@ -0,0 +1,153 @@
+import json
+import re
+import sqlite3
+
+import pandas as pd
+
+from PageData.core.results import OpResult
+
+SNIPPET_INDEX = "code_snippets_fts"
+SNIPPET_SEARCH_COLUMNS = ["name", "category", "code"]
+TOKENIZER = "unicode61 remove_diacritics 2"
+DEFAULT_PAGE_SIZE = 25
+
+
+def search_index_name(table_name: str) -> str:
+    """Returns the name of the FTS5 index over the text columns of table_name."""
+    return f"{table_name}_fts"
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def create_fts_index(cursor: sqlite3.Cursor, index: str, table_name: str, columns: list):
+    """Creates an external-content FTS5 index over columns of table_name, kept in sync by triggers.
+
+    The index stores only the tokens; the text stays in table_name. Inserts, deletes and
+    updates of table_name (including upsert_table's delete and re-insert) update the index.
+    """
+    quoted = ", ".join(_quote(col) for col in columns)
+    new_values = ", ".join(f"new.{_quote(col)}" for col in columns)
+    old_values = ", ".join(f"old.{_quote(col)}" for col in columns)
+    drop_fts_index(cursor, index)
+    cursor.execute(f"CREATE VIRTUAL TABLE {_quote(index)} USING fts5({quoted}, content={_quote(table_name)}, "
+                   f"content_rowid='rowid', tokenize='{TOKENIZER}', prefix='2 3')")
+    delete = f"INSERT INTO {_quote(index)} ({_quote(index)}, rowid, {quoted}) VALUES ('delete', old.rowid, {old_values});"
+    insert = f"INSERT INTO {_quote(index)} (rowid, {quoted}) VALUES (new.rowid, {new_values});"
+    cursor.execute(f"CREATE TRIGGER {_quote(index + '_ai')} AFTER INSERT ON {_quote(table_name)} BEGIN {insert} END")
+    cursor.execute(f"CREATE TRIGGER {_quote(index + '_ad')} AFTER DELETE ON {_quote(table_name)} BEGIN {delete} END")
+    cursor.execute(f"CREATE TRIGGER {_quote(index + '_au')} AFTER UPDATE ON {_quote(table_name)} BEGIN {delete} {insert} END")
+    cursor.execute(f"INSERT INTO {_quote(index)} ({_quote(index)}) VALUES ('rebuild')")
+
+
+def drop_fts_index(cursor: sqlite3.Cursor, index: str):
+    for suffix in ("_ai", "_ad", "_au"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {_quote(index + suffix)}")
+    cursor.execute(f"DROP TABLE IF EXISTS {_quote(index)}")
+
+
+def read_search_columns(conn: sqlite3.Connection, table_name: str = "_df") -> list or None:
+    """Returns the indexed columns of table_name, or None if it has no search index."""
+    try:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (f"search_columns:{table_name}",)).fetchone()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def build_search_index(conn: sqlite3.Connection, columns: list, table_name: str = "_df") -> OpResult:
+    """Indexes the given text columns of table_name for full-text search.
+
+    The column choice is kept in app_meta, so write_table rebuilds the index when the table is replaced.
+    """
+    result = OpResult()
+    stored_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table_name)})")]
+    missing = [col for col in columns if col not in stored_columns]
+    if missing:
+        return result.fail(f"Columns not found in {table_name}: {missing}", columns=missing)
+    if not columns:
+        return result.fail("Pick at least one column to index.")
+    cursor = conn.cursor()
+    try:
+        if not conn.in_transaction:
+            cursor.execute("BEGIN")  # DDL would otherwise autocommit outside the transaction
+        create_fts_index(cursor, search_index_name(table_name), table_name, columns)
+        cursor.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)",
+                       (f"search_columns:{table_name}", json.dumps(columns)))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        return result.fail(f"Error building the search index: {e}", e)
+    result.value = columns
+    return result.success(f"Indexed {len(columns)} columns of {table_name} for search.")
+
+
+def refresh_search_index(conn: sqlite3.Connection, table_name: str) -> OpResult or None:
+    """Rebuilds the search index after table_name was replaced (its triggers were dropped with it).
+
+    Incremental updates keep the index in sync through the triggers, so nothing is rebuilt then.
+    """
+    columns = read_search_columns(conn, table_name)
+    if columns is None:
+        return None
+    index = search_index_name(table_name)
+    triggers = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND name LIKE ?",
+                            (table_name, f"{index}_a_")).fetchone()[0]
+    if triggers == 3:
+        return None
+    return build_search_index(conn, columns, table_name)
+
+
+def match_query(text: str) -> str:
+    """Turns free text into an FTS5 query: every word must match, as a word or a word prefix.
+
+    "wall 200" finds "Basic Wall: Generic 200mm". FTS5 operators typed by the user are taken literally.
+    """
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def search(conn: sqlite3.Connection, index: str, table_name: str, text: str, columns: list = None,
+           page: int = 1, page_size: int = DEFAULT_PAGE_SIZE) -> OpResult:
+    """Returns one page of the rows of table_name matching text, best matches first (bm25).
+
+    columns are the columns of table_name to return (default: all).
+
+    Returns:
+        OpResult: value is a dict with "rows" (DataFrame with the columns plus score and match,
+            a snippet of the matching text with the hits in brackets) and "total" (number of matches).
+    """
+    result = OpResult()
+    query = match_query(text)
+    if not query:
+        result.value = {"rows": pd.DataFrame(), "total": 0}
+        return result
+    selected = ", ".join(f"t.{_quote(col)}" for col in columns) if columns else "t.*"
+    try:
+        total = conn.execute(f"SELECT COUNT(*) FROM {_quote(index)} WHERE {_quote(index)} MATCH ?", (query,)).fetchone()[0]
+        rows = pd.read_sql(
+            f"SELECT {selected}, bm25({_quote(index)}) AS score, "
+            f"snippet({_quote(index)}, -1, '[', ']', '…', 12) AS match "
+            f"FROM {_quote(index)} JOIN {_quote(table_name)} AS t ON t.rowid = {_quote(index)}.rowid "
+            f"WHERE {_quote(index)} MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            conn, params=(query, page_size, (page - 1) * page_size),
+        )
+    except Exception as e:
+        return result.fail(f"Search failed: {e}", e)
+    result.value = {"rows": rows, "total": total}
+    return result
+
+
+def search_elements(conn: sqlite3.Connection, text: str, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE,
+                    table_name: str = "_df") -> OpResult:
+    """Full-text search over the indexed text columns of the element table (see build_search_index)."""
+    if read_search_columns(conn, table_name) is None:
+        return OpResult().fail(f"{table_name} has no search index yet.")
+    return search(conn, search_index_name(table_name), table_name, text, None, page, page_size)
+
+
+def search_snippets(conn: sqlite3.Connection, text: str, page: int = 1, page_size: int = DEFAULT_PAGE_SIZE) -> OpResult:
+    """Full-text search over the name, category and code of the saved snippets."""
+    return search(conn, SNIPPET_INDEX, "code_snippets", text, ["id", "name", "type", "category", "code"],
+                  page, page_size)
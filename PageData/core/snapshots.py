@@ -0,0 +1,380 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+from PageData.core.column_stats import profile_table_name
+from PageData.core.engines import VERSIONED_TABLES
+from PageData.core.results import OpResult
+from PageData.core.schema import create_app_tables, get_data_version
+from PageData.core.search import SNIPPET_INDEX, SNIPPET_SEARCH_COLUMNS, build_search_index, create_fts_index, \
+    drop_fts_index, read_search_columns, search_index_name
+from PageData.core.spatial import build_spatial_index, drop_spatial_index, read_box_columns
+
+STORE = "snapshot_store"
+HASH_BATCH_ROWS = 10_000
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _content_table(content_hash: str) -> str:
+    return f"{STORE}.{_quote('c_' + content_hash)}"
+
+
+def _create_store(conn: sqlite3.Connection, schema: str = "main"):
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.snapshots (
+            name TEXT PRIMARY KEY,
+            created DATETIME DEFAULT CURRENT_TIMESTAMP,
+            data_version INTEGER
+        )
+    """)
+    # The schema objects of every snapshot; tables point to their contents by hash
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.snapshot_objects (
+            snapshot TEXT,
+            type TEXT,
+            name TEXT,
+            sql TEXT,
+            content_hash TEXT,
+            rows INTEGER
+        )
+    """)
+    # Hashes of versioned tables by data version, so an unchanged _df is not hashed again
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.table_hashes (
+            table_name TEXT,
+            data_version INTEGER,
+            content_hash TEXT,
+            rows INTEGER,
+            PRIMARY KEY (table_name, data_version)
+        )
+    """)
+
+
+@contextmanager
+def _attached(conn: sqlite3.Connection, store_path: str):
+    """Attaches the snapshot store to conn, so tables are copied inside SQLite without passing through Python."""
+    if conn.in_transaction:
+        conn.commit()  # ATTACH is not allowed inside a transaction
+    conn.execute(f"ATTACH DATABASE ? AS {STORE}", (store_path,))
+    try:
+        _create_store(conn, STORE)
+        conn.commit()
+        yield
+    except BaseException:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        if conn.in_transaction:
+            conn.commit()  # hashes cached while reading
+        conn.execute(f"DETACH DATABASE {STORE}")
+
+
+def _schema_objects(conn: sqlite3.Connection) -> list:
+    """Returns the tables, views, indexes and triggers of the database as dicts with type, name and sql.
+
+    Full-text and spatial indexes (virtual tables, their shadow tables, triggers and views) are left
+    out: they are rebuilt from their definition in app_meta after a restore instead of being copied.
+    """
+    rows = conn.execute("SELECT type, name, sql FROM main.sqlite_master "
+                        "WHERE sql IS NOT NULL AND name NOT LIKE 'sqlite_%' ORDER BY rowid").fetchall()
+    virtual = [name for kind, name, sql in rows if kind == "table" and sql.upper().startswith("CREATE VIRTUAL TABLE")]
+
+    def derived(kind: str, name: str, sql: str) -> bool:
+        return any(name == table or name.startswith(table + "_")
+                   or (kind == "view" and re.search(rf'"{re.escape(table)}"|\b{re.escape(table)}\b', sql))
+                   for table in virtual)
+
+    return [{"type": kind, "name": name, "sql": sql} for kind, name, sql in rows if not derived(kind, name, sql)]
+
+
+def _table_hash(conn: sqlite3.Connection, table_name: str, sql: str) -> tuple:
+    """Returns (content hash, rows) of a table of conn, a hash over its definition and rows in storage order."""
+    version = get_data_version(conn) if table_name in VERSIONED_TABLES else None
+    if version is not None:
+        row = conn.execute(f"SELECT content_hash, rows FROM {STORE}.table_hashes WHERE table_name = ? AND data_version = ?",
+                           (table_name, version)).fetchone()
+        # Statements run with execute_sql bump the version when they write; the row count also catches
+        # rows added or deleted on another connection
+        if row and row[1] == conn.execute(f"SELECT COUNT(*) FROM main.{_quote(table_name)}").fetchone()[0]:
+            return row
+    digest = hashlib.blake2b(sql.encode("utf-8"), digest_size=16)
+    rows = 0
+    cursor = conn.execute(f"SELECT * FROM main.{_quote(table_name)}")
+    while batch := cursor.fetchmany(HASH_BATCH_ROWS):
+        digest.update(repr(batch).encode("utf-8"))
+        rows += len(batch)
+    if version is not None:
+        conn.execute(f"INSERT OR REPLACE INTO {STORE}.table_hashes VALUES (?, ?, ?, ?)",
+                     (table_name, version, digest.hexdigest(), rows))
+    return digest.hexdigest(), rows
+
+
+def _stored_objects(conn: sqlite3.Connection, name: str) -> list:
+    rows = conn.execute(f"SELECT type, name, sql, content_hash, rows FROM {STORE}.snapshot_objects "
+                        f"WHERE snapshot = ? ORDER BY rowid", (name,)).fetchall()
+    return [dict(zip(("type", "name", "sql", "content_hash", "rows"), row)) for row in rows]
+
+
+def create_snapshot(conn: sqlite3.Connection, store_path: str, name: str) -> OpResult:
+    """Saves the database as a named snapshot in the snapshot store, a SQLite file at store_path.
+
+    Tables are stored by content hash: a table that is unchanged since an earlier snapshot is not
+    copied again, so many snapshots of a large model cost little more than the tables that changed.
+
+    Returns:
+        OpResult: value is a dict with the number of "tables" and of tables "copied" into the store.
+    """
+    result = OpResult()
+    if not name:
+        return result.fail("Enter a name for the snapshot.")
+    try:
+        with _attached(conn, store_path):
+            if conn.execute(f"SELECT 1 FROM {STORE}.snapshots WHERE name = ?", (name,)).fetchone():
+                return result.fail(f"A snapshot named {name} already exists.")
+            objects = _schema_objects(conn)
+            copied = 0
+            conn.execute("BEGIN")
+            for obj in objects:
+                if obj["type"] != "table":
+                    continue
+                obj["content_hash"], obj["rows"] = _table_hash(conn, obj["name"], obj["sql"])
+                content = _content_table(obj["content_hash"])
+                exists = conn.execute(f"SELECT 1 FROM {STORE}.sqlite_master WHERE name = ?",
+                                      ("c_" + obj["content_hash"],)).fetchone()
+                if not exists:
+                    conn.execute(f"CREATE TABLE {content} AS SELECT * FROM main.{_quote(obj['name'])}")
+                    copied += 1
+            conn.executemany(f"INSERT INTO {STORE}.snapshot_objects VALUES (?, ?, ?, ?, ?, ?)",
+                             [(name, obj["type"], obj["name"], obj["sql"], obj.get("content_hash"), obj.get("rows"))
+                              for obj in objects])
+            conn.execute(f"INSERT INTO {STORE}.snapshots (name, data_version) VALUES (?, ?)",
+                         (name, get_data_version(conn)))
+            conn.commit()
+    except sqlite3.Error as e:
+        return result.fail(f"Error saving the snapshot: {e}", e)
+    tables = sum(obj["type"] == "table" for obj in objects)
+    result.value = {"tables": tables, "copied": copied}
+    return result.success(f"Snapshot {name} saved: {copied} of {tables} tables were new or changed and had to be stored.")
+
+
+def restore_snapshot(conn: sqlite3.Connection, store_path: str, name: str) -> OpResult:
+    """Returns the database to a snapshot. Only tables whose contents differ from the snapshot are replaced.
+
+    Views, indexes and triggers are recreated as they were. The data version moves forward when _df
+    changes (never back to an earlier number, which caches may still hold data for), and the column
+    statistics, cube and sample restored with it are stamped with the new version.
+
+    Returns:
+        OpResult: value is a dict with the "restored" and "dropped" table names and the number of "unchanged" tables.
+    """
+    result = OpResult()
+    search_before = {table: read_search_columns(conn, table) for table in VERSIONED_TABLES}
+    boxes_before = {table: read_box_columns(conn, table) for table in VERSIONED_TABLES}
+    version = get_data_version(conn)
+    restored, dropped, unchanged = [], [], 0
+    try:
+        with _attached(conn, store_path):
+            snapshot = conn.execute(f"SELECT data_version FROM {STORE}.snapshots WHERE name = ?", (name,)).fetchone()
+            if snapshot is None:
+                return result.fail(f"No snapshot named {name}.")
+            saved = _stored_objects(conn, name)
+            saved_tables = {obj["name"]: obj for obj in saved if obj["type"] == "table"}
+            current = _schema_objects(conn)
+            current_tables = {obj["name"]: obj for obj in current if obj["type"] == "table"}
+            # Hashed before anything changes: the hash cache is keyed by the data version in app_meta
+            current_hashes = {table_name: _table_hash(conn, table_name, current_tables[table_name]["sql"])[0]
+                              for table_name in saved_tables.keys() & current_tables.keys()}
+            conn.commit()
+            conn.execute("BEGIN")
+            for obj in current:
+                if obj["type"] != "table":
+                    conn.execute(f"DROP {obj['type'].upper()} IF EXISTS main.{_quote(obj['name'])}")
+                elif obj["name"] not in saved_tables:
+                    conn.execute(f"DROP TABLE main.{_quote(obj['name'])}")
+                    dropped.append(obj["name"])
+            for table_name, obj in saved_tables.items():
+                if current_hashes.get(table_name) == obj["content_hash"]:
+                    unchanged += 1
+                    continue
+                conn.execute(f"DROP TABLE IF EXISTS main.{_quote(table_name)}")
+                conn.execute(obj["sql"])
+                conn.execute(f"INSERT INTO main.{_quote(table_name)} SELECT * FROM {_content_table(obj['content_hash'])}")
+                restored.append(table_name)
+            # Indexes before triggers, so a trigger never fires on a half restored table
+            for kind in ("index", "view", "trigger"):
+                for obj in saved:
+                    if obj["type"] == kind:
+                        conn.execute(obj["sql"])
+            changed_versioned = [table for table in restored if table in VERSIONED_TABLES]
+            new_version = version + 1 if changed_versioned else version
+            _restamp(conn, snapshot[0], new_version)
+            for table_name in changed_versioned:
+                conn.execute(f"INSERT OR REPLACE INTO {STORE}.table_hashes VALUES (?, ?, ?, ?)",
+                             (table_name, new_version, saved_tables[table_name]["content_hash"],
+                              saved_tables[table_name]["rows"]))
+            conn.commit()
+    except sqlite3.Error as e:
+        return result.fail(f"Error restoring the snapshot: {e}", e)
+
+    create_app_tables(conn)  # app tables added after the snapshot was taken
+    if "code_snippets" in restored:
+        # Dropping code_snippets dropped the triggers of its search index
+        try:
+            create_fts_index(conn.cursor(), SNIPPET_INDEX, "code_snippets", SNIPPET_SEARCH_COLUMNS)
+            conn.commit()
+        except sqlite3.OperationalError:
+            conn.rollback()
+    for table_name in VERSIONED_TABLES:
+        result.extend(_rebuild_indexes(conn, table_name, table_name in restored, search_before[table_name],
+                                       boxes_before[table_name]))
+    result.value = {"restored": restored, "dropped": dropped, "unchanged": unchanged}
+    return result.success(f"Snapshot {name} restored: {len(restored)} tables replaced, {len(dropped)} dropped, "
+                          f"{unchanged} unchanged.")
+
+
+def _restamp(conn: sqlite3.Connection, old_version: int, new_version: int):
+    """Sets the data version and moves the data derived from the snapshot's version to new_version."""
+    conn.execute("INSERT OR REPLACE INTO main.app_meta (key, value) VALUES ('data_version', ?)", (str(new_version),))
+    if old_version == new_version:
+        return
+    for key, value in conn.execute("SELECT key, value FROM main.app_meta").fetchall():
+        try:
+            definition = json.loads(value)
+        except (TypeError, ValueError):
+            continue
+        if isinstance(definition, dict) and definition.get("data_version") == old_version:
+            definition["data_version"] = new_version
+            conn.execute("UPDATE main.app_meta SET value = ? WHERE key = ?", (json.dumps(definition), key))
+    for table_name in VERSIONED_TABLES:
+        profile_table = profile_table_name(table_name)
+        if conn.execute("SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = ?", (profile_table,)).fetchone():
+            conn.execute(f"UPDATE main.{_quote(profile_table)} SET data_version = ? WHERE data_version = ?",
+                         (new_version, old_version))
+
+
+def _rebuild_indexes(conn: sqlite3.Connection, table_name: str, replaced: bool, search_before, boxes_before) -> OpResult:
+    """Brings the search and spatial index of table_name in line with the restored table and app_meta."""
+    result = OpResult()
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)).fetchone():
+        replaced, search_columns, box_columns = True, None, None
+    else:
+        search_columns, box_columns = read_search_columns(conn, table_name), read_box_columns(conn, table_name)
+    if replaced or search_columns != search_before:
+        if search_columns is None:
+            drop_fts_index(conn.cursor(), search_index_name(table_name))
+            conn.commit()
+        else:
+            result.extend(build_search_index(conn, search_columns, table_name))
+    if replaced or box_columns != boxes_before:
+        if box_columns is None:
+            drop_spatial_index(conn.cursor(), table_name)
+            conn.commit()
+        else:
+            result.extend(build_spatial_index(conn, box_columns, table_name))
+    # Only failures are worth showing next to the restore message
+    result.messages = [message for message in result.messages if message[0] != "success"]
+    return result
+
+
+def list_snapshots(store_path: str) -> pd.DataFrame:
+    """Returns the snapshots in the store, oldest first, with the number of tables each one added to the store."""
+    if not os.path.exists(store_path):
+        return pd.DataFrame(columns=["name", "created", "tables", "new_tables", "rows"])
+    with sqlite3.connect(store_path) as store:
+        _create_store(store)
+        return pd.read_sql("""
+            SELECT s.name, s.created, COUNT(o.content_hash) AS tables,
+                   SUM(o.content_hash IS NOT NULL AND NOT EXISTS (
+                       SELECT 1 FROM snapshot_objects AS e JOIN snapshots AS es ON es.name = e.snapshot
+                       WHERE e.content_hash = o.content_hash AND es.rowid < s.rowid)) AS new_tables,
+                   SUM(o.rows) AS rows
+            FROM snapshots AS s LEFT JOIN snapshot_objects AS o ON o.snapshot = s.name
+            GROUP BY s.name ORDER BY s.rowid
+        """, store)
+
+
+def delete_snapshot(store_path: str, name: str) -> OpResult:
+    """Deletes a snapshot and the stored tables no other snapshot refers to."""
+    result = OpResult()
+    store = sqlite3.connect(store_path)
+    try:
+        _create_store(store)
+        if store.execute("DELETE FROM snapshots WHERE name = ?", (name,)).rowcount == 0:
+            return result.fail(f"No snapshot named {name}.")
+        store.execute("DELETE FROM snapshot_objects WHERE snapshot = ?", (name,))
+        referenced = {row[0] for row in store.execute("SELECT content_hash FROM snapshot_objects WHERE content_hash IS NOT NULL")}
+        stored = [row[0] for row in store.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'c\\_%' ESCAPE '\\'")]
+        removed = [table for table in stored if table[2:] not in referenced]
+        for table in removed:
+            store.execute(f"DROP TABLE {_quote(table)}")
+        store.execute("DELETE FROM table_hashes WHERE content_hash NOT IN (SELECT content_hash FROM snapshot_objects "
+                      "WHERE content_hash IS NOT NULL)")
+        store.commit()
+        store.execute("VACUUM")  # give the space of the dropped tables back to the file system
+    except sqlite3.Error as e:
+        store.rollback()
+        return result.fail(f"Error deleting the snapshot: {e}", e)
+    finally:
+        store.close()
+    return result.success(f"Snapshot {name} deleted, {len(removed)} stored tables freed.")
+
+
+def diff_snapshots(conn: sqlite3.Connection, store_path: str, name: str, other: str = None) -> OpResult:
+    """Compares snapshot name with snapshot other, or with the current database if other is None.
+
+    Tables are compared by content hash, so only changed tables are read: for those with the same
+    columns, the rows only in one side are counted (as distinct rows, by value).
+
+    Returns:
+        OpResult: value is a DataFrame with one row per table: status (added, removed, changed or
+            unchanged), rows_before, rows_after, rows_removed and rows_added.
+    """
+    result = OpResult()
+    try:
+        with _attached(conn, store_path):
+            for snapshot in (name, other):
+                if snapshot is not None and \
+                        not conn.execute(f"SELECT 1 FROM {STORE}.snapshots WHERE name = ?", (snapshot,)).fetchone():
+                    return result.fail(f"No snapshot named {snapshot}.")
+            before = {obj["name"]: obj for obj in _stored_objects(conn, name) if obj["type"] == "table"}
+            if other is not None:
+                after = {obj["name"]: obj for obj in _stored_objects(conn, other) if obj["type"] == "table"}
+                for obj in after.values():
+                    obj["source"] = _content_table(obj["content_hash"])
+            else:
+                after = {obj["name"]: obj for obj in _schema_objects(conn) if obj["type"] == "table"}
+                for obj in after.values():
+                    obj["content_hash"], obj["rows"] = _table_hash(conn, obj["name"], obj["sql"])
+                    obj["source"] = f"main.{_quote(obj['name'])}"
+            rows = []
+            for table_name in sorted(before.keys() | after.keys()):
+                old, new = before.get(table_name), after.get(table_name)
+                row = {"table": table_name, "rows_before": old and old["rows"], "rows_after": new and new["rows"],
+                       "rows_removed": None, "rows_added": None}
+                if old is None or new is None:
+                    row["status"] = "added" if old is None else "removed"
+                elif old["content_hash"] == new["content_hash"]:
+                    row.update(status="unchanged", rows_removed=0, rows_added=0)
+                else:
+                    row["status"] = "changed"
+                    old_source = _content_table(old["content_hash"])
+                    columns = [[column[0] for column in conn.execute(f"SELECT * FROM {source} LIMIT 0").description]
+                               for source in (old_source, new["source"])]
+                    if columns[0] == columns[1]:
+                        count = "SELECT COUNT(*) FROM (SELECT * FROM {} EXCEPT SELECT * FROM {})"
+                        row["rows_removed"] = conn.execute(count.format(old_source, new["source"])).fetchone()[0]
+                        row["rows_added"] = conn.execute(count.format(new["source"], old_source)).fetchone()[0]
+                rows.append(row)
+    except sqlite3.Error as e:
+        return result.fail(f"Error comparing the snapshots: {e}", e)
+    result.value = pd.DataFrame(rows, columns=["table", "status", "rows_before", "rows_after", "rows_removed", "rows_added"])
+    return result
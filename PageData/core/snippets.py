@@ -0,0 +1,64 @@
+import time
+from sqlite3 import Connection
+
+import pandas as pd
+
+from PageData.DB.query_log import log_query
+from PageData.core.dataset import LazyDataset, columns_used
+from PageData.core.query import execute_python_code, execute_sql
+from PageData.core.results import OpResult
+
+
+def load_snippets(conn: Connection, names: list = None, category: str = None) -> pd.DataFrame:
+    """Returns saved snippets, optionally filtered by name and category."""
+    query = "SELECT id, name, type, code, is_view, category, engine FROM code_snippets"
+    snippets = pd.read_sql(query, conn)
+    if names:
+        snippets = snippets[snippets["name"].isin(names)]
+    if category is not None:
+        snippets = snippets[snippets["category"] == category]
+    return snippets
+
+
+def run_snippets(conn: Connection, snippets: pd.DataFrame, python_vars: dict = None) -> OpResult:
+    """Runs saved SQL and Python snippets in order and records their outcome.
+
+    Every run is logged to query_log like a run in the app (see DB.query_log).
+
+    Args:
+        conn: The database the snippets run against.
+        snippets: Rows of code_snippets (see load_snippets).
+        python_vars: Variables available to Python snippets (e.g. "df", "pd"). A LazyDataset "df" is
+            given to each snippet as a DataFrame of the columns it reads (see core.dataset.columns_used).
+
+    Returns:
+        OpResult: value is a list of dicts with the snippet's id, name, type, ok, duration_ms,
+        rows and either "data" (SQL result DataFrame) or "output" (captured Python stdout).
+        ok is False if any snippet failed.
+    """
+    result = OpResult(value=[])
+    for snippet in snippets.itertuples(index=False):
+        run = {"id": snippet.id, "name": snippet.name, "type": snippet.type, "ok": True, "rows": None}
+        start = time.perf_counter()
+        if snippet.type == "sql":
+            data = execute_sql(snippet.code, conn, snippet_id=snippet.id, engine=getattr(snippet, "engine", None))
+            if isinstance(data, pd.DataFrame):
+                run.update(data=data, rows=len(data))
+            else:
+                run.update(ok=False, error=data)
+        else:
+            local_vars = dict(python_vars or {})
+            if isinstance(local_vars.get("df"), LazyDataset):
+                local_vars["data"] = local_vars["df"]
+                local_vars["df"] = local_vars["df"].select(columns_used(snippet.code, local_vars["df"].columns))
+            output, error = execute_python_code(snippet.code, local_vars)
+            run.update(output=output, ok=error is None, error=error)
+        run["duration_ms"] = (time.perf_counter() - start) * 1000
+        if snippet.type != "sql":
+            log_query(conn, snippet.id, snippet.code, run["duration_ms"])  # execute_sql logs SQL runs itself
+        result.value.append(run)
+        if run["ok"]:
+            result.info(f"{snippet.name}: {run['duration_ms']:.0f} ms")
+        else:
+            result.fail(f"{snippet.name}: {run['error']}", snippet_id=snippet.id)
+    return result
@@ -0,0 +1,216 @@
+import json
+import re
+import sqlite3
+
+import pandas as pd
+
+from PageData.core.results import OpResult
+
+BOX_FIELDS = ["min_x", "max_x", "min_y", "max_y", "min_z", "max_z"]
+# Matches "BoundingBoxMinX", "BBox_Min_X", "Min X : Double", "XMax", "box.max.z", ...
+BOX_COLUMN_PATTERN = re.compile(r"^(?:boundingbox|bbox|bb|box)?(?:(min|max)([xyz])|([xyz])(min|max))$")
+
+
+def spatial_index_name(table_name: str) -> str:
+    """Returns the name of the R*Tree over the element bounding boxes of table_name."""
+    return f"{table_name}_rtree"
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def detect_box_columns(columns: list) -> dict or None:
+    """Finds the bounding box columns of an export by name.
+
+    Returns:
+        dict: min_x, max_x, min_y, max_y and, if present, min_z and max_z mapped to column names,
+            or None if no complete 2D box was found.
+    """
+    mapping = {}
+    for col in columns:
+        # "Min X : Double" -> "minx"; the storage type suffix of DDC exports is not part of the name
+        name = re.sub(r"[^a-z]", "", str(col).split(" : ")[0].lower())
+        match = BOX_COLUMN_PATTERN.match(name)
+        if match:
+            bound, axis = (match.group(1), match.group(2)) if match.group(1) else (match.group(4), match.group(3))
+            mapping.setdefault(f"{bound}_{axis}", col)
+    if not all(field in mapping for field in BOX_FIELDS[:4]):
+        return None
+    if not ("min_z" in mapping and "max_z" in mapping):
+        mapping.pop("min_z", None)
+        mapping.pop("max_z", None)
+    return mapping
+
+
+def read_box_columns(conn: sqlite3.Connection, table_name: str = "_df") -> dict or None:
+    """Returns the bounding box columns table_name is indexed by, or None if it has no spatial index."""
+    try:
+        row = conn.execute("SELECT value FROM app_meta WHERE key = ?", (f"spatial_columns:{table_name}",)).fetchone()
+    except sqlite3.Error:
+        return None
+    return json.loads(row[0]) if row else None
+
+
+def _box_values(mapping: dict, alias: str) -> list:
+    """SQL expressions of the box corners; MIN/MAX keep boxes valid when an export swapped min and max."""
+    values = []
+    for axis in "xyz":
+        if f"min_{axis}" not in mapping:
+            continue
+        low, high = (f"CAST({alias}.{_quote(mapping[f'{bound}_{axis}'])} AS REAL)" for bound in ("min", "max"))
+        values += [f"MIN({low}, {high})", f"MAX({low}, {high})"]
+    return values
+
+
+def build_spatial_index(conn: sqlite3.Connection, mapping: dict, table_name: str = "_df") -> OpResult:
+    """Indexes the element bounding boxes of table_name in an R*Tree keyed by the element's rowid.
+
+    Creates the views <table>_boxes (every indexed element with its box) and <table>_box_overlaps
+    (pairs of elements whose boxes intersect, found through the R*Tree instead of comparing all pairs).
+    Triggers keep the index in sync with inserts, updates and deletes; the mapping is kept in app_meta,
+    so write_table rebuilds the index when the table is replaced.
+
+    Args:
+        mapping: min_x, max_x, min_y, max_y and optionally min_z, max_z mapped to column names.
+    """
+    result = OpResult()
+    fields = [field for field in BOX_FIELDS if field in mapping]
+    if fields not in (BOX_FIELDS[:4], BOX_FIELDS):
+        return result.fail("Map the min and max columns of x and y (and optionally z).", details=mapping)
+    stored_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({_quote(table_name)})")]
+    missing = [col for col in mapping.values() if col not in stored_columns]
+    if missing:
+        return result.fail(f"Columns not found in {table_name}: {missing}", columns=missing)
+
+    index = spatial_index_name(table_name)
+    not_null = " AND ".join(f"{{alias}}.{_quote(mapping[field])} IS NOT NULL" for field in fields)
+    insert = (f"INSERT INTO {_quote(index)} SELECT new.rowid, {', '.join(_box_values(mapping, 'new'))} "
+              f"WHERE {not_null.format(alias='new')};")
+    delete = f"DELETE FROM {_quote(index)} WHERE id = old.rowid;"
+    cursor = conn.cursor()
+    try:
+        if not conn.in_transaction:
+            cursor.execute("BEGIN")  # DDL would otherwise autocommit outside the transaction
+        drop_spatial_index(cursor, table_name)
+        cursor.execute(f"CREATE VIRTUAL TABLE {_quote(index)} USING rtree(id, {', '.join(fields)})")
+        cursor.execute(f"INSERT INTO {_quote(index)} SELECT t.rowid, {', '.join(_box_values(mapping, 't'))} "
+                       f"FROM {_quote(table_name)} AS t WHERE {not_null.format(alias='t')}")
+        cursor.execute(f"CREATE TRIGGER {_quote(index + '_ai')} AFTER INSERT ON {_quote(table_name)} BEGIN {insert} END")
+        cursor.execute(f"CREATE TRIGGER {_quote(index + '_ad')} AFTER DELETE ON {_quote(table_name)} BEGIN {delete} END")
+        cursor.execute(f"CREATE TRIGGER {_quote(index + '_au')} AFTER UPDATE ON {_quote(table_name)} BEGIN {delete} {insert} END")
+        cursor.execute(f"CREATE VIEW {_quote(table_name + '_boxes')} AS SELECT r.*, t.* "
+                       f"FROM {_quote(index)} AS r JOIN {_quote(table_name)} AS t ON t.rowid = r.id")
+        overlap = " AND ".join(f"b.min_{axis} <= a.max_{axis} AND b.max_{axis} >= a.min_{axis}"
+                               for axis in "xyz" if f"min_{axis}" in fields)
+        cursor.execute(f"CREATE VIEW {_quote(table_name + '_box_overlaps')} AS SELECT a.id AS id_a, b.id AS id_b "
+                       f"FROM {_quote(index)} AS a JOIN {_quote(index)} AS b ON {overlap} AND b.id > a.id")
+        cursor.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES (?, ?)",
+                       (f"spatial_columns:{table_name}", json.dumps(mapping)))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        return result.fail(f"Error building the spatial index: {e}", e)
+    boxes = conn.execute(f"SELECT COUNT(*) FROM {_quote(index)}").fetchone()[0]
+    result.value = {"boxes": boxes, "dimensions": len(fields) // 2}
+    return result.success(f"Indexed {boxes} element bounding boxes ({len(fields) // 2}D).")
+
+
+def drop_spatial_index(cursor: sqlite3.Cursor, table_name: str):
+    index = spatial_index_name(table_name)
+    for suffix in ("_ai", "_ad", "_au"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {_quote(index + suffix)}")
+    for view in ("_boxes", "_box_overlaps"):
+        cursor.execute(f"DROP VIEW IF EXISTS {_quote(table_name + view)}")
+    cursor.execute(f"DROP TABLE IF EXISTS {_quote(index)}")
+
+
+def refresh_spatial_index(conn: sqlite3.Connection, table_name: str) -> OpResult or None:
+    """Rebuilds the spatial index after table_name was replaced (its triggers were dropped with it)."""
+    mapping = read_box_columns(conn, table_name)
+    if mapping is None:
+        return None
+    index = spatial_index_name(table_name)
+    triggers = conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ? AND name LIKE ?",
+                            (table_name, f"{index}_a_")).fetchone()[0]
+    if triggers == 3:
+        return None
+    return build_spatial_index(conn, mapping, table_name)
+
+
+class SpatialIndex:
+    """Box queries over the element bounding boxes, answered by the R*Tree (see build_spatial_index).
+
+    Boxes are given as two corners, e.g. index.within((0, 0, 0), (10, 5, 3)). For a 2D index
+    the z coordinates are left out. Results are the matching rows of the element table with
+    their indexed box (columns min_x ... max_z).
+
+    Example:
+        room = spatial.boxes().query("`Name : String` == 'Room 101'").iloc[0]
+        spatial.within((room.min_x, room.min_y, room.min_z), (room.max_x, room.max_y, room.max_z))
+    """
+
+    def __init__(self, conn: sqlite3.Connection, table_name: str = "_df"):
+        self.conn = conn
+        self.table_name = table_name
+        self.index = spatial_index_name(table_name)
+
+    @property
+    def axes(self) -> str:
+        mapping = read_box_columns(self.conn, self.table_name)
+        if mapping is None:
+            raise ValueError(f"{self.table_name} has no spatial index yet. Build it on the Upload page.")
+        return "xyz" if "min_z" in mapping else "xy"
+
+    def _query(self, conditions: list, params: list) -> pd.DataFrame:
+        where = " AND ".join(conditions) or "1"
+        return pd.read_sql(f"SELECT * FROM {_quote(self.table_name + '_boxes')} WHERE {where}", self.conn, params=params)
+
+    def _check(self, *corners) -> str:
+        axes = self.axes
+        if any(len(corner) != len(axes) for corner in corners):
+            raise ValueError(f"Corners need {len(axes)} coordinates ({', '.join(axes)}).")
+        return axes
+
+    def boxes(self) -> pd.DataFrame:
+        """All indexed elements with their boxes."""
+        return self._query([], [])
+
+    def intersecting(self, low, high) -> pd.DataFrame:
+        """Elements whose box overlaps the box from low to high (touching counts)."""
+        axes = self._check(low, high)
+        conditions = [f"min_{axis} <= ? AND max_{axis} >= ?" for axis in axes]
+        return self._query(conditions, [value for i in range(len(axes)) for value in (high[i], low[i])])
+
+    def within(self, low, high) -> pd.DataFrame:
+        """Elements whose box lies completely inside the box from low to high."""
+        axes = self._check(low, high)
+        conditions = [f"min_{axis} >= ? AND max_{axis} <= ?" for axis in axes]
+        return self._query(conditions, [value for i in range(len(axes)) for value in (low[i], high[i])])
+
+    def containing(self, point) -> pd.DataFrame:
+        """Elements whose box contains the point."""
+        return self.intersecting(point, point)
+
+    def overlapping_pairs(self, where_a: str = None, where_b: str = None) -> pd.DataFrame:
+        """Pairs of elements with intersecting boxes (clash candidates), as element table rowids.
+
+        where_a and where_b are optional SQL conditions on the element table that select the two
+        sides, e.g. "Category : String" = 'Ducts' and "Category : String" = 'Structural Framing'.
+        Without conditions every unordered pair is returned once, otherwise every (A, B) pair in that order.
+        """
+        overlap = " AND ".join(f"b.min_{axis} <= a.max_{axis} AND b.max_{axis} >= a.min_{axis}" for axis in self.axes)
+        table = _quote(self.table_name)
+        index = _quote(self.index)
+        # CROSS JOIN fixes the join order: for each A element the R*Tree finds the overlapping boxes,
+        # so this is not a comparison of all pairs
+        sources = [f"{index} AS a", f"{index} AS b"]
+        conditions = [overlap, "b.id != a.id" if where_a or where_b else "b.id > a.id"]
+        if where_a:
+            sources.insert(0, f"(SELECT rowid AS id FROM {table} WHERE {where_a}) AS ta")
+            conditions.append("a.id = ta.id")
+        if where_b:
+            sources.append(f"{table} AS tb")
+            conditions += ["tb.rowid = b.id", f"({where_b})"]
+        query = f"SELECT a.id AS id_a, b.id AS id_b FROM {' CROSS JOIN '.join(sources)} WHERE {' AND '.join(conditions)}"
+        return pd.read_sql(query, self.conn)
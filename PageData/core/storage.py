@@ -0,0 +1,52 @@
+import os
+import sqlite3
+import tempfile
+from sqlite3 import Connection
+
+from PageData.core.results import OpResult
+from PageData.core.schema import bump_data_version, create_app_tables, get_data_version
+
+
+def export_database(conn: Connection, path: str) -> OpResult:
+    """Writes a copy of the database to a SQLite file, replacing the file if it exists."""
+    try:
+        target = sqlite3.connect(path)
+        with target:
+            conn.backup(target)
+        target.close()
+        return OpResult(value=path).success(f"Database written to {path}")
+    except Exception as e:
+        return OpResult().fail(f"Error writing database to {path}: {e}", e, path=path)
+
+
+def database_to_bytes(conn: Connection) -> OpResult:
+    """Returns the database as the bytes of a SQLite file."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        temp_filename = os.path.join(tmp_dir, "database.db")
+        result = export_database(conn, temp_filename)
+        if not result.ok:
+            return result
+        with open(temp_filename, "rb") as f:
+            return OpResult(value=f.read())
+
+
+def load_database(conn: Connection, path: str) -> OpResult:
+    """Replaces the contents of conn with a SQLite database file.
+
+    Application tables missing from older files are created, and the data version is bumped.
+    """
+    try:
+        previous_version = get_data_version(conn)
+        source = sqlite3.connect(path)
+        source.backup(conn)
+        source.close()
+        create_app_tables(conn)
+        # Caches are keyed by the data version, so the loaded data must not reuse the number of the replaced data
+        if get_data_version(conn) < previous_version:
+            conn.execute("INSERT OR REPLACE INTO app_meta (key, value) VALUES ('data_version', ?)", (str(previous_version),))
+        bump_data_version(conn)
+        return OpResult().success("Database uploaded successfully.")
+    except sqlite3.Error as e:
+        return OpResult().fail(f"Error uploading database: {e}", e, path=path)
+    except Exception as e:
+        return OpResult().fail(f"Failed to upload file. The file might not be a valid SQLite database or it might be corrupted. Error: {e}", e, path=path)
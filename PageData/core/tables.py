@@ -0,0 +1,320 @@
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from PageData.core.column_stats import changed_columns, profile_is_current, write_profile
+from PageData.core.cube import refresh_cube
+from PageData.core.results import OpResult
+from PageData.core.sampling import refresh_sample
+from PageData.core.schema import bump_data_version
+from PageData.core.search import refresh_search_index
+from PageData.core.spatial import refresh_spatial_index
+
+
+def row_hash_table_name(table_name: str) -> str:
+    """Returns the name of the table that stores per-row hashes of table_name for incremental updates."""
+    return f"{table_name}_row_hashes"
+
+
+def write_table(df: pd.DataFrame, conn: sqlite3.Connection, table_name: str = "_df") -> OpResult:
+    """Creates an SQL table from a Pandas DataFrame, attempting different methods.
+
+    Returns:
+        OpResult: value is the DataFrame as written (columns may have been renamed or skipped).
+    """
+    result = OpResult()
+    try:
+        # Row hashes of the previous contents are stale after a full replace
+        conn.execute(f"DROP TABLE IF EXISTS \"{row_hash_table_name(table_name)}\"")
+        conn.commit()
+
+        # 1. Attempt direct table creation using pandas to_sql
+        try:
+            df.to_sql(table_name, conn, if_exists='replace', index=False)
+            bump_data_version(conn)
+            result.value = df
+            result.success("SQL table created successfully using pandas to_sql!")
+            return _update_profile(result, conn, df, table_name)
+        except Exception as e:
+            cause = e.__cause__ or e
+            if isinstance(cause, sqlite3.OperationalError) and "full" in str(cause):
+                # The session's workspace quota (or the disk) is exhausted; the manual path would fail too
+                conn.rollback()
+                conn.execute(f"DROP TABLE IF EXISTS \"{table_name}\"")  # to_sql leaves the new table empty
+                conn.commit()
+                return result.fail(f"The table does not fit into the database: {cause}. "
+                                   f"Drop tables or views you no longer need and try again.", cause)
+            result.warning(f"Failed to create table using pandas to_sql: {e}. Attempting manual table creation.")
+
+        # 2. Manual table creation
+        cursor = conn.cursor()
+
+        # Create the base table structure
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS \"{table_name}\" (index_col INTEGER PRIMARY KEY)")
+        conn.commit()
+
+        # Add columns one by one with renaming on conflict
+        renamed_columns = {}  # Track renamed columns
+        skipped_columns = []
+        for original_col in df.columns:
+            col = original_col  # Added to keep value alive
+
+            try:
+                dtype = df[col].dtype
+                if pd.api.types.is_integer_dtype(dtype):
+                    sql_dtype = "TEXT"  # Changed to Text so that it does not throw the error
+                elif pd.api.types.is_float_dtype(dtype):
+                    sql_dtype = "REAL"
+                elif pd.api.types.is_datetime64_any_dtype(dtype):
+                    sql_dtype = "TEXT"  # Store datetimes as TEXT
+                else:
+                    sql_dtype = "TEXT"  # Default to TEXT for other types
+
+                add_column_sql = f"ALTER TABLE \"{table_name}\" ADD COLUMN \"{col}\" {sql_dtype}"
+                cursor.execute(add_column_sql)
+                conn.commit()
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" in str(e):
+                    # Attempt renaming the column
+                    new_col = f"{col}_renamed"
+                    try:
+                        add_column_sql = f"ALTER TABLE \"{table_name}\" ADD COLUMN \"{new_col}\" {sql_dtype}"
+                        cursor.execute(add_column_sql)
+                        conn.commit()
+                        # Track successful renaming
+                        renamed_columns[original_col] = new_col
+                        # Update the DataFrame with the new column name
+                        df.rename(columns={col: new_col}, inplace=True)
+                        col = new_col  # this now must be updated!
+                    except Exception as e2:
+                        result.warning(f"Failed to rename and add column '{col}': {e2}. Skipping column.")
+                        skipped_columns.append(col)
+                        conn.rollback()
+                        continue  # this must continue to the next one
+                else:
+                    conn.rollback()
+                    return result.fail(f"Error adding column '{col}': {e}", e, column=col)
+            except Exception as e:
+                conn.rollback()
+                return result.fail(f"Error adding column '{col}': {e}", e, column=col)  # Stop on other errors
+
+        # Inform about skipped or renamed columns
+        if skipped_columns:
+            result.warning(f"The following columns were skipped due to errors: {skipped_columns}")
+            for skipped_column in skipped_columns:  # Remove those columns
+                df.drop(columns=skipped_column, inplace=True)
+                # I will need to keep in mind the original file!
+        if renamed_columns:
+            result.info(f"The following columns were automatically renamed: {renamed_columns}")
+        # Check for data before proceeding
+        if df.empty:
+            return result.fail("DataFrame is empty after dropping rows and columns with missing values. Cannot create SQL table.")
+
+        # Populate the table with the data
+        for index, row in df.iterrows():
+            try:
+                # Convert large integers to strings
+                values = [str(index)] + [str(val) if isinstance(val, int) and abs(val) > 2**63 else val for val in row.tolist()]  # Changed to row.to_numpy() and index to now just use the data, as there is an index col and it is auto.
+                placeholders = ", ".join("?" for _ in values)  # One placeholder for each value
+                insert_sql = f"INSERT INTO \"{table_name}\" VALUES ({placeholders})"
+                cursor.execute(insert_sql, values)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                return result.fail(f"Error inserting: {e} for row {index}", e, row=index)
+        result.value = df #This way no matter what columns and data is accurate.
+        bump_data_version(conn)
+        result.success("SQL table created successfully!")
+        return _update_profile(result, conn, df, table_name)
+
+    except Exception as e:
+        conn.rollback()
+        return result.fail(f"Error creating SQL table: {e}", e)
+
+def _update_profile(result: OpResult, conn: sqlite3.Connection, df: pd.DataFrame, table_name: str,
+                    columns: list = None) -> OpResult:
+    """Refreshes the derived data of a written table: column statistics, takeoff cube, search and
+    spatial indexes and the sample for approximate queries.
+
+    A failure here never fails the write.
+    """
+    try:
+        write_profile(conn, df, table_name, columns)
+    except Exception as e:
+        conn.rollback()
+        result.warning(f"Column statistics could not be computed: {e}")
+    cube_result = refresh_cube(conn, df, table_name)
+    if cube_result is not None and not cube_result.ok:
+        result.warning(f"The takeoff cube could not be rebuilt: {cube_result.messages[-1][1]}")
+    search_result = refresh_search_index(conn, table_name)
+    if search_result is not None and not search_result.ok:
+        result.warning(f"The search index could not be rebuilt: {search_result.messages[-1][1]}")
+    spatial_result = refresh_spatial_index(conn, table_name)
+    if spatial_result is not None and not spatial_result.ok:
+        result.warning(f"The spatial index could not be rebuilt: {spatial_result.messages[-1][1]}")
+    sample_result = refresh_sample(conn, df, table_name)
+    if sample_result is not None and not sample_result.ok:
+        result.warning(f"The sample for approximate queries could not be drawn: {sample_result.messages[-1][1]}")
+    return result
+
+
+def _prepare_for_hashing(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalizes dtypes that change on a round trip through SQLite (datetimes are stored as TEXT).
+
+    Applied before hashing and before inserting, so hashes of stored rows match hashes of new rows.
+    """
+    df = df.copy(deep=False)
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col].dtype):
+            # Same text as pandas.to_sql writes: microseconds only when they are not zero
+            values = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+            values = values.where(df[col].dt.microsecond == 0, df[col].dt.strftime("%Y-%m-%d %H:%M:%S.%f"))
+            df[col] = values.astype(object).where(df[col].notna(), None)
+    return df
+
+
+def _sqlite_text(value):
+    """The text SQLite stores for value in a TEXT column."""
+    if isinstance(value, (bool, np.bool_)):
+        return str(int(value))  # sqlite3 binds bools as integers
+    if isinstance(value, (float, np.floating)):
+        return repr(float(value))
+    return str(value)
+
+
+def _hashable_values(df: pd.DataFrame) -> pd.DataFrame:
+    """Normalizes df to the values SQLite gives back, so hashes of new rows match hashes of stored rows.
+
+    Numbers (bools as 0/1) become float64: integer columns with NULLs come back as REAL. Everything
+    else becomes text, the way a TEXT column stores it, with None for missing values.
+    """
+    df = _prepare_for_hashing(df)
+    values = {}
+    for col in df.columns:
+        column = df[col]
+        if pd.api.types.is_bool_dtype(column.dtype) or pd.api.types.is_numeric_dtype(column.dtype):
+            values[col] = column.to_numpy(dtype="float64", na_value=np.nan)
+        elif pd.api.types.infer_dtype(column, skipna=True) in ("string", "empty"):
+            values[col] = column.astype(object).where(column.notna(), None).to_numpy()
+        else:
+            values[col] = column.map(_sqlite_text, na_action="ignore").astype(object).where(column.notna(), None).to_numpy()
+    return pd.DataFrame(values, columns=df.columns)
+
+
+def compute_row_hashes(df: pd.DataFrame, key_column: str) -> pd.Series:
+    """Hashes every row of df (all columns, vectorized) and indexes the hashes by the key column as text."""
+    hashes = pd.util.hash_pandas_object(_hashable_values(df), index=False).to_numpy().view("int64")
+    return pd.Series(hashes, index=df[key_column].astype(str).to_numpy())
+
+
+def _load_stored_row_hashes(conn: sqlite3.Connection, table_name: str, key_column: str, columns: list) -> pd.Series:
+    """Loads the row hashes saved by the last upsert, or hashes the stored table if there are none."""
+    hash_table = row_hash_table_name(table_name)
+    cursor = conn.cursor()
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name = ?", (hash_table,))
+    if cursor.fetchone():
+        stored = pd.read_sql(f"SELECT key, row_hash FROM \"{hash_table}\" WHERE key_column = ?", conn, params=(key_column,))
+        if not stored.empty:
+            return pd.Series(stored["row_hash"].to_numpy(), index=stored["key"].to_numpy())
+    # First incremental update after a full replace: hash the stored rows once
+    stored_df = pd.read_sql(f"SELECT * FROM \"{table_name}\"", conn)
+    return compute_row_hashes(stored_df[columns], key_column)
+
+
+def _to_sql_rows(df: pd.DataFrame) -> list:
+    """Converts a DataFrame into parameter tuples for executemany (NaN -> NULL, datetimes -> TEXT)."""
+    df = _prepare_for_hashing(df).astype(object)
+    df = df.where(df.notna(), None)
+    return list(df.itertuples(index=False, name=None))
+
+
+def upsert_table(df: pd.DataFrame, conn: sqlite3.Connection, key_column: str, table_name: str = "_df") -> OpResult:
+    """Applies only the inserted, updated and deleted rows of df to an existing SQL table.
+
+    Rows are matched on key_column (e.g. the Revit ElementId) and compared by a hash
+    of all their values. All changes are applied in a single transaction, so views
+    over the table stay valid and nothing is rewritten when a row did not change.
+
+    Args:
+        df: The new version of the data.
+        conn: The SQLite connection.
+        key_column: Column that identifies an element across exports.
+        table_name: Table to update.
+
+    Returns:
+        OpResult: value is a dict with the counts of "inserted", "updated", "deleted" and "unchanged" rows.
+    """
+    result = OpResult()
+    if key_column not in df.columns:
+        return result.fail(f"Key column '{key_column}' not found in the data.", key_column=key_column)
+    if df[key_column].isna().any() or df[key_column].astype(str).duplicated().any():
+        return result.fail(f"Key column '{key_column}' must be unique and not empty for an incremental update.",
+                           key_column=key_column)
+
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info(\"{table_name}\")")
+    stored_columns = [row[1] for row in cursor.fetchall()]
+    if sorted(stored_columns) != sorted(str(col) for col in df.columns):
+        result.warning("The columns differ from the stored table. Replacing the whole table instead.")
+        table_result = write_table(df, conn, table_name)
+        result.extend(table_result)
+        result.ok = table_result.ok
+        if table_result.ok:
+            result.value = {"inserted": len(df), "updated": 0, "deleted": 0, "unchanged": 0}
+        return result
+
+    try:
+        new_hashes = compute_row_hashes(df, key_column)
+        old_hashes = _load_stored_row_hashes(conn, table_name, key_column, df.columns.tolist())
+
+        inserted = ~new_hashes.index.isin(old_hashes.index)
+        common = new_hashes[~inserted]
+        updated_keys = common.index[common.to_numpy() != old_hashes.reindex(common.index).to_numpy()]
+        deleted_keys = old_hashes.index[~old_hashes.index.isin(new_hashes.index)]
+        changed_rows = inserted | new_hashes.index.isin(updated_keys)
+
+        hash_table = row_hash_table_name(table_name)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS \"{hash_table}\" (key_column TEXT, key TEXT, row_hash INTEGER, PRIMARY KEY (key_column, key))")
+        if old_hashes.size and not pd.read_sql(f"SELECT 1 FROM \"{hash_table}\" WHERE key_column = ? LIMIT 1", conn, params=(key_column,)).size:
+            cursor.execute(f"DELETE FROM \"{hash_table}\"")  # Hashes of another key column are of no use anymore
+            cursor.executemany(f"INSERT INTO \"{hash_table}\" VALUES (?, ?, ?)",
+                               [(key_column, key, int(h)) for key, h in old_hashes.items()])
+
+        # Remove deleted and updated rows in one scan, then append the new versions
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS _upsert_keys (key TEXT PRIMARY KEY)")
+        cursor.execute("DELETE FROM _upsert_keys")
+        cursor.executemany("INSERT INTO _upsert_keys VALUES (?)", [(key,) for key in deleted_keys.append(updated_keys)])
+        # Only updates keep the row count, so only then can the statistics of unchanged columns be kept
+        profile_columns = None
+        if profile_is_current(conn, table_name) and not inserted.any() and not len(deleted_keys):
+            old_rows = pd.read_sql(f"SELECT * FROM \"{table_name}\" "
+                                   f"WHERE CAST(\"{key_column}\" AS TEXT) IN (SELECT key FROM _upsert_keys)", conn)
+            new_rows = _prepare_for_hashing(df[changed_rows])
+            profile_columns = changed_columns(old_rows.set_index(old_rows[key_column].astype(str).to_numpy()),
+                                              new_rows.set_index(new_rows[key_column].astype(str).to_numpy()))
+        cursor.execute(f"DELETE FROM \"{table_name}\" WHERE CAST(\"{key_column}\" AS TEXT) IN (SELECT key FROM _upsert_keys)")
+        cursor.execute(f"DELETE FROM \"{hash_table}\" WHERE key_column = ? AND key IN (SELECT key FROM _upsert_keys)", (key_column,))
+
+        changed_df = df[changed_rows]
+        columns = ", ".join(f"\"{col}\"" for col in changed_df.columns)
+        placeholders = ", ".join("?" for _ in changed_df.columns)
+        cursor.executemany(f"INSERT INTO \"{table_name}\" ({columns}) VALUES ({placeholders})", _to_sql_rows(changed_df))
+        cursor.executemany(f"INSERT INTO \"{hash_table}\" VALUES (?, ?, ?)",
+                           [(key_column, key, int(h)) for key, h in new_hashes[changed_rows].items()])
+        cursor.execute("DROP TABLE temp._upsert_keys")
+        conn.commit()
+        if changed_rows.any() or len(deleted_keys):
+            bump_data_version(conn)
+            _update_profile(result, conn, df, table_name, profile_columns)
+    except Exception as e:
+        conn.rollback()
+        return result.fail(f"Error applying incremental update: {e}", e)
+
+    result.value = {
+        "inserted": int(inserted.sum()),
+        "updated": len(updated_keys),
+        "deleted": len(deleted_keys),
+        "unchanged": len(df) - int(changed_rows.sum()),
+    }
+    return result.success("SQL table updated incrementally!")
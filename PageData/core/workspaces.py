@@ -0,0 +1,279 @@
+import gzip
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+from PageData.core.schema import create_app_tables
+
+DEFAULT_SESSION_QUOTA_BYTES = 512 * 1024 * 1024
+DEFAULT_TOTAL_BUDGET_BYTES = 2 * 1024 * 1024 * 1024
+DEFAULT_IDLE_TIMEOUT = 15 * 60
+DEFAULT_SNAPSHOT_TTL = 7 * 24 * 60 * 60
+# The memory budget never spills a workspace used this recently, so a session between two reruns
+# keeps its data in memory; a workspace in use (see WorkspaceManager.in_use) is never spilled
+BUDGET_GRACE_SECONDS = 60
+
+
+def _safe_id(workspace_id: str) -> str:
+    return re.sub(r"[^\w\-]", "_", workspace_id)
+
+
+class WorkspaceConnection(sqlite3.Connection):
+    """A connection that remembers the URI it was opened with (see schema.database_uri)."""
+    uri = None
+
+
+class Workspace:
+    def __init__(self, workspace_id: str, uri: str, snapshot_path: str):
+        self.id = workspace_id
+        self.uri = uri
+        self.snapshot_path = snapshot_path
+        self.keeper = None  # keeps the shared-cache memory database alive between reruns
+        self.connections = weakref.WeakSet()
+        self.last_seen = time.monotonic()
+        self.active = 0  # reruns in progress (see WorkspaceManager.in_use)
+
+    @property
+    def live(self) -> bool:
+        return self.keeper is not None
+
+    def size_bytes(self) -> int:
+        if not self.live:
+            return 0
+        page_count = self.keeper.execute("PRAGMA page_count").fetchone()[0]
+        page_size = self.keeper.execute("PRAGMA page_size").fetchone()[0]
+        return page_count * page_size
+
+
+class WorkspaceManager:
+    """Gives every session its own in-memory database and keeps their total memory bounded.
+
+    Each workspace is a named shared-cache memory database with a page limit (session_quota_bytes),
+    so SQLite itself refuses writes beyond the quota with "database or disk is full".
+    Cached copies of a workspace's data (see add_cache) count towards its memory.
+    Workspaces idle for longer than idle_timeout seconds, or the least recently used ones while
+    the live total exceeds total_budget_bytes (and were idle for BUDGET_GRACE_SECONDS), are written to gzip-compressed snapshots in
+    snapshot_dir and dropped from memory. connect() restores a spilled workspace transparently.
+    A workspace is never spilled while it is in use (see in_use), however long the rerun takes.
+    """
+
+    def __init__(self, snapshot_dir: str = None, session_quota_bytes: int = DEFAULT_SESSION_QUOTA_BYTES,
+                 total_budget_bytes: int = DEFAULT_TOTAL_BUDGET_BYTES, idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+                 snapshot_ttl: float = DEFAULT_SNAPSHOT_TTL, sweep_interval: float = 60.0):
+        self.snapshot_dir = snapshot_dir or os.path.join(tempfile.gettempdir(), "ddcai_workspaces")
+        self.session_quota_bytes = session_quota_bytes
+        self.total_budget_bytes = total_budget_bytes
+        self.idle_timeout = idle_timeout
+        self.snapshot_ttl = snapshot_ttl
+        self.sweep_interval = sweep_interval
+        # Called with the workspace URI before it is spilled, e.g. to flush queued writes into it
+        self.before_spill = []
+        # In-memory copies of workspace data (see add_cache)
+        self.caches = []
+        self._workspaces = {}
+        self._lock = threading.RLock()
+        self._sweeper = None
+
+    def _workspace(self, workspace_id: str) -> Workspace:
+        workspace = self._workspaces.get(workspace_id)
+        if workspace is None:
+            safe_id = _safe_id(workspace_id)
+            workspace = Workspace(workspace_id, f"file:ws_{safe_id}?mode=memory&cache=shared",
+                                  os.path.join(self.snapshot_dir, f"{safe_id}.db.gz"))
+            self._workspaces[workspace_id] = workspace
+        return workspace
+
+    def connect(self, workspace_id: str) -> WorkspaceConnection:
+        """Returns a new connection to the workspace, creating or restoring it first if needed."""
+        self._ensure_sweeper()
+        with self._lock:
+            workspace = self._workspace(workspace_id)
+            workspace.last_seen = time.monotonic()
+            if not workspace.live:
+                workspace.keeper = self._open(workspace.uri)
+                self._restore(workspace)
+                create_app_tables(workspace.keeper)
+            conn = self._open(workspace.uri)
+            workspace.connections.add(conn)
+            self._enforce_budget(keep=workspace)
+            return conn
+
+    @contextmanager
+    def in_use(self, workspace_id: str):
+        """Keeps the workspace from being spilled while the block runs, e.g. a rerun of its session.
+
+        Its connections stay open however long the block takes; the idle time counts from its end.
+        """
+        with self._lock:
+            workspace = self._workspace(workspace_id)
+            workspace.active += 1
+            workspace.last_seen = time.monotonic()
+        try:
+            yield
+        finally:
+            with self._lock:
+                workspace.active -= 1
+                workspace.last_seen = time.monotonic()
+
+    def add_cache(self, cache):
+        """Registers a process-wide cache that holds copies of workspace data, keyed by database URI.
+
+        The cache must offer nbytes(uri) and evict(uri). Its bytes count towards the workspace's
+        quota and the total budget, and are evicted when the workspace is spilled. The cache gets a
+        budget(uri) function: how many bytes it may hold for that database, None outside workspaces.
+        """
+        cache.budget = lambda uri: self.cache_budget(uri, cache)
+        self.caches.append(cache)
+
+    def cache_budget(self, uri: str, cache) -> int or None:
+        """The part of the workspace's quota that neither its database nor the other caches use."""
+        with self._lock:
+            workspace = next((workspace for workspace in self._workspaces.values() if workspace.uri == uri), None)
+            if workspace is None or not workspace.live:
+                return None
+            others = sum(other.nbytes(uri) for other in self.caches if other is not cache)
+            return max(self.session_quota_bytes - workspace.size_bytes() - others, 0)
+
+    def usage(self, workspace_id: str) -> dict:
+        """Returns the workspace's size, the size of its cached copies, its quota and whether it is in memory."""
+        with self._lock:
+            workspace = self._workspaces.get(workspace_id)
+            return {
+                "bytes": workspace.size_bytes() if workspace else 0,
+                "cache_bytes": self._cache_bytes(workspace) if workspace else 0,
+                "quota_bytes": self.session_quota_bytes,
+                "live": bool(workspace and workspace.live),
+            }
+
+    def snapshot_store_path(self, workspace_id: str) -> str:
+        """Returns the file holding the workspace's named snapshots (see core.snapshots), on disk next to the spills."""
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        return os.path.join(self.snapshot_dir, f"{_safe_id(workspace_id)}.snapshots.db")
+
+    def chat_store_path(self, workspace_id: str) -> str:
+        """Returns the file holding the workspace's chat turns (see DB.chat_history), on disk next to the spills.
+
+        It is written from the first turn on, so the conversation also outlives a server restart.
+        """
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        return os.path.join(self.snapshot_dir, f"{_safe_id(workspace_id)}.chat.db")
+
+    def _files(self, workspace: Workspace) -> tuple:
+        return workspace.snapshot_path, self.snapshot_store_path(workspace.id), self.chat_store_path(workspace.id)
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return sum(self._memory_bytes(workspace) for workspace in self._workspaces.values())
+
+    def _cache_bytes(self, workspace: Workspace) -> int:
+        return sum(cache.nbytes(workspace.uri) for cache in self.caches) if workspace.live else 0
+
+    def _memory_bytes(self, workspace: Workspace) -> int:
+        return workspace.size_bytes() + self._cache_bytes(workspace)
+
+    def sweep(self):
+        """Spills idle workspaces and forgets the ones whose snapshot nobody came back for."""
+        now = time.monotonic()
+        with self._lock:
+            for workspace_id, workspace in list(self._workspaces.items()):
+                idle = now - workspace.last_seen
+                if workspace.active:
+                    continue
+                if workspace.live and idle > self.idle_timeout:
+                    self._spill(workspace)
+                elif not workspace.live and idle > self.snapshot_ttl:
+                    for path in self._files(workspace):
+                        if os.path.exists(path):
+                            os.remove(path)
+                    del self._workspaces[workspace_id]
+            self._enforce_budget()
+            self._remove_orphaned_snapshots()
+
+    def _open(self, uri: str) -> WorkspaceConnection:
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=WorkspaceConnection)
+        conn.uri = uri
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        conn.execute(f"PRAGMA max_page_count = {max(self.session_quota_bytes // page_size, 1)}")
+        return conn
+
+    def _restore(self, workspace: Workspace):
+        if not os.path.exists(workspace.snapshot_path):
+            return
+        restore_path = workspace.snapshot_path[:-len(".gz")]
+        with gzip.open(workspace.snapshot_path, "rb") as source, open(restore_path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        snapshot = sqlite3.connect(restore_path)
+        snapshot.backup(workspace.keeper)
+        snapshot.close()
+        os.remove(restore_path)
+        os.remove(workspace.snapshot_path)
+
+    def _spill(self, workspace: Workspace):
+        for hook in self.before_spill:
+            hook(workspace.uri)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        spill_path = workspace.snapshot_path[:-len(".gz")]
+        target = sqlite3.connect(spill_path)
+        workspace.keeper.backup(target)
+        target.close()
+        with open(spill_path, "rb") as source, gzip.open(workspace.snapshot_path, "wb", compresslevel=3) as target:
+            shutil.copyfileobj(source, target)
+        os.remove(spill_path)
+        # The memory database is freed once its last connection closes
+        for conn in list(workspace.connections):
+            conn.close()
+        workspace.keeper.close()
+        workspace.keeper = None
+        for cache in self.caches:
+            cache.evict(workspace.uri)
+
+    def _enforce_budget(self, keep: Workspace = None):
+        live = [workspace for workspace in self._workspaces.values() if workspace.live]
+        total = sum(self._memory_bytes(workspace) for workspace in live)
+        now = time.monotonic()
+        candidates = sorted(
+            (workspace for workspace in live
+             if workspace is not keep and not workspace.active and now - workspace.last_seen > BUDGET_GRACE_SECONDS),
+            key=lambda workspace: workspace.last_seen,
+        )
+        while total > self.total_budget_bytes and candidates:
+            workspace = candidates.pop(0)
+            total -= self._memory_bytes(workspace)
+            self._spill(workspace)
+
+    def _remove_orphaned_snapshots(self):
+        """Deletes expired snapshots left behind by earlier server processes."""
+        if not os.path.isdir(self.snapshot_dir):
+            return
+        known = {path for workspace in self._workspaces.values() for path in self._files(workspace)}
+        for name in os.listdir(self.snapshot_dir):
+            path = os.path.join(self.snapshot_dir, name)
+            if path not in known and time.time() - os.path.getmtime(path) > self.snapshot_ttl:
+                os.remove(path)
+
+    def _ensure_sweeper(self):
+        with self._lock:
+            if self._sweeper is None:
+                self._sweeper = threading.Thread(target=self._run_sweeper, name="workspace-sweeper", daemon=True)
+                self._sweeper.start()
+
+    def _run_sweeper(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except (OSError, sqlite3.Error):
+                pass  # try again on the next sweep
+
+
+_manager = WorkspaceManager()
+
+
+def get_workspace_manager() -> WorkspaceManager:
+    return _manager
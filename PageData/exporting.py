@@ -0,0 +1,49 @@
+import re
+
+import streamlit as st
+from multipage_streamlit import State
+
+from PageData.core.export import EXPORT_FORMATS, export_query
+from PageData.utils import report_result
+
+
+def export_controls(conn, query: str, key: str, file_stem: str = "export"):
+    """Exports the result of a query in chunks, with a progress bar, and offers the file for download.
+
+    The file is kept in a spooled temporary file (on disk once it is large) until the next export,
+    and only read when the download button is clicked.
+    """
+    state = State(__name__)
+    file_key = state(f"{key}_file")
+    col1, col2 = st.columns([1, 3], vertical_alignment="bottom")
+    extension = col1.selectbox("Export format", list(EXPORT_FORMATS), key=state(f"{key}_format"))
+    if col2.button("Export", key=state(f"{key}_export")):
+        previous = st.session_state.pop(file_key, None)
+        if previous:
+            previous["file"].close()
+        bar = st.progress(0.0, text="Exporting...")
+
+        def progress(rows_written: int, total_rows: int or None):
+            if total_rows:
+                bar.progress(min(rows_written / total_rows, 1.0), text=f"Exported {rows_written:,} of {total_rows:,} rows")
+            else:
+                bar.progress(0.0, text=f"Exported {rows_written:,} rows")
+
+        result = export_query(conn, query, extension, progress=progress)
+        bar.empty()
+        report_result(result)
+        if result.ok:
+            file_name = re.sub(r"[^\w\-]+", "_", file_stem) + extension
+            st.session_state[file_key] = {"file": result.value, "file_name": file_name, "query": query,
+                                          "mime": EXPORT_FORMATS[extension]}
+
+    exported = st.session_state.get(file_key)
+    if exported and exported["query"] == query:
+        file = exported["file"]
+
+        def read() -> bytes:
+            file.seek(0)
+            return file.read()
+
+        st.download_button(f"Download {exported['file_name']}", read, file_name=exported["file_name"],
+                           mime=exported["mime"], on_click="ignore", key=state(f"{key}_download"))
@@ -0,0 +1,75 @@
+import functools
+import sqlite3
+from contextvars import ContextVar
+
+import streamlit as st
+
+from PageData.DB.database import initialize_database, workspace_in_use
+from PageData.core.results import OpResult
+from PageData.profiler import finish_run, is_recording, profile_span, start_run
+from PageData.utils import report_result
+
+_MESSAGES_KEY = "panel_messages"
+_current_panel = ContextVar("current_panel", default=None)
+
+
+def _closed(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.in_transaction
+        return False
+    except sqlite3.ProgrammingError:
+        return True
+
+
+def _reopened(value):
+    """A new connection to the session database in place of a closed one, else value."""
+    return initialize_database() if isinstance(value, sqlite3.Connection) and _closed(value) else value
+
+
+def panel(func):
+    """Runs a page section as a Streamlit fragment, so its widgets rerun only that section.
+
+    A panel gets the data it depends on as arguments and reads everything else itself, so it
+    renders the same whether the page or only the panel reruns. Panels nested in another panel
+    rerun with it: sections that show what a panel writes are nested in that panel. A panel that
+    changes data of sections outside it calls rerun_page.
+
+    A panel rerun gets the arguments of the run that drew it. Connections among them (or in
+    self.conn of a method) are reopened if they were closed since, e.g. because the session's
+    workspace was spilled to disk. The workspace is kept in memory while the panel runs.
+
+    Reruns of a single panel are profiled on their own when the profiler is on.
+    """
+    @st.fragment
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        name = func.__qualname__
+        args = [_reopened(arg) for arg in args]
+        kwargs = {key: _reopened(value) for key, value in kwargs.items()}
+        if args and isinstance(getattr(args[0], "conn", None), sqlite3.Connection):
+            args[0].conn = _reopened(args[0].conn)
+        result = st.session_state.get(_MESSAGES_KEY, {}).pop(name, None)
+        if result is not None:
+            report_result(result)
+        # A panel rerun does not pass through app.main, which records full reruns
+        token = start_run(name) if st.session_state.get("profiler_enabled") and not is_recording() else None
+        panel_token = _current_panel.set(name)
+        try:
+            with workspace_in_use(), profile_span(name, "panel"):
+                return func(*args, **kwargs)
+        finally:
+            _current_panel.reset(panel_token)
+            if token is not None:
+                st.session_state["profiler_last_run"] = finish_run(token)
+
+    return wrapper
+
+
+def rerun_page(result: OpResult = None):
+    """Reruns the whole page after the running panel changed data that other sections show.
+
+    The messages of result are shown at the top of the panel after the rerun.
+    """
+    if result is not None and _current_panel.get() is not None:
+        st.session_state.setdefault(_MESSAGES_KEY, {})[_current_panel.get()] = result
+    st.rerun()
@@ -0,0 +1,126 @@
+import streamlit as st
+
+from PageData.core.figures import DEFAULT_POINT_BUDGET, FigureCache, downsample_figure, payload_bytes, render_figure
+from PageData.core.query import execute_python_code
+
+# Shared by all sessions; keys include the session's database, so a session never replays another one's output.
+# Entries are sized with the frames they hold, so the cache stays within max_bytes
+_figure_cache = FigureCache()
+
+
+def get_figure_cache() -> FigureCache:
+    return _figure_cache
+
+
+def show_figure(fig=None, point_budget: int = DEFAULT_POINT_BUDGET) -> bytes:
+    """Downsamples and renders a matplotlib figure (default: the current one) and shows it as an image.
+
+    Returns:
+        bytes: The rendered PNG, for caching.
+    """
+    import matplotlib.pyplot as plt
+
+    if fig is None or fig is plt:
+        fig = plt.gcf()
+    downsample_figure(fig, point_budget)
+    image = render_figure(fig)
+    plt.close(fig)
+    st.image(image)
+    return image
+
+
+def show_cached_figure(cache_key: str, draw, point_budget: int = DEFAULT_POINT_BUDGET) -> bool:
+    """Shows the figure drawn by draw(), rendering it only if cache_key is not cached yet.
+
+    Args:
+        cache_key: See figure_cache_key.
+        draw: Callable that draws onto the current matplotlib figure.
+
+    Returns:
+        bool: True if the image came from the cache.
+    """
+    cached = _figure_cache.get(cache_key)
+    if cached is not None:
+        replay(cached[0])
+        return True
+    import matplotlib.pyplot as plt
+
+    open_figures = set(plt.get_fignums())
+    plt.figure()
+    draw()
+    image = show_figure(plt.gcf(), point_budget)
+    # pandas' plot() opens a figure of its own, leaving the empty one behind
+    for number in set(plt.get_fignums()) - open_figures:
+        plt.close(number)
+    _figure_cache.put(cache_key, ([("image", (image,), {})], None), len(image))
+    return False
+
+
+class RecordingStreamlit:
+    """Stands in for the st module inside Python snippets and records what they display.
+
+    st.pyplot is replaced by show_figure, so figures are downsampled and kept as PNG bytes.
+    Display calls are recorded so a cache hit can replay them without running the snippet.
+    Anything else (widgets, session_state, sidebar, ...) marks the run as not cacheable,
+    because replaying it would not give the snippet the values it depends on.
+
+    nbytes counts the images and the data the recorded calls hold on to (e.g. the frame passed
+    to st.dataframe), which a cache entry keeps alive.
+    """
+
+    REPLAYABLE = {
+        "write", "text", "markdown", "caption", "code", "latex", "json", "header", "subheader", "title",
+        "dataframe", "table", "metric", "image", "line_chart", "bar_chart", "area_chart", "scatter_chart",
+        "info", "success", "warning", "error", "divider",
+    }
+
+    def __init__(self, point_budget: int = DEFAULT_POINT_BUDGET):
+        self.point_budget = point_budget
+        self.calls = []
+        self.nbytes = 0
+        self.cacheable = True
+
+    def pyplot(self, fig=None, *args, **kwargs):
+        image = show_figure(fig, self.point_budget)
+        self.calls.append(("image", (image,), {}))
+        self.nbytes += len(image)
+
+    def __getattr__(self, name):
+        target = getattr(st, name)
+        if name not in self.REPLAYABLE:
+            self.cacheable = False
+            return target
+
+        def record(*args, **kwargs):
+            self.calls.append((name, args, kwargs))
+            self.nbytes += payload_bytes(args) + payload_bytes(kwargs)
+            return target(*args, **kwargs)
+        return record
+
+
+def replay(calls: list):
+    for name, args, kwargs in calls:
+        getattr(st, name)(*args, **kwargs)
+
+
+def execute_python_cached(code: str, local_vars: dict, cache_key: str,
+                          point_budget: int = DEFAULT_POINT_BUDGET) -> tuple:
+    """Executes a Python snippet like execute_python_code, reusing its rendered output when cached.
+
+    On a cache hit the snippet is not run: its recorded display calls and figures are replayed.
+
+    Returns:
+        tuple: (output, error, cached)
+    """
+    cached = _figure_cache.get(cache_key)
+    if cached is not None:
+        calls, output = cached
+        replay(calls)
+        return output, None, True
+
+    recorder = RecordingStreamlit(point_budget)
+    output, error = execute_python_code(code, {**local_vars, "st": recorder})
+    # A snippet importing streamlit itself displays through the real module, which the recorder can't see
+    if error is None and recorder.cacheable and "streamlit" not in code:
+        _figure_cache.put(cache_key, (recorder.calls, output), recorder.nbytes + len(output or ""))
+    return output, error, False
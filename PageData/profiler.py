@@ -0,0 +1,119 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import pandas as pd
+
+_current_run = ContextVar("profiler_run", default=None)
+_current_depth = ContextVar("profiler_depth", default=0)
+
+
+class ProfileRun:
+    """Timed spans recorded during one Streamlit rerun."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, category: str, start: float, end: float, depth: int, args: dict):
+        span = {
+            "name": name,
+            "category": category,
+            "start_ms": (start - self._start) * 1000,
+            "duration_ms": (end - start) * 1000,
+            "depth": depth,
+            "thread": threading.get_ident(),
+            "args": args,
+        }
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """Returns one row per span, ordered by start time, with args flattened into columns."""
+        rows = [
+            {"name": "  " * span["depth"] + span["name"], "category": span["category"], "depth": span["depth"],
+             "start_ms": span["start_ms"], "duration_ms": span["duration_ms"], **span["args"]}
+            for span in sorted(self.spans, key=lambda span: span["start_ms"])
+        ]
+        return pd.DataFrame(rows)
+
+    def to_json(self) -> str:
+        return json.dumps({"name": self.name, "started_at": self.started_at, "spans": self.spans}, default=str, indent=2)
+
+    def to_chrome_trace(self) -> str:
+        """Exports the spans in Chrome trace event format (chrome://tracing, Perfetto)."""
+        events = [
+            {
+                "name": span["name"],
+                "cat": span["category"],
+                "ph": "X",
+                "ts": (self.started_at * 1000 + span["start_ms"]) * 1000,
+                "dur": span["duration_ms"] * 1000,
+                "pid": 1,
+                "tid": span["thread"],
+                "args": span["args"],
+            }
+            for span in self.spans
+        ]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, default=str)
+
+
+def start_run(name: str):
+    """Starts recording spans for the current rerun. Returns a token for finish_run."""
+    return _current_run.set(ProfileRun(name))
+
+
+def is_recording() -> bool:
+    return _current_run.get() is not None
+
+
+def finish_run(token) -> ProfileRun:
+    """Stops recording and returns the finished run."""
+    run = _current_run.get()
+    run.duration_ms = (time.perf_counter() - run._start) * 1000
+    _current_run.reset(token)
+    return run
+
+
+@contextmanager
+def profile_span(name: str, category: str = "function", **args):
+    """Times the enclosed block when a run is being recorded.
+
+    Yields a dict of span arguments; add entries to it (e.g. a row count) inside the block.
+    Outside a recorded run this only yields the dict, so instrumented code stays cheap.
+    """
+    run = _current_run.get()
+    if run is None:
+        yield args
+        return
+    depth = _current_depth.get()
+    depth_token = _current_depth.set(depth + 1)
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter()
+        _current_depth.reset(depth_token)
+        run.add_span(name, category, start, end, depth, args)
+
+
+def profiler_panel(run: ProfileRun):
+    """Displays the spans of a finished run in the sidebar with JSON and Chrome trace exports."""
+    import streamlit as st  # Only the panel needs Streamlit; recording also runs headless
+    with st.sidebar.expander("Profiler", expanded=True):
+        if run is None or not run.spans:
+            st.info("Nothing recorded yet.")
+            return
+        spans = run.to_dataframe()
+        st.metric("Rerun time", f"{run.duration_ms:.0f} ms")
+        st.dataframe(spans.groupby("category")["duration_ms"].agg(["count", "sum", "max"]).round(1))
+        st.dataframe(spans.round({"start_ms": 1, "duration_ms": 1}), hide_index=True)
+        col1, col2 = st.columns(2)
+        col1.download_button("JSON", run.to_json(), file_name="profile.json", mime="application/json")
+        col2.download_button("Chrome trace", run.to_chrome_trace(), file_name="profile.trace.json", mime="application/json")
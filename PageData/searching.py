@@ -0,0 +1,63 @@
+import streamlit as st
+from multipage_streamlit import State
+
+from PageData.core.search import DEFAULT_PAGE_SIZE, build_search_index, read_search_columns, search_elements, \
+    search_snippets
+from PageData.fragments import panel
+from PageData.utils import report_result
+
+
+def paginated_search(search, key: str, label: str, placeholder: str = None):
+    """Search box with ranked results shown one page at a time.
+
+    Args:
+        search: Callable(text, page, page_size) returning an OpResult like core.search.search.
+        key: Prefix of the widget keys.
+    """
+    state = State(__name__)
+    text = st.text_input(label, placeholder=placeholder, key=state(f"{key}_text"))
+    if not text:
+        return
+    col1, col2 = st.columns(2)
+    page_size = col2.selectbox("Results per page", [10, DEFAULT_PAGE_SIZE, 100], index=1, key=state(f"{key}_page_size"))
+    page = col1.number_input("Page", min_value=1, value=1, step=1, key=state(f"{key}_page"))
+    result = search(text, page, page_size)
+    if not result.ok:
+        report_result(result)
+        return
+    total = result.value["total"]
+    pages = max((total + page_size - 1) // page_size, 1)
+    st.caption(f"{total} matches, page {min(page, pages)} of {pages}")
+    if total:
+        st.dataframe(result.value["rows"], hide_index=True)
+
+
+@panel
+def element_search_section(conn):
+    """Full-text search over the indexed text columns of _df, with the choice of columns to index."""
+    types = {row[1]: (row[2] or "").upper() for row in conn.execute("PRAGMA table_info(_df)")}
+    if not types:
+        return
+    state = State(__name__)
+    st.subheader("Search elements")
+    columns = read_search_columns(conn)
+    with st.expander("Indexed columns", expanded=columns is None):
+        selected = st.multiselect("Text columns to index", [col for col, sql_type in types.items() if sql_type == "TEXT"],
+                                  default=[col for col in columns or [] if col in types], key=state("search_columns"))
+        if st.button("Build search index", key=state("search_build")):
+            with st.spinner("Indexing..."):
+                report_result(build_search_index(conn, selected))
+            columns = read_search_columns(conn)
+    if columns is None:
+        st.info("Pick the text columns to search (e.g. family, type, mark, comments) and build the index.")
+        return
+    paginated_search(lambda text, page, page_size: search_elements(conn, text, page, page_size),
+                     "elements", "Search", placeholder="e.g. basic wall 200")
+
+
+@panel
+def snippet_search_section(conn):
+    """Full-text search over the name, category and code of the saved snippets."""
+    st.subheader("Search snippets")
+    paginated_search(lambda text, page, page_size: search_snippets(conn, text, page, page_size),
+                     "snippets", "Search saved scripts", placeholder="e.g. volume level")
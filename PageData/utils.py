@@ -1,10 +1,11 @@
 import re
-import matplotlib.pyplot as plt #Added import
 import pandas as pd
 import streamlit as st
-import seaborn as sns
-from io import StringIO
-import sys
+
+from PageData.core.dataset import LazyDataset, columns_used
+from PageData.core.results import OpResult
+from PageData.core.spatial import SpatialIndex
+
 def sanitize_column_name(name: str) -> str:
     """Sanitizes a column name for use in SQLite."""
     name = re.sub(r"[^a-zA-Z0-9_ ]", "", name)
@@ -13,26 +14,35 @@ def sanitize_column_name(name: str) -> str:
     return name
 
 
-def execute_python_code(code, local_vars=None):
-    """Executes Python code and captures output/errors."""
-    old_stdout = sys.stdout
-    sys.stdout = captured_output = StringIO()
-    try:
-        exec(code, globals(), local_vars or {})
-        return captured_output.getvalue(), None
-    except Exception as e:
-        return None, str(e)
-    finally:
-        sys.stdout = old_stdout
+def report_result(result: OpResult):
+    """Shows the messages of a core operation result with the matching Streamlit element."""
+    for level, text, details in result.messages:
+        getattr(st, level)(text)
+        if details is not None:
+            st.write(details)
+
 
+def get_common_vars(code: str = None):
+    """Returns commonly used variables for code execution.
 
-def get_common_vars():
-    """Returns commonly used variables for code execution."""
+    Once the data is in the database, "df" holds only the columns of _df that code reads
+    (see core.dataset.columns_used), and "data" reads _df on demand (e.g. data.query(...) filters in SQLite).
+    """
+    # Plotting libraries are slow to import, so load them on the first snippet run instead of at startup
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from PageData.DB.database import initialize_database
+    df = st.session_state.get("excel_df")
+    data = df if isinstance(df, LazyDataset) else LazyDataset(initialize_database)
+    if isinstance(df, LazyDataset):
+        df = df.select(columns_used(code, df.columns) if code is not None else None)
     return {
         "st": st,
         "pd": pd,
-        "df": st.session_state.get("excel_df"),
+        "df": df,
+        "data": data,
         "plt": plt,
-        "sns":sns
+        "sns":sns,
+        "spatial": SpatialIndex(initialize_database()),  # box queries over _df, see core.spatial
     }
 
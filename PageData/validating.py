@@ -0,0 +1,64 @@
+import streamlit as st
+from multipage_streamlit import State
+
+from PageData.DB.database import get_data_version
+from PageData.core.validation import SEVERITIES, check_rules, delete_rule, load_rules, save_rule, violation_frame
+from PageData.fragments import panel
+from PageData.utils import report_result
+
+
+@panel
+def validation_section(conn):
+    """Model checks: the validation rules over _df, all checked together in one pass."""
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = '_df'").fetchone():
+        return
+    state = State(__name__)
+    st.subheader("Validation rules")
+    rules = load_rules(conn)
+
+    with st.expander("Rules", expanded=rules.empty):
+        if not rules.empty:
+            st.dataframe(rules.drop(columns=["id"]), hide_index=True)
+        col1, col2, col3 = st.columns([2, 1, 1])
+        name = col1.text_input("Name", placeholder="Walls without fire rating", key=state("rule_name"))
+        category = col2.text_input("Category", placeholder="QA", key=state("rule_category"))
+        severity = col3.selectbox("Severity", SEVERITIES, key=state("rule_severity"))
+        condition = st.text_input(
+            "Condition", key=state("rule_condition"),
+            placeholder="`Category : String` == 'Walls' and `Fire Rating : String`.isna()",
+            help="A DataFrame.query expression that selects the elements violating the rule. "
+                 "Column names with spaces go in backticks. Saving a rule with an existing name replaces it.",
+        )
+        if st.button("Save rule", key=state("rule_save")):
+            report_result(save_rule(conn, name, condition, category, severity))
+            rules = load_rules(conn)
+        if not rules.empty:
+            col1, col2 = st.columns([3, 1], vertical_alignment="bottom")
+            doomed = col1.selectbox("Rule", rules["name"], key=state("rule_delete_name"))
+            if col2.button("Delete rule", key=state("rule_delete")):
+                report_result(delete_rule(conn, doomed))
+                rules = load_rules(conn)
+
+    if rules.empty:
+        st.info("Add rules (e.g. doors without a mark, elements with a volume of 0) to check the model for them.")
+        return
+    categories = sorted(rules["category"].dropna().unique())
+    selected = st.multiselect("Categories to check (default: all)", categories, key=state("check_categories"))
+    if st.button("Run checks", key=state("check_run")):
+        with st.spinner("Checking..."):
+            result = check_rules(conn, rules[rules["category"].isin(selected)] if selected else rules)
+        st.session_state[state("check")] = (get_data_version(conn), result.value)
+        report_result(result)
+
+    version, check = st.session_state.get(state("check"), (None, None))
+    if check is None:
+        return
+    if version != get_data_version(conn):
+        st.warning("The data changed since the last check. Run the checks again.")
+        return
+    st.dataframe(check["rules"].drop(columns=["id"]), hide_index=True)
+    failed = check["rules"]["name"][check["rules"]["violations"] > 0].tolist()
+    if failed:
+        rule = st.selectbox("Violating elements of", [None] + failed, key=state("check_rule"),
+                            format_func=lambda rule: "(any rule)" if rule is None else rule)
+        st.dataframe(violation_frame(conn, check, rule), hide_index=True)
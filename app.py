@@ -1,13 +1,12 @@
 import streamlit as st
 
-from PageData.AiChat import chat_page
-from PageData.CodeExecution.code_execution_page import CodeExecutionTab
-from PageData.DB.database import initialize_database
+from PageData.DB.database import initialize_database, workspace_in_use
+from PageData.profiler import finish_run, profile_span, profiler_panel, start_run
 import multipage_streamlit as mt
 
-from PageData.DataAnalysis.data_analysis_page import data_analysis_tab
-from PageData.Upload.data_upload_page import data_upload_tab
-from PageData.admin import admin_panel
+# Pages are imported inside their page functions: the chat, code execution and analysis pages
+# pull in pandasai, pandas_gpt, openai, streamlit_ace, matplotlib and seaborn, and most
+# sessions never open them. Python caches the modules after the first import.
 
 # Initialize database connection globally for session persistence
 conn = initialize_database()
@@ -20,8 +19,6 @@ def initialize_session_state():
         st.session_state["excel_df"] = None
     if "sql_tables" not in st.session_state:
         st.session_state["sql_tables"] = []
-    if "chat_history" not in st.session_state:
-        st.session_state["chat_history"] = []
     if "pandas_gpt_obj" not in st.session_state:
         st.session_state["pandas_gpt_obj"] = None
     if "api_key" not in st.session_state:
@@ -34,29 +31,53 @@ def main():
     # Use the global database connection
     global conn
     def data_upload_page():
-        data_upload_tab(conn)
+        with profile_span("data_upload_tab", "page"):
+            from PageData.Upload.data_upload_page import data_upload_tab
+            data_upload_tab(conn)
+
+    def chat_with_ai_page():
+        with profile_span("chat_with_ai_tab", "page"):
+            from PageData.AiChat import chat_page
+            chat_page.chat_with_ai_tab()
 
     def code_execution_page():
-        code_execution_tab = CodeExecutionTab(conn)
-        code_execution_tab.display()
+        with profile_span("CodeExecutionTab.display", "page"):
+            from PageData.CodeExecution.code_execution_page import CodeExecutionTab
+            code_execution_tab = CodeExecutionTab(conn)
+            code_execution_tab.display()
 
     def data_analysis_page():
-        data_analysis_tab(conn)
+        with profile_span("data_analysis_tab", "page"):
+            from PageData.DataAnalysis.data_analysis_page import data_analysis_tab
+            data_analysis_tab(conn)
 
     def admin_panel_page():
-        admin_panel(conn)
+        with profile_span("admin_panel", "page"):
+            from PageData.admin import admin_panel
+            admin_panel(conn)
 
     # Initialize session state variables
     initialize_session_state()
-    app = mt.MultiPage()
-    app.add("Upload 📁", data_upload_page)
-    if st.session_state.excel_df is not None:
-        app.add("Chat with AI 🤖", chat_page.chat_with_ai_tab)
-        app.add("Code Execution 💻", code_execution_page)
-        app.add("Data Analysis 📊", data_analysis_page)
-        app.add("Admin Panel 🎛️", admin_panel_page)
-    app.run_radio()
+    profiler_enabled = st.sidebar.toggle("Profiler", key="profiler_enabled")
+    profiler_token = start_run("rerun") if profiler_enabled else None
+    try:
+        app = mt.MultiPage()
+        app.add("Upload 📁", data_upload_page)
+        if st.session_state.excel_df is not None:
+            app.add("Chat with AI 🤖", chat_with_ai_page)
+            app.add("Code Execution 💻", code_execution_page)
+            app.add("Data Analysis 📊", data_analysis_page)
+            app.add("Admin Panel 🎛️", admin_panel_page)
+        app.run_radio()
+    finally:
+        # Keep the last finished run so the panel still has data after st.rerun()/st.stop()
+        if profiler_token is not None:
+            st.session_state["profiler_last_run"] = finish_run(profiler_token)
+    if profiler_enabled:
+        profiler_panel(st.session_state.get("profiler_last_run"))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Other sessions' memory budget must not spill the workspace under a long rerun (e.g. a large upload)
+    with workspace_in_use():
+        main()
\ No newline at end of file
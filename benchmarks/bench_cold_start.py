@@ -0,0 +1,109 @@
+"""Cold-start import time and first-render latency of the app.
+
+Every measurement runs in a fresh interpreter so nothing is cached between runs:
+  * `python -X importtime -c "import app"`, self time summed per top-level package
+  * first render of app.py through streamlit.testing (no server or browser)
+  * first import of each page module, i.e. the extra cost of opening that page
+
+Usage:
+    python -m benchmarks.bench_cold_start --repeat 3 --json cold_start.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_MODULES = [
+    "PageData.Upload.data_upload_page",
+    "PageData.AiChat.chat_page",
+    "PageData.CodeExecution.code_execution_page",
+    "PageData.DataAnalysis.data_analysis_page",
+    "PageData.admin",
+]
+
+FIRST_RENDER_SCRIPT = """
+import time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+app_test = AppTest.from_file("app.py", default_timeout=120)
+app_test.run()
+print(time.perf_counter() - start)
+"""
+
+TIMED_IMPORT_SCRIPT = """
+import importlib, time
+import app
+start = time.perf_counter()
+importlib.import_module({module!r})
+print(time.perf_counter() - start)
+"""
+
+
+def run_python(args: list) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable] + args, cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+
+
+def parse_importtime(stderr: str) -> dict:
+    """Sums the self import time (seconds) of every module per top-level package in -X importtime output."""
+    packages = defaultdict(float)
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        self_time, _, name = line[len("import time:"):].split("|")
+        packages[name.strip().split(".")[0]] += int(self_time) / 1e6
+    return dict(packages)
+
+
+def measure_import(repeat: int) -> dict:
+    runs = [parse_importtime(run_python(["-X", "importtime", "-c", "import app"]).stderr) for _ in range(repeat)]
+    best = min(runs, key=lambda packages: sum(packages.values()))
+    return {"total_seconds": sum(best.values()), "packages": dict(sorted(best.items(), key=lambda item: -item[1]))}
+
+
+def measure_first_render(repeat: int) -> float:
+    return min(float(run_python(["-c", FIRST_RENDER_SCRIPT]).stdout.split()[-1]) for _ in range(repeat))
+
+
+def measure_page_imports(repeat: int) -> dict:
+    """Returns the first-import time of every page module, or None if its dependencies are missing."""
+    timings = {}
+    for module in PAGE_MODULES:
+        script = TIMED_IMPORT_SCRIPT.format(module=module)
+        try:
+            timings[module] = min(float(run_python(["-c", script]).stdout.split()[-1]) for _ in range(repeat))
+        except subprocess.CalledProcessError:
+            timings[module] = None
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10, help="Number of packages to print")
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {
+        "import_app": measure_import(args.repeat),
+        "first_render_seconds": measure_first_render(args.repeat),
+        "page_import_seconds": measure_page_imports(args.repeat),
+    }
+
+    print(f"import app: {results['import_app']['total_seconds']:.3f} s")
+    for package, seconds in list(results["import_app"]["packages"].items())[:args.top]:
+        print(f"  {package:<30} {seconds:>8.3f} s")
+    print(f"first render of the upload page: {results['first_render_seconds']:.3f} s")
+    print("first import per page:")
+    for module, seconds in results["page_import_seconds"].items():
+        print(f"  {module:<45} {seconds:>8.3f} s" if seconds is not None else f"  {module:<45} import failed")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
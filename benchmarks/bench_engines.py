@@ -0,0 +1,79 @@
+"""SQLite versus DuckDB on the typical takeoff snippets.
+
+Loads a synthetic model through write_table, runs every snippet of
+benchmarks.synthetic.SQL_SNIPPETS on both engines, checks that they return the same rows and
+reports the best time of each. The first DuckDB query makes the Arrow copy of the table.
+
+Usage:
+    python -m benchmarks.bench_engines --rows 100000 1000000 --columns 50
+"""
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from PageData.core.engines import choose_engine, duckdb_available, frames_match, run_duckdb
+from PageData.core.query import execute_sql
+from PageData.core.schema import create_app_tables
+from PageData.core.tables import write_table
+from benchmarks.synthetic import SQL_SNIPPETS, make_ddc_frame
+
+
+def time_call(func, repeat: int) -> tuple:
+    """Returns the best wall-clock time of func() over repeat runs and the last result."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), value
+
+
+def run(rows: int, columns: int, repeat: int) -> list:
+    conn = sqlite3.connect(":memory:")
+    create_app_tables(conn)
+    write_table(make_ddc_frame(rows, columns), conn)
+    results = []
+    for name, query in SQL_SNIPPETS.items():
+        sqlite_seconds, sqlite_result = time_call(lambda: execute_sql(query, conn, engine="sqlite"), repeat)
+        duckdb_seconds, duckdb_result = time_call(lambda: run_duckdb(conn, query), repeat)
+        results.append({
+            "rows": rows,
+            "columns": columns,
+            "snippet": name,
+            "sqlite_seconds": sqlite_seconds,
+            "duckdb_seconds": duckdb_seconds,
+            "speedup": sqlite_seconds / duckdb_seconds,
+            "same_result": frames_match(sqlite_result, duckdb_result),
+            "auto_engine": choose_engine(conn, query),
+        })
+    conn.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default="bench_results/engines.json")
+    args = parser.parse_args()
+    if not duckdb_available():
+        parser.error("duckdb is not installed (pip install duckdb)")
+
+    results = []
+    for rows in args.rows:
+        results.extend(run(rows, args.columns, args.repeat))
+    print(f"{'rows':>9} {'snippet':<20} {'sqlite s':>9} {'duckdb s':>9} {'speedup':>8} {'same':>5} {'auto':>7}")
+    for r in results:
+        print(f"{r['rows']:>9} {r['snippet']:<20} {r['sqlite_seconds']:>9.3f} {r['duckdb_seconds']:>9.3f} "
+              f"{r['speedup']:>7.1f}x {str(r['same_result']):>5} {r['auto_engine']:>7}")
+
+    os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
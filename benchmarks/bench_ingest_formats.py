@@ -0,0 +1,104 @@
+"""Parse time per file format for the same model.
+
+Writes one DataFrame as xlsx, CSV, Parquet and Feather and times how long each
+format takes to load through the upload page readers.
+
+Usage:
+    python -m benchmarks.bench_ingest_formats --source e:/DDC/model_rvt.xlsx
+    python -m benchmarks.bench_ingest_formats --rows 20000 --columns 300
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from PageData.core.ingest import get_file_format, read_tabular_file
+
+
+def make_frame(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+    """Builds a mixed numeric/text frame shaped like a DDC export."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for i in range(columns):
+        if i % 3 == 0:
+            data[f"Text_{i}"] = rng.choice(["Wall", "Floor", "Door", "Window", None], size=rows)
+        else:
+            values = rng.random(rows) * 100
+            values[rng.random(rows) < 0.3] = np.nan
+            data[f"Value_{i}"] = values
+    return pd.DataFrame(data)
+
+
+def time_call(func, repeat: int) -> float:
+    """Returns the best wall-clock time of func() over repeat runs."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(df: pd.DataFrame, repeat: int) -> list:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = {
+            "Excel": os.path.join(tmp_dir, "model.xlsx"),
+            "CSV": os.path.join(tmp_dir, "model.csv"),
+            "Parquet": os.path.join(tmp_dir, "model.parquet"),
+            "Feather": os.path.join(tmp_dir, "model.feather"),
+        }
+        df.to_excel(paths["Excel"], index=False)
+        df.to_csv(paths["CSV"], index=False)
+        df.to_parquet(paths["Parquet"], index=False)
+        df.to_feather(paths["Feather"])
+
+        readers = {
+            "Excel": lambda: pd.read_excel(paths["Excel"]),
+            "CSV (pandas)": lambda: pd.read_csv(paths["CSV"]),
+            "CSV": lambda: read_tabular_file(paths["CSV"], "CSV"),
+            "Parquet": lambda: read_tabular_file(paths["Parquet"], "Parquet"),
+            "Feather": lambda: read_tabular_file(paths["Feather"], "Feather"),
+        }
+        for name, reader in readers.items():
+            file_key = name.split(" ")[0]
+            results.append({
+                "format": name,
+                "file_size_bytes": os.path.getsize(paths[file_key]),
+                "seconds": time_call(reader, repeat),
+            })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", help="Existing export (xlsx/csv/parquet/feather) to benchmark with")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--columns", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.source:
+        if args.source.lower().endswith(".xlsx"):
+            df = pd.read_excel(args.source)
+        else:
+            df = read_tabular_file(args.source, get_file_format(args.source))
+    else:
+        df = make_frame(args.rows, args.columns)
+
+    results = run(df, args.repeat)
+    print(f"{len(df)} rows x {len(df.columns)} columns")
+    for result in results:
+        print(f"{result['format']:<14} {result['seconds']:>9.3f} s {result['file_size_bytes'] / 1e6:>9.1f} MB")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"rows": len(df), "columns": len(df.columns), "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
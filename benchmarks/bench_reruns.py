@@ -0,0 +1,122 @@
+"""Rerun latency of the pages: a full page rerun versus a rerun of one panel.
+
+Every page section that has widgets is a panel (PageData.fragments), so interacting with it
+reruns only that panel. Before panels, every interaction cost a full page rerun. Each page is
+rendered through streamlit.testing on a synthetic model with the profiler on; the full rerun is
+timed end to end and every panel is timed by its profiler span, which is what a rerun of that
+panel alone executes.
+
+Usage:
+    python -m benchmarks.bench_reruns --rows 200000 --repeat 5
+"""
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import time
+
+from PageData.core.schema import create_app_tables
+from PageData.core.search import build_search_index
+from PageData.core.tables import write_table
+from PageData.DB.database import insert_code_snippet
+from benchmarks.synthetic import SQL_SNIPPETS, make_ddc_frame
+
+PAGES = ["upload", "code_execution", "data_analysis"]
+
+
+def page_script(page: str, db_path: str):
+    """Renders one page the way app.py does, recording the run for the profiler."""
+    import sqlite3
+
+    import streamlit as st
+
+    from PageData.core.dataset import LazyDataset
+    from PageData.profiler import finish_run, start_run
+
+    if "conn" not in st.session_state:
+        st.session_state["conn"] = sqlite3.connect(db_path, check_same_thread=False)
+        st.session_state["excel_df"] = LazyDataset(st.session_state["conn"])
+        st.session_state["profiler_enabled"] = True
+    conn = st.session_state["conn"]
+    token = start_run(page)
+    try:
+        if page == "upload":
+            from PageData.Upload.data_upload_page import data_upload_tab
+            data_upload_tab(conn)
+        elif page == "code_execution":
+            from PageData.CodeExecution.code_execution_page import CodeExecutionTab
+            CodeExecutionTab(conn).display()
+        else:
+            from PageData.DataAnalysis.data_analysis_page import data_analysis_tab
+            data_analysis_tab(conn)
+    finally:
+        st.session_state["profiler_last_run"] = finish_run(token)
+
+
+def create_database(path: str, rows: int, columns: int):
+    conn = sqlite3.connect(path)
+    create_app_tables(conn)
+    df = make_ddc_frame(rows, columns)
+    write_table(df, conn)
+    build_search_index(conn, ["Type : String", "Material : String"])
+    for name, query in SQL_SNIPPETS.items():
+        if name != "select_all":
+            insert_code_snippet(conn, "sql", query, name)
+    conn.close()
+
+
+def measure_page(page: str, db_path: str, repeat: int) -> dict:
+    from streamlit.testing.v1 import AppTest
+
+    app_test = AppTest.from_function(page_script, args=(page, db_path), default_timeout=600)
+    app_test.run()
+    if page == "data_analysis":
+        app_test.sidebar.multiselect[-1].set_value([name for name in SQL_SNIPPETS if name != "select_all"])
+        app_test.run()
+    if app_test.exception:
+        raise RuntimeError(f"{page}: {app_test.exception[0].value}")
+
+    full_runs, panels = [], {}
+    for _ in range(repeat):
+        start = time.perf_counter()
+        app_test.run()
+        full_runs.append(time.perf_counter() - start)
+        slowest = {}
+        # A panel drawn several times (one per SQL snippet) counts with its slowest call
+        for span in app_test.session_state["profiler_last_run"].spans:
+            if span["category"] == "panel":
+                slowest[span["name"]] = max(slowest.get(span["name"], 0), span["duration_ms"] / 1000)
+        for name, seconds in slowest.items():
+            panels.setdefault(name, []).append(seconds)
+    return {
+        "full_rerun_seconds": min(full_runs),
+        "panel_rerun_seconds": {name: min(timings) for name, timings in panels.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--pages", nargs="+", choices=PAGES, default=PAGES)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "model.db")
+        create_database(db_path, args.rows, args.columns)
+        for page in args.pages:
+            results[page] = measure_page(page, db_path, args.repeat)
+            print(f"{page}: full rerun {results[page]['full_rerun_seconds'] * 1000:.0f} ms")
+            for name, seconds in sorted(results[page]["panel_rerun_seconds"].items(), key=lambda item: -item[1]):
+                print(f"  {name:<45} {seconds * 1000:>8.1f} ms")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Validation rules checked in one pass versus one snippet query per rule.
+
+Saves --rules QA rules (missing parameters, quantities out of range, per category) on a synthetic
+model and times check_rules, which evaluates them all in a single scan of _df, against running
+each rule as its own "SELECT * FROM _df WHERE ..." snippet the way the QA snippets used to, and
+checks that both find the same number of violations per rule.
+
+Usage:
+    python -m benchmarks.bench_validation --rows 200000 --rules 50
+"""
+import argparse
+import json
+import sqlite3
+import time
+
+from PageData.core.dataset import column_types, query_to_sql
+from PageData.core.query import execute_sql
+from PageData.core.schema import create_app_tables
+from PageData.core.tables import write_table
+from PageData.core.validation import check_rules, load_rules, save_rule
+from benchmarks.synthetic import CATEGORIES, make_ddc_frame
+
+
+def make_rules(columns: list, count: int) -> dict:
+    """Rules like the QA snippets: a category whose elements miss a parameter or have a small quantity."""
+    parameters = [col for col in columns if col.startswith("Parameter")]
+    quantities = ["Volume : Double", "Area : Double", "Length : Double"]
+    rules = {}
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        if i % 2:
+            rules[f"{category} without {parameters[i % len(parameters)]}"] = \
+                f"`Category : String` == '{category}' and `{parameters[i % len(parameters)]}`.isna()"
+        else:
+            rules[f"{category} with {quantities[i % 3]} <= {i / 100}"] = \
+                f"`Category : String` == '{category}' and `{quantities[i % 3]}` <= {i / 100}"
+    return rules
+
+
+def run(rows: int, columns: int, count: int) -> dict:
+    conn = sqlite3.connect(":memory:")
+    create_app_tables(conn)
+    df = make_ddc_frame(rows, columns)
+    write_table(df, conn)
+    for name, condition in make_rules(list(df.columns), count).items():
+        save_rule(conn, name, condition, "QA")
+    rules = load_rules(conn)
+
+    start = time.perf_counter()
+    check = check_rules(conn, rules).value
+    combined_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    counts = []
+    types = column_types(conn, "_df")
+    for condition in rules["condition"]:
+        where, params = query_to_sql(condition, types)
+        query = "SELECT * FROM _df WHERE " + where
+        for param in params:  # snippets are plain SQL
+            query = query.replace("?", repr(param), 1)
+        counts.append(len(execute_sql(query, conn, engine="sqlite")))
+    separate_seconds = time.perf_counter() - start
+    conn.close()
+    return {
+        "rows": rows, "columns": columns, "rules": len(rules),
+        "combined_seconds": combined_seconds, "separate_seconds": separate_seconds,
+        "same_counts": counts == check["rules"]["violations"].tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[200_000])
+    parser.add_argument("--columns", type=int, default=50)
+    parser.add_argument("--rules", type=int, default=50)
+    parser.add_argument("--json", help="Write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        result = run(rows, args.columns, args.rules)
+        results.append(result)
+        print(f"{rows} rows, {result['rules']} rules: one pass {result['combined_seconds'] * 1000:.0f} ms, "
+              f"one query per rule {result['separate_seconds'] * 1000:.0f} ms"
+              + ("" if result["same_counts"] else "  MISMATCH"))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Headless benchmark suite for ingest and query performance.
+
+Drives the same functions the pages call, without a Streamlit server, on
+synthetic DDC-style frames (see benchmarks/synthetic.py):
+  load_excel_data, create_sql_table, execute_sql (representative snippets),
+  save_database and handle_sqlite_upload.
+
+Results are written as JSON and CSV into --output-dir, named after the git revision,
+so runs of different versions can be compared with --compare.
+
+Usage:
+    python -m benchmarks.run_benchmarks --rows 10000 100000 --columns 100 1000
+    python -m benchmarks.run_benchmarks --compare bench_results/<old>.json
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from PageData.DB.database import create_app_tables, execute_sql, save_database
+from PageData.Upload.data_upload_page import handle_sqlite_upload
+from PageData.Upload.sql_from_df_creator import create_sql_table
+from PageData.Upload.upload_ddc import load_excel_data
+from benchmarks.synthetic import SQL_SNIPPETS, make_ddc_frame
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class NamedBytesIO(io.BytesIO):
+    """In-memory stand-in for a Streamlit UploadedFile."""
+
+    def __init__(self, content: bytes, name: str):
+        super().__init__(content)
+        self.name = name
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def new_connection() -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    create_app_tables(conn)
+    return conn
+
+
+def measure(func, repeat: int, setup=None) -> dict:
+    """Times func(setup()) repeat times. Returns timings and whether every call succeeded."""
+    timings = []
+    ok = True
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        start = time.perf_counter()
+        result = func(arg) if setup else func()
+        timings.append(time.perf_counter() - start)
+        ok = ok and result is not None and result is not False and not isinstance(result, str)
+    return {"best_seconds": min(timings), "mean_seconds": sum(timings) / len(timings), "ok": ok}
+
+
+def bench_size(rows: int, columns: int, repeat: int, excel_max_cells: int) -> list:
+    df = make_ddc_frame(rows, columns)
+    size = {"rows": rows, "columns": columns}
+    results = []
+
+    def add(name: str, timing: dict):
+        results.append({"benchmark": name, **size, **timing})
+        status = "ok" if timing["ok"] else "FAILED"
+        print(f"{name:<32} {rows:>9} x {columns:<5} {timing['best_seconds']:>9.3f} s  {status}")
+
+    if rows * columns <= excel_max_cells:
+        buffer = io.BytesIO()
+        df.to_excel(buffer, index=False)
+        excel_bytes = buffer.getvalue()
+        add("load_excel_data", measure(lambda f: load_excel_data(f), repeat,
+                                       setup=lambda: NamedBytesIO(excel_bytes, "model.xlsx")))
+
+    add("create_sql_table", measure(lambda conn: create_sql_table(df.copy(), conn), repeat, setup=new_connection))
+
+    conn = new_connection()
+    create_sql_table(df.copy(), conn)
+    for snippet_name, query in SQL_SNIPPETS.items():
+        add(f"execute_sql[{snippet_name}]", measure(lambda: execute_sql(query, conn), repeat))
+
+    add("save_database", measure(lambda: save_database(conn), repeat))
+
+    db_bytes = save_database(conn)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        upload_path = os.path.join(tmp_dir, "upload.db")
+
+        def upload(target_conn):
+            handle_sqlite_upload(NamedBytesIO(db_bytes, upload_path), target_conn)
+            return execute_sql("SELECT COUNT(*) FROM _df", target_conn)
+
+        add("handle_sqlite_upload", measure(upload, repeat, setup=new_connection))
+    conn.close()
+    return results
+
+
+def compare(current: list, baseline_path: str):
+    """Prints the best-time ratio of every benchmark against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = {(r["benchmark"], r["rows"], r["columns"]): r for r in json.load(f)["results"]}
+    print(f"\ncompared with {baseline_path} (ratio > 1 is slower):")
+    for result in current:
+        previous = baseline.get((result["benchmark"], result["rows"], result["columns"]))
+        if previous:
+            ratio = result["best_seconds"] / previous["best_seconds"]
+            print(f"{result['benchmark']:<32} {result['rows']:>9} x {result['columns']:<5} {ratio:>6.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000])
+    parser.add_argument("--columns", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--excel-max-cells", type=int, default=2_000_000,
+                        help="Skip load_excel_data above this many cells; writing the xlsx input is slow")
+    parser.add_argument("--output-dir", default="bench_results")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        for columns in args.columns:
+            results.extend(bench_size(rows, columns, args.repeat, args.excel_max_cells))
+
+    revision = git_revision()
+    run_info = {
+        "revision": revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    stem = os.path.join(args.output_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{revision}")
+    with open(stem + ".json", "w") as f:
+        json.dump(run_info, f, indent=2)
+    pd.DataFrame(results).assign(revision=revision).to_csv(stem + ".csv", index=False)
+    print(f"\nresults written to {stem}.json and {stem}.csv")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Synthetic DDC-style model exports for benchmarks.
+
+The frames mimic what RvtExporter writes: one row per element, a few identity and
+quantity columns that every element has, and a long tail of "Name : StorageType"
+parameter columns that are mostly empty and repeat a small set of values.
+"""
+import numpy as np
+import pandas as pd
+
+CATEGORIES = ["Walls", "Floors", "Doors", "Windows", "Structural Columns", "Structural Framing",
+              "Roofs", "Ceilings", "Stairs", "Railings", "Pipes", "Ducts", "Furniture", "Generic Models"]
+MATERIALS = ["Concrete", "Steel", "Timber", "Glass", "Brick", "Gypsum", "Aluminium", "Insulation"]
+STORAGE_TYPES = ["String", "Double", "Integer", "ElementId"]
+
+
+def make_ddc_frame(rows: int, columns: int, sparsity: float = 0.7, seed: int = 0) -> pd.DataFrame:
+    """Builds a Revit-like element table.
+
+    Args:
+        rows: Number of elements.
+        columns: Total number of columns (at least the 9 fixed ones are always present).
+        sparsity: Average fraction of empty cells in the parameter columns.
+        seed: Random seed, so the same arguments always give the same frame.
+
+    Returns:
+        pandas DataFrame: The synthetic export.
+    """
+    rng = np.random.default_rng(seed)
+    # Element counts per category are skewed like in real models (many walls, few stairs)
+    category_weights = rng.dirichlet(np.full(len(CATEGORIES), 0.6))
+    category = rng.choice(CATEGORIES, size=rows, p=category_weights)
+    levels = [f"Level {i}" for i in range(-1, max(rows // 5000, 3))]
+    data = {
+        "ElementId : ElementId": rng.permutation(rows) + 100000,
+        "Category : String": category,
+        "Level : String": rng.choice(levels, size=rows),
+        "Type : String": np.char.add(category.astype(str), rng.integers(1, 25, size=rows).astype(str)),
+        "Material : String": rng.choice(MATERIALS, size=rows),
+        "Volume : Double": np.round(rng.lognormal(0, 1, size=rows), 4),
+        "Area : Double": np.round(rng.lognormal(1, 1, size=rows), 4),
+        "Length : Double": np.round(rng.lognormal(1.5, 0.8, size=rows), 4),
+        "Count : Integer": np.ones(rows, dtype=np.int64),
+    }
+
+    # Per-column emptiness varies around the requested average
+    fill_rates = 1 - rng.beta(sparsity * 4 + 1e-3, (1 - sparsity) * 4 + 1e-3, size=max(columns - len(data), 0))
+    for i, fill_rate in enumerate(fill_rates):
+        storage = STORAGE_TYPES[i % len(STORAGE_TYPES)]
+        name = f"Parameter {i:04d} : {storage}"
+        empty = rng.random(rows) >= fill_rate
+        if storage == "String":
+            vocabulary = np.array([f"Value {j}" for j in range(rng.integers(2, 50))], dtype=object)
+            values = vocabulary[rng.integers(0, len(vocabulary), size=rows)]
+            values[empty] = None
+        elif storage == "Double":
+            values = np.round(rng.normal(100, 30, size=rows), 3)
+            values[empty] = np.nan
+        else:
+            values = pd.array(rng.integers(0, 1000, size=rows), dtype="Int64")
+            values[empty] = pd.NA
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+# Representative saved snippets: takeoff aggregates, a text filter and a full scan
+SQL_SNIPPETS = {
+    "volume_by_category": 'SELECT "Category : String", SUM("Volume : Double") AS volume, COUNT(*) AS n FROM _df GROUP BY 1',
+    "area_by_level_type": 'SELECT "Level : String", "Type : String", SUM("Area : Double") AS area FROM _df GROUP BY 1, 2',
+    "material_takeoff": 'SELECT "Material : String", "Category : String", SUM("Volume : Double"), SUM("Length : Double") FROM _df GROUP BY 1, 2',
+    "text_search": "SELECT * FROM _df WHERE \"Type : String\" LIKE '%Walls1%'",
+    "select_all": "SELECT * FROM _df",
+}
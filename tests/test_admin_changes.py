@@ -0,0 +1,50 @@
+import sqlite3
+
+import pandas as pd
+
+from PageData.core.admin_changes import apply_snippet_changes
+from PageData.core.schema import create_app_tables
+
+
+def _database() -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:")
+    create_app_tables(conn)
+    conn.execute("CREATE TABLE walls (area REAL)")
+    conn.execute("INSERT INTO walls VALUES (12.5)")
+    for code_id, name, code in [("1", "v1", "SELECT area FROM walls"), ("2", "v2", "SELECT area FROM v1")]:
+        conn.execute(f'CREATE VIEW "{name}" AS {code}')
+        conn.execute("INSERT INTO code_snippets (id, type, code, name, is_view) VALUES (?, 'sql', ?, ?, 1)",
+                     (code_id, code, name))
+    conn.commit()
+    return conn
+
+
+def _edit(conn: sqlite3.Connection, **changes) -> tuple:
+    original = pd.read_sql("SELECT * FROM code_snippets ORDER BY id", conn)
+    edited = original.assign(delete=False)
+    for column, value in changes.items():
+        edited.loc[0, column] = value
+    return original, edited
+
+
+def test_renaming_a_view_others_select_from_is_rolled_back():
+    conn = _database()
+    result = apply_snippet_changes(conn, *_edit(conn, name="v1_renamed"))
+    assert not result.ok
+    assert "v2" in result.messages[0][1]
+    assert conn.execute("SELECT * FROM v2").fetchall() == [(12.5,)]
+    assert conn.execute("SELECT name FROM code_snippets WHERE id = '1'").fetchone() == ("v1",)
+
+
+def test_deleting_a_view_others_select_from_is_rolled_back():
+    conn = _database()
+    result = apply_snippet_changes(conn, *_edit(conn, delete=True))
+    assert not result.ok
+    assert conn.execute("SELECT * FROM v2").fetchall() == [(12.5,)]
+
+
+def test_changing_a_view_keeps_its_dependents_working():
+    conn = _database()
+    result = apply_snippet_changes(conn, *_edit(conn, code="SELECT area * 2 AS area FROM walls"))
+    assert result.ok
+    assert conn.execute("SELECT * FROM v2").fetchall() == [(25.0,)]
@@ -0,0 +1,38 @@
+import time
+
+from PageData.DB import chat_history
+from PageData.DB.chat_history import ChatHistoryWriter, load_chat_history, save_turn
+from PageData.core.workspaces import WorkspaceManager
+
+
+def test_chat_history_outlives_the_workspace(tmp_path, monkeypatch):
+    manager = WorkspaceManager(str(tmp_path), idle_timeout=0)
+    store_path = manager.chat_store_path("a")
+    monkeypatch.setattr(chat_history, "_writer", ChatHistoryWriter(flush_interval=0.01))
+    manager.connect("a")
+    save_turn(store_path, "How many walls?", 12)
+    assert load_chat_history(store_path, 5) == [("How many walls?", "12")]
+    chat_history._writer.flush(store_path)
+    time.sleep(0.01)
+    manager.sweep()
+    assert not manager.usage("a")["live"]
+    # A new server process: another writer and manager, the same files
+    monkeypatch.setattr(chat_history, "_writer", ChatHistoryWriter())
+    store_path = WorkspaceManager(str(tmp_path)).chat_store_path("a")
+    save_turn(store_path, "And doors?", 3)
+    assert load_chat_history(store_path, 5) == [("How many walls?", "12"), ("And doors?", "3")]
+    assert load_chat_history(store_path, 1) == [("And doors?", "3")]
+
+
+def test_chat_store_expires_with_its_workspace(tmp_path):
+    manager = WorkspaceManager(str(tmp_path), idle_timeout=0, snapshot_ttl=0)
+    manager.connect("a")
+    store_path = manager.chat_store_path("a")
+    writer = ChatHistoryWriter(flush_interval=0.01)
+    writer.record_turn("q", "a", store_path)
+    writer.flush(store_path)
+    time.sleep(0.01)
+    manager.sweep()  # spills
+    time.sleep(0.01)
+    manager.sweep()  # forgets
+    assert not list(tmp_path.iterdir())
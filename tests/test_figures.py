@@ -0,0 +1,36 @@
+import sqlite3
+
+import pandas as pd
+
+from PageData.core.dataset import LazyDataset, columns_used
+from PageData.core.figures import figure_cache_key, frame_fingerprint
+from PageData.core.schema import create_app_tables
+from PageData.core.tables import write_table
+
+
+def _dataset(rows: int = 1000) -> LazyDataset:
+    conn = sqlite3.connect(":memory:")
+    create_app_tables(conn)
+    write_table(pd.DataFrame({"Id": range(rows), "Volume": [float(i) for i in range(rows)]}), conn)
+    return LazyDataset(conn)
+
+
+def test_fingerprint_of_snippet_that_does_not_read_df():
+    data = _dataset()
+    for code in ['print("hello")', 'print(data.to_pandas().shape)']:
+        df = data.select(columns_used(code, data.columns))
+        assert df.shape == (1000, 0)
+        assert len(frame_fingerprint(df)) == 64
+
+
+def test_fingerprint_tells_frames_without_columns_apart_by_rows():
+    three, four = pd.DataFrame(index=pd.RangeIndex(3)), pd.DataFrame(index=pd.RangeIndex(4))
+    assert frame_fingerprint(three) != frame_fingerprint(four)
+    assert frame_fingerprint(three) == frame_fingerprint(pd.DataFrame(index=pd.RangeIndex(3)))
+
+
+def test_cache_key_differs_between_databases_at_the_same_version():
+    # Every workspace counts its data versions from 1 and the fingerprint only samples rows
+    fingerprint = frame_fingerprint(pd.DataFrame({"Volume": [1.0, 2.0]}))
+    assert figure_cache_key("print(df.Volume.sum())", "file:a", 1, fingerprint) != \
+        figure_cache_key("print(df.Volume.sum())", "file:b", 1, fingerprint)
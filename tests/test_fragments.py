@@ -0,0 +1,31 @@
+from streamlit.testing.v1 import AppTest
+
+
+def _app():
+    import streamlit as st
+
+    from PageData.DB.database import initialize_database
+    from PageData.fragments import panel
+
+    class Tab:
+        def __init__(self, conn):
+            self.conn = conn
+
+        @panel
+        def tables(self):
+            st.write("method", self.conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] > 0)
+
+    @panel
+    def tables(conn):
+        st.write("function", conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] > 0)
+
+    conn = initialize_database()
+    conn.close()  # like the connection a panel rerun captured after its workspace was spilled
+    tables(conn)
+    Tab(conn).tables()
+
+
+def test_panel_reopens_closed_connection():
+    at = AppTest.from_function(_app).run()
+    assert not at.exception
+    assert [element.value for element in at.markdown] == ["function `True`", "method `True`"]
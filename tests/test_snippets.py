@@ -0,0 +1,32 @@
+import sqlite3
+
+import pandas as pd
+
+from PageData.DB.query_log import get_query_log_writer
+from PageData.cli import main
+from PageData.core.schema import create_app_tables
+from PageData.core.snippets import load_snippets, run_snippets
+
+
+def _database(path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    create_app_tables(conn)
+    conn.execute("INSERT INTO code_snippets (id, type, code, name, is_view, category) VALUES "
+                 "('s1', 'sql', 'SELECT 1 AS x', 'one', 0, 'QA'), ('p1', 'python', 'print(1)', 'two', 0, 'QA')")
+    conn.commit()
+    return conn
+
+
+def test_run_snippets_logs_every_run(tmp_path):
+    conn = _database(str(tmp_path / "model.db"))
+    assert run_snippets(conn, load_snippets(conn), {"pd": pd}).ok
+    get_query_log_writer().flush()
+    assert conn.execute("SELECT snippet_id, rows_returned FROM query_log ORDER BY snippet_id").fetchall() == \
+        [("p1", None), ("s1", 1)]
+
+
+def test_cli_writes_the_query_log_before_exiting(tmp_path):
+    path = str(tmp_path / "model.db")
+    _database(path).close()
+    assert main(["run-snippets", "--db", path, "--category", "QA"]) == 0
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM query_log").fetchone()[0] == 2
@@ -0,0 +1,39 @@
+import time
+
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+from PageData.core.tables import write_table
+from PageData.core.workspaces import WorkspaceManager
+
+
+def test_workspace_in_use_is_not_spilled(tmp_path):
+    manager = WorkspaceManager(str(tmp_path), total_budget_bytes=0, idle_timeout=0)
+    with manager.in_use("a"):
+        conn = manager.connect("a")
+        write_table(pd.DataFrame({"Id": range(100)}), conn)
+        time.sleep(0.01)
+        manager.sweep()
+        assert manager.usage("a")["live"]
+        assert conn.execute("SELECT COUNT(*) FROM _df").fetchone()[0] == 100
+    time.sleep(0.01)
+    manager.sweep()
+    assert not manager.usage("a")["live"]
+    assert manager.connect("a").execute("SELECT COUNT(*) FROM _df").fetchone()[0] == 100
+
+
+def _app():
+    import streamlit as st
+
+    from PageData.DB.database import get_workspace_id
+
+    st.write(get_workspace_id())
+
+
+def test_workspace_id_survives_a_new_session():
+    first = AppTest.from_function(_app).run()
+    workspace_id = first.query_params["workspace"]
+    assert first.markdown[0].value == workspace_id
+    second = AppTest.from_function(_app)
+    second.query_params["workspace"] = workspace_id
+    assert second.run().markdown[0].value == workspace_id